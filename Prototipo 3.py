@@ -1,20 +1,31 @@
+import time
+_INICIO_PROCESO = time.perf_counter()
+
 import os
+import sys
+import logging
+import hashlib
+import io
+import json
+import re
+import socket
 import pygame
 from pygame import mixer
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog, colorchooser
-from typing import Optional, Dict, List, Literal
-from PIL import Image, ImageTk, ImageFilter
+from typing import Optional, Dict, List, Literal, Iterable, Iterator
 import numpy as np
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
 import threading
-import time
 import math
 import random
+import itertools
+import bisect
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("yautja")
 
 # ==================== CONSTANTES ====================
-MODOS_REPETICION = ["Ninguno", "Una canción", "Toda la lista"]
+MODOS_REPETICION = ["Ninguno", "Una canción", "Toda la lista", "Radio"]
 TEMAS_PREDEFINIDOS = {
     "Oscuro": {"fondo": "#2E3440", "botones": "#3B4252", "texto": "#E5E9F0", "resaltado": "#88C0D0"},
     "Claro": {"fondo": "#F5F5F5", "botones": "#E0E0E0", "texto": "#212121", "resaltado": "#64B5F6"},
@@ -22,6 +33,693 @@ TEMAS_PREDEFINIDOS = {
     "Verde": {"fondo": "#1B4332", "botones": "#40916C", "texto": "#D8F3DC", "resaltado": "#FF9F1C"}
 }
 
+# ==================== ARRANQUE Y CARGA DIFERIDA ====================
+class RegistroArranque:
+    """Mide las fases del arranque y las deja en el log para detectar regresiones."""
+
+    def __init__(self):
+        self.ultimo = _INICIO_PROCESO
+        self.fases: List[tuple] = []
+        self.lock = threading.Lock()
+
+    def _registrar(self, fase: str, duracion: float):
+        total = time.perf_counter() - _INICIO_PROCESO
+        with self.lock:
+            self.fases.append((fase, duracion))
+        logger.info("Arranque: %s %.1f ms (t=%.1f ms)", fase, duracion * 1000, total * 1000)
+
+    def marcar(self, fase: str):
+        # Fases secuenciales del hilo de Tk: cada una dura desde la marca anterior
+        ahora = time.perf_counter()
+        duracion = ahora - self.ultimo
+        self.ultimo = ahora
+        self._registrar(fase, duracion)
+
+    @contextmanager
+    def medir(self, fase: str):
+        # Fases diferidas o en segundo plano, medidas de forma independiente
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._registrar(fase, time.perf_counter() - inicio)
+
+registro_arranque = RegistroArranque()
+_audio_lock = threading.Lock()
+
+# En modo sin ventana no se crea Tk: los errores sólo van al log
+MODO_SIN_VENTANA = False
+
+def reportar_error(mensaje: str):
+    logger.error(mensaje)
+    if not MODO_SIN_VENTANA:
+        messagebox.showerror("Error", mensaje)
+
+def cargar_matplotlib():
+    """Importa matplotlib sólo cuando el visualizador lo necesita."""
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+    return FigureCanvasTkAgg, Figure
+
+def cargar_pil():
+    from PIL import Image, ImageTk, ImageFilter
+    return Image, ImageTk, ImageFilter
+
+def precargar_modulos():
+    # Se ejecuta en un hilo mientras se ve la pantalla de inicio
+    try:
+        with registro_arranque.medir("importar matplotlib"):
+            cargar_matplotlib()
+    except Exception as e:
+        logger.warning("No se pudo precargar matplotlib: %s", e)
+
+def iniciar_audio() -> bool:
+    """Inicializa pygame y el mixer la primera vez que hacen falta."""
+    with _audio_lock:
+        try:
+            if not pygame.get_init():
+                with registro_arranque.medir("pygame.init"):
+                    pygame.init()
+            if not mixer.get_init():
+                with registro_arranque.medir("mixer.init"):
+                    mixer.init()
+            return True
+        except Exception as e:
+            logger.error("No se pudo inicializar el audio: %s", e)
+            return False
+
+def iniciar_eventos() -> None:
+    """Prepara la cola de eventos de pygame en el hilo que la lee; el mixer lo abre el hilo de audio."""
+    with _audio_lock:
+        if not pygame.display.get_init():
+            with registro_arranque.medir("pygame.display.init"):
+                pygame.display.init()
+    trabajador_audio.preparar()
+
+# ==================== INSTRUMENTACIÓN ====================
+class Histograma:
+    """Duraciones en cubetas logarítmicas (cuatro por octava a partir de 1 µs)."""
+
+    CUBETAS = 112
+
+    def __init__(self):
+        self.cubetas = [0] * self.CUBETAS
+        self.cantidad = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, segundos: float) -> None:
+        micro = segundos * 1e6
+        indice = 0 if micro < 1 else min(self.CUBETAS - 1, int(math.log2(micro) * 4) + 1)
+        self.cubetas[indice] += 1
+        self.cantidad += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p: float) -> float:
+        objetivo, acumulado = p * self.cantidad, 0
+        for indice, cantidad in enumerate(self.cubetas):
+            acumulado += cantidad
+            if cantidad and acumulado >= objetivo:
+                # Límite superior de la cubeta, sin pasar del máximo visto
+                return min(self.maximo, 2 ** (indice / 4) / 1e6)
+        return self.maximo
+
+    def resumen(self) -> dict:
+        return {"n": self.cantidad, "media_ms": round(1000 * self.total / max(1, self.cantidad), 3),
+                "p50_ms": round(1000 * self.percentil(0.5), 3), "p95_ms": round(1000 * self.percentil(0.95), 3),
+                "p99_ms": round(1000 * self.percentil(0.99), 3), "max_ms": round(1000 * self.maximo, 3)}
+
+class _Medicion:
+    __slots__ = ("instrumentacion", "nombre", "inicio")
+
+    def __init__(self, instrumentacion, nombre):
+        self.instrumentacion, self.nombre = instrumentacion, nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+
+    def __exit__(self, *_):
+        self.instrumentacion.registrar(self.nombre, self.inicio, time.perf_counter() - self.inicio)
+
+class Instrumentacion:
+    """Tiempos de los caminos calientes, activable en caliente (YAUTJA_PERFIL=1 o menú Visualización).
+
+    Desactivada, medir() devuelve un contexto vacío compartido y no mide nada.
+    Activada, guarda un histograma por nombre, contadores y las últimas
+    llamadas para exportarlas como traza de Chrome (chrome://tracing, Perfetto).
+    """
+
+    MAX_EVENTOS = 200_000
+
+    def __init__(self):
+        from collections import deque
+        self.activa = os.environ.get("YAUTJA_PERFIL", "0") not in ("", "0")
+        self.histogramas: Dict[str, Histograma] = {}
+        self.contadores: Dict[str, int] = {}
+        self.eventos = deque(maxlen=self.MAX_EVENTOS)
+        self.ultimos_cuadros: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self._nulo = nullcontext()
+
+    def activar(self, activa: bool = True) -> None:
+        self.activa = activa
+        self.ultimos_cuadros.clear()
+
+    def reiniciar(self) -> None:
+        with self.lock:
+            self.histogramas.clear()
+            self.contadores.clear()
+            self.eventos.clear()
+            self.ultimos_cuadros.clear()
+
+    def medir(self, nombre: str):
+        return _Medicion(self, nombre) if self.activa else self._nulo
+
+    def registrar(self, nombre: str, inicio: float, duracion: float) -> None:
+        with self.lock:
+            histograma = self.histogramas.get(nombre)
+            if histograma is None:
+                histograma = self.histogramas[nombre] = Histograma()
+            histograma.agregar(duracion)
+            self.eventos.append((nombre, inicio, duracion, threading.get_ident()))
+
+    def contar(self, nombre: str, cantidad: int = 1) -> None:
+        with self.lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def cuadro(self, nombre: str, intervalo: float) -> None:
+        """Marca un tic periódico: guarda el intervalo real y cuenta los tics perdidos."""
+        if not self.activa:
+            return
+        ahora = time.perf_counter()
+        anterior = self.ultimos_cuadros.get(nombre)
+        self.ultimos_cuadros[nombre] = ahora
+        if anterior is None:
+            return
+        self.registrar(f"{nombre}.intervalo", anterior, ahora - anterior)
+        perdidos = int((ahora - anterior) / intervalo + 0.5) - 1
+        if perdidos > 0:
+            self.contar(f"{nombre}.perdidos", perdidos)
+
+    def resumen(self) -> dict:
+        with self.lock:
+            return {"histogramas": {nombre: h.resumen() for nombre, h in sorted(self.histogramas.items())},
+                    "contadores": dict(sorted(self.contadores.items()))}
+
+    def texto(self) -> str:
+        datos = self.resumen()
+        lineas = [f"{'':28} {'n':>6} {'p50':>7} {'p95':>7} {'max':>7} ms"]
+        for nombre, h in datos["histogramas"].items():
+            lineas.append(f"{nombre[:28]:28} {h['n']:6d} {h['p50_ms']:7.1f} {h['p95_ms']:7.1f} {h['max_ms']:7.1f}")
+        lineas.extend(f"{nombre[:28]:28} {valor:6d}" for nombre, valor in datos["contadores"].items())
+        return "\n".join(lineas)
+
+    def exportar_json(self, ruta: str) -> None:
+        datos = self.resumen()
+        with self.lock:
+            for nombre, h in self.histogramas.items():
+                datos["histogramas"][nombre]["cubetas_us"] = {
+                    round(2 ** (i / 4), 1): n for i, n in enumerate(h.cubetas) if n}
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+
+    def exportar_chrome(self, ruta: str) -> None:
+        pid = os.getpid()
+        with self.lock:
+            eventos = list(self.eventos)
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+            for i, (nombre, inicio, duracion, hilo) in enumerate(eventos):
+                evento = {"name": nombre, "cat": nombre.split(".")[0], "ph": "X", "pid": pid, "tid": hilo,
+                          "ts": round((inicio - _INICIO_PROCESO) * 1e6, 1), "dur": round(duracion * 1e6, 1)}
+                f.write(("," if i else "") + json.dumps(evento, ensure_ascii=False) + "\n")
+            f.write("]}\n")
+
+instrumentacion = Instrumentacion()
+
+def instrumentado(nombre: str):
+    """Decorador que mide cada llamada con instrumentacion.medir(nombre)."""
+    def decorador(funcion):
+        import functools
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not instrumentacion.activa:
+                return funcion(*args, **kwargs)
+            with _Medicion(instrumentacion, nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+# ==================== CACHÉ DE IMÁGENES ====================
+RUTA_BASE = os.path.dirname(os.path.abspath(__file__))
+RUTA_LOGO = os.path.join(RUTA_BASE, "assets", "logo.png")
+
+# Tamaños lógicos (a 96 DPI); la caché guarda la variante ya escalada al DPI real
+TAMANOS_IMAGEN = {
+    "logo": (600, 300),
+    "icono": (32, 32),
+    "caratula_lista": (22, 22),
+    "caratula_mini": (64, 64),
+    "caratula_grande": (256, 256),
+}
+
+def directorio_datos(tipo: str, *partes: str) -> str:
+    """Carpeta por usuario para 'cache' o 'data', siguiendo XDG cuando existe."""
+    if tipo == "cache":
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(base, "yautja-music", *partes)
+
+class CacheImagenes:
+    """Variantes preescaladas guardadas en disco como PNG.
+
+    La clave es el hash del contenido de origen más el tamaño final, así que
+    dos orígenes idénticos comparten variante y un origen modificado genera
+    una nueva. En un acierto la imagen se abre con tk.PhotoImage sin pasar por PIL.
+    """
+
+    def __init__(self, directorio: Optional[str] = None):
+        self.directorio = directorio or directorio_datos("cache", "imagenes")
+        self._hashes: Dict[tuple, str] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def escala_dpi(widget) -> float:
+        try:
+            return max(1.0, widget.winfo_fpixels("1i") / 96.0)
+        except tk.TclError:
+            return 1.0
+
+    def tamano_para(self, widget, nombre: str) -> tuple:
+        ancho, alto = TAMANOS_IMAGEN[nombre]
+        escala = self.escala_dpi(widget)
+        return round(ancho * escala), round(alto * escala)
+
+    def hash_origen(self, origen) -> str:
+        if isinstance(origen, (bytes, bytearray, memoryview)):
+            return hashlib.sha1(origen).hexdigest()
+
+        # Para rutas se recuerda el hash mientras no cambien fecha ni tamaño
+        info = os.stat(origen)
+        firma = (os.path.abspath(origen), info.st_mtime_ns, info.st_size)
+        with self.lock:
+            clave = self._hashes.get(firma)
+        if clave is None:
+            sha = hashlib.sha1()
+            with open(origen, "rb") as f:
+                for bloque in iter(lambda: f.read(1 << 16), b""):
+                    sha.update(bloque)
+            clave = sha.hexdigest()
+            with self.lock:
+                self._hashes[firma] = clave
+        return clave
+
+    def ruta_variante(self, clave: str, ancho: int, alto: int, ajuste: str, desenfoque: int = 0) -> str:
+        sufijo = f"_b{desenfoque}" if desenfoque else ""
+        return os.path.join(self.directorio, clave[:2], f"{clave}_{ancho}x{alto}_{ajuste}{sufijo}.png")
+
+    def obtener_ruta(self, origen, ancho: int, alto: int, ajuste: str = "estirar",
+                     desenfoque: int = 0, clave: Optional[str] = None) -> str:
+        """Devuelve la ruta del PNG preescalado, generándolo la primera vez."""
+        clave = clave or self.hash_origen(origen)
+        destino = self.ruta_variante(clave, ancho, alto, ajuste, desenfoque)
+        if not os.path.exists(destino):
+            self._generar(origen, destino, ancho, alto, ajuste, desenfoque)
+        return destino
+
+    def _generar(self, origen, destino: str, ancho: int, alto: int, ajuste: str, desenfoque: int):
+        Image, _, ImageFilter = cargar_pil()
+        from PIL import ImageOps
+
+        fuente = io.BytesIO(origen) if isinstance(origen, (bytes, bytearray, memoryview)) else origen
+        with Image.open(fuente) as img:
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            if ajuste == "recortar":
+                img = ImageOps.fit(img, (ancho, alto), Image.Resampling.LANCZOS)
+            else:
+                img = img.resize((ancho, alto), Image.Resampling.LANCZOS)
+            if desenfoque:
+                img = img.filter(ImageFilter.GaussianBlur(desenfoque))
+
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(temporal, "PNG")
+        os.replace(temporal, destino)
+
+    def photoimage(self, origen, ancho: int, alto: int, ajuste: str = "estirar",
+                   master=None, desenfoque: int = 0) -> tk.PhotoImage:
+        # Tk 8.6 lee PNG directamente, así que un acierto no necesita PIL
+        return tk.PhotoImage(file=self.obtener_ruta(origen, ancho, alto, ajuste, desenfoque), master=master)
+
+cache_imagenes = CacheImagenes()
+
+# ==================== CARÁTULAS ====================
+NOMBRES_CARATULA_CARPETA = ("cover", "folder", "front", "albumart", "album")
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png")
+MAX_ETIQUETA = 32 * 1024 * 1024
+
+def _leer_imagen_id3(f) -> Optional[bytes]:
+    cabecera = f.read(10)
+    if len(cabecera) < 10 or cabecera[:3] != b"ID3":
+        return None
+    version, banderas = cabecera[3], cabecera[5]
+    tamano = (cabecera[6] << 21) | (cabecera[7] << 14) | (cabecera[8] << 7) | cabecera[9]
+    datos = f.read(min(tamano, MAX_ETIQUETA))
+    if version < 4 and banderas & 0x80:
+        datos = datos.replace(b"\xff\x00", b"\xff")
+
+    pos = 0
+    if banderas & 0x40 and version >= 3:
+        if version == 3:
+            pos = 4 + int.from_bytes(datos[0:4], "big")
+        else:
+            pos = (datos[0] << 21) | (datos[1] << 14) | (datos[2] << 7) | datos[3]
+
+    largo_id, largo_cab = (3, 6) if version == 2 else (4, 10)
+    elegida = None
+    while pos + largo_cab <= len(datos):
+        id_marco = datos[pos:pos + largo_id]
+        if id_marco.strip(b"\x00") == b"":
+            break
+        if version == 2:
+            largo = int.from_bytes(datos[pos + 3:pos + 6], "big")
+            flags_marco = 0
+        elif version == 4:
+            t = datos[pos + 4:pos + 8]
+            largo = (t[0] << 21) | (t[1] << 14) | (t[2] << 7) | t[3]
+            flags_marco = datos[pos + 9]
+        else:
+            largo = int.from_bytes(datos[pos + 4:pos + 8], "big")
+            flags_marco = 0
+        cuerpo = datos[pos + largo_cab:pos + largo_cab + largo]
+        pos += largo_cab + largo
+
+        if id_marco not in (b"APIC", b"PIC"):
+            continue
+        if version == 4:
+            if flags_marco & 0x01:
+                cuerpo = cuerpo[4:]
+            if flags_marco & 0x02:
+                cuerpo = cuerpo.replace(b"\xff\x00", b"\xff")
+
+        codificacion = cuerpo[0]
+        if id_marco == b"PIC":
+            tipo, resto = cuerpo[4], cuerpo[5:]
+        else:
+            fin_mime = cuerpo.index(b"\x00", 1)
+            tipo, resto = cuerpo[fin_mime + 1], cuerpo[fin_mime + 2:]
+        terminador = b"\x00\x00" if codificacion in (1, 2) else b"\x00"
+        i = resto.find(terminador)
+        while terminador == b"\x00\x00" and i >= 0 and i % 2:
+            i = resto.find(terminador, i + 1)
+        imagen = resto[i + len(terminador):] if i >= 0 else resto
+
+        if tipo == 3:
+            return imagen
+        if elegida is None:
+            elegida = imagen
+    return elegida
+
+def _leer_bloque_picture(bloque: bytes) -> Optional[bytes]:
+    # Formato METADATA_BLOCK_PICTURE de FLAC, también usado en comentarios Vorbis
+    pos = 4
+    largo = int.from_bytes(bloque[pos:pos + 4], "big"); pos += 4 + largo
+    largo = int.from_bytes(bloque[pos:pos + 4], "big"); pos += 4 + largo
+    pos += 16
+    largo = int.from_bytes(bloque[pos:pos + 4], "big"); pos += 4
+    return bloque[pos:pos + largo] or None
+
+def _leer_imagen_flac(f) -> Optional[bytes]:
+    if f.read(4) != b"fLaC":
+        return None
+    while True:
+        cabecera = f.read(4)
+        if len(cabecera) < 4:
+            return None
+        ultimo, tipo = cabecera[0] & 0x80, cabecera[0] & 0x7F
+        largo = int.from_bytes(cabecera[1:], "big")
+        if tipo == 6:
+            return _leer_bloque_picture(f.read(largo))
+        f.seek(largo, os.SEEK_CUR)
+        if ultimo:
+            return None
+
+def _leer_imagen_ogg(f) -> Optional[bytes]:
+    # El segundo paquete del flujo es la cabecera de comentarios (Vorbis u Opus)
+    import base64
+    paquetes, actual, leidos = [], b"", 0
+    while len(paquetes) < 2 and leidos < MAX_ETIQUETA:
+        cabecera = f.read(27)
+        if len(cabecera) < 27 or cabecera[:4] != b"OggS":
+            return None
+        segmentos = f.read(cabecera[26])
+        leidos += 27 + len(segmentos)
+        for largo in segmentos:
+            actual += f.read(largo)
+            leidos += largo
+            if largo < 255:
+                paquetes.append(actual)
+                actual = b""
+    if len(paquetes) < 2:
+        return None
+
+    comentarios = paquetes[1]
+    pos = 7 if comentarios.startswith(b"\x03vorbis") else 8 if comentarios.startswith(b"OpusTags") else -1
+    if pos < 0:
+        return None
+    pos += 4 + int.from_bytes(comentarios[pos:pos + 4], "little")
+    total = int.from_bytes(comentarios[pos:pos + 4], "little"); pos += 4
+    for _ in range(total):
+        largo = int.from_bytes(comentarios[pos:pos + 4], "little"); pos += 4
+        clave, _, valor = comentarios[pos:pos + largo].partition(b"=")
+        pos += largo
+        clave = clave.upper()
+        if clave == b"METADATA_BLOCK_PICTURE":
+            return _leer_bloque_picture(base64.b64decode(valor))
+        if clave == b"COVERART":
+            return base64.b64decode(valor)
+    return None
+
+_imagenes_carpeta: Dict[str, Optional[str]] = {}
+
+def buscar_imagen_carpeta(directorio: str) -> Optional[str]:
+    if directorio not in _imagenes_carpeta:
+        encontrada = None
+        try:
+            candidatas = sorted(os.listdir(directorio))
+        except OSError:
+            candidatas = []
+        for nombre in candidatas:
+            base, ext = os.path.splitext(nombre.lower())
+            if ext in EXTENSIONES_IMAGEN and base.startswith(NOMBRES_CARATULA_CARPETA):
+                encontrada = os.path.join(directorio, nombre)
+                break
+        _imagenes_carpeta[directorio] = encontrada
+    return _imagenes_carpeta[directorio]
+
+def extraer_caratula(ruta_archivo: str):
+    """Devuelve los bytes de la carátula incrustada, la ruta de folder.jpg o None."""
+    lectores = {".mp3": _leer_imagen_id3, ".flac": _leer_imagen_flac,
+                ".ogg": _leer_imagen_ogg, ".oga": _leer_imagen_ogg, ".opus": _leer_imagen_ogg}
+    lector = lectores.get(os.path.splitext(ruta_archivo)[1].lower())
+    if lector:
+        try:
+            with open(ruta_archivo, "rb") as f:
+                imagen = lector(f)
+            if imagen:
+                return imagen
+        except (OSError, ValueError, IndexError) as e:
+            logger.debug("Etiquetas ilegibles en %s: %s", ruta_archivo, e)
+    return buscar_imagen_carpeta(os.path.dirname(os.path.abspath(ruta_archivo)))
+
+class GestorCaratulas:
+    """Carátulas en miniatura decodificadas fuera del hilo de Tk.
+
+    Un pool extrae la imagen y genera todas las miniaturas (más un fondo
+    desenfocado) en una sola pasada sobre la caché de imágenes, que al estar
+    direccionada por contenido comparte la misma carátula entre canciones del
+    mismo álbum. Delante hay un LRU de PhotoImage; el hilo de Tk sólo abre PNG
+    pequeños ya escalados.
+    """
+
+    DESENFOQUE_FONDO = 12
+
+    def __init__(self, root, capacidad: int = 256, hilos: int = 2):
+        from concurrent.futures import ThreadPoolExecutor
+        from collections import OrderedDict
+        import queue
+
+        self.root = root
+        self.capacidad = capacidad
+        self.tamanos = {nombre: cache_imagenes.tamano_para(root, nombre)
+                        for nombre in ("caratula_lista", "caratula_mini", "caratula_grande")}
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="caratulas")
+        self.resultados = queue.Queue()
+        self.claves: Dict[str, Optional[str]] = {}
+        self.pngs: Dict[tuple, str] = {}
+        self.fondos: Dict[str, str] = {}
+        self.imagenes = OrderedDict()
+        self.pendientes: Dict[str, list] = {}
+
+    def solicitar(self, ruta_archivo: str, nombre: str, al_cargar) -> None:
+        """Llama a al_cargar(PhotoImage) en el hilo de Tk cuando la miniatura esté lista."""
+        if ruta_archivo in self.claves:
+            imagen = self._imagen(self.claves[ruta_archivo], nombre)
+            if imagen is not None:
+                al_cargar(imagen)
+            return
+
+        esperando = self.pendientes.get(ruta_archivo)
+        if esperando is not None:
+            esperando.append((nombre, al_cargar))
+            return
+        self.pendientes[ruta_archivo] = [(nombre, al_cargar)]
+        self.pool.submit(self._procesar, ruta_archivo)
+
+    def ruta_fondo(self, ruta_archivo: str) -> Optional[str]:
+        clave = self.claves.get(ruta_archivo)
+        return self.fondos.get(clave) if clave else None
+
+    def _procesar(self, ruta_archivo: str):
+        clave, pngs, fondo = None, {}, None
+        try:
+            origen = extraer_caratula(ruta_archivo)
+            if origen is not None:
+                clave = cache_imagenes.hash_origen(origen)
+                for nombre, (ancho, alto) in self.tamanos.items():
+                    pngs[nombre] = cache_imagenes.obtener_ruta(origen, ancho, alto, "recortar", clave=clave)
+                ancho, alto = self.tamanos["caratula_grande"]
+                fondo = cache_imagenes.obtener_ruta(origen, ancho, alto, "recortar",
+                                                    self.DESENFOQUE_FONDO, clave=clave)
+        except Exception as e:
+            logger.warning("No se pudo procesar la carátula de %s: %s", ruta_archivo, e)
+            clave = None
+        self.resultados.put((ruta_archivo, clave, pngs, fondo))
+
+    def procesar_resultados(self) -> None:
+        # Se llama periódicamente desde el hilo de Tk
+        while not self.resultados.empty():
+            ruta_archivo, clave, pngs, fondo = self.resultados.get_nowait()
+            self.claves[ruta_archivo] = clave
+            if clave:
+                for nombre, png in pngs.items():
+                    self.pngs[(clave, nombre)] = png
+                self.fondos[clave] = fondo
+            for nombre, al_cargar in self.pendientes.pop(ruta_archivo, []):
+                imagen = self._imagen(clave, nombre)
+                if imagen is not None:
+                    al_cargar(imagen)
+
+    def _imagen(self, clave: Optional[str], nombre: str) -> Optional[tk.PhotoImage]:
+        if clave is None:
+            return None
+        llave = (clave, nombre)
+        imagen = self.imagenes.get(llave)
+        if imagen is not None:
+            self.imagenes.move_to_end(llave)
+            return imagen
+        png = self.pngs.get(llave)
+        if png is None:
+            return None
+        try:
+            imagen = tk.PhotoImage(file=png, master=self.root)
+        except tk.TclError as e:
+            logger.warning("Miniatura dañada %s: %s", png, e)
+            return None
+        self.imagenes[llave] = imagen
+        if len(self.imagenes) > self.capacidad:
+            self.imagenes.popitem(last=False)
+        return imagen
+
+    def cerrar(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# ==================== LETRAS ====================
+_ETIQUETA_TIEMPO = re.compile(r"\[(\d+):(\d{1,2}(?:[.:]\d{1,3})?)\]")
+_ETIQUETA_DESFASE = re.compile(r"\[offset:\s*([+-]?\d+)\s*\]", re.IGNORECASE)
+
+class Letra:
+    """Letra sincronizada: tiempos ordenados y la línea que empieza en cada uno."""
+
+    def __init__(self, tiempos: List[float], lineas: List[str]):
+        self.tiempos = tiempos
+        self.lineas = lineas
+
+    def __len__(self) -> int:
+        return len(self.tiempos)
+
+    def indice_en(self, segundos: float) -> int:
+        # -1 antes de la primera línea
+        return bisect.bisect_right(self.tiempos, segundos) - 1
+
+def interpretar_lrc(texto: str) -> Letra:
+    """Lee el formato LRC, incluidas varias marcas por línea y la etiqueta [offset:ms]."""
+    desfase = 0.0
+    entradas = []
+    for linea in texto.splitlines():
+        coincidencia = _ETIQUETA_DESFASE.match(linea.strip())
+        if coincidencia:
+            # Un desfase positivo adelanta la letra
+            desfase = -int(coincidencia.group(1)) / 1000
+            continue
+        marcas, posicion = [], 0
+        for marca in _ETIQUETA_TIEMPO.finditer(linea):
+            if marca.start() != posicion:
+                break
+            marcas.append(int(marca.group(1)) * 60 + float(marca.group(2).replace(":", ".")))
+            posicion = marca.end()
+        if marcas:
+            contenido = linea[posicion:].strip()
+            entradas.extend((tiempo, contenido) for tiempo in marcas)
+    entradas.sort(key=lambda entrada: entrada[0])
+    return Letra([max(0.0, tiempo + desfase) for tiempo, _ in entradas], [texto for _, texto in entradas])
+
+def ruta_letra(ruta_archivo: str) -> Optional[str]:
+    base = os.path.splitext(ruta_archivo)[0]
+    for extension in (".lrc", ".LRC"):
+        if os.path.isfile(base + extension):
+            return base + extension
+    return None
+
+class CacheLetras:
+    """Letras ya interpretadas por archivo de audio; se vuelven a leer sólo si el .lrc cambia."""
+
+    def __init__(self, capacidad: int = 256):
+        from collections import OrderedDict
+        self.capacidad = capacidad
+        self.letras: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def obtener(self, ruta_archivo: str) -> Optional[Letra]:
+        ruta = ruta_letra(ruta_archivo)
+        try:
+            firma = firma_archivo(ruta) if ruta else None
+        except OSError:
+            firma = None
+        guardada = self.letras.get(ruta_archivo)
+        if guardada and guardada[0] == firma:
+            self.letras.move_to_end(ruta_archivo)
+            return guardada[1]
+        
+        letra = None
+        if firma:
+            try:
+                with open(ruta, "rb") as f:
+                    crudo = f.read()
+                try:
+                    texto = crudo.decode("utf-8-sig")
+                except UnicodeDecodeError:
+                    texto = crudo.decode("latin-1")
+                letra = interpretar_lrc(texto) or None
+            except OSError as e:
+                logger.warning("No se pudo leer la letra %s: %s", ruta, e)
+        self.letras[ruta_archivo] = (firma, letra)
+        if len(self.letras) > self.capacidad:
+            self.letras.popitem(last=False)
+        return letra
+
 # ==================== PANTALLA DE INICIO ====================
 class PantallaInicio:
     def __init__(self, root, al_iniciar):
@@ -38,13 +736,13 @@ class PantallaInicio:
         marco_principal.place(relx=0.5, rely=0.5, anchor='center')
 
         try:
-            ruta_base = os.path.dirname(os.path.abspath(__file__))
-            ruta_logo = os.path.join(ruta_base, "assets", "logo.png")
-            
-            if os.path.exists(ruta_logo):
-                img = Image.open(ruta_logo)
-                img = img.resize((600, 300), Image.Resampling.LANCZOS)
-                self.imagen_logo = ImageTk.PhotoImage(img)
+            if os.path.exists(RUTA_LOGO):
+                ancho, alto = cache_imagenes.tamano_para(self.root, "logo")
+                self.imagen_logo = cache_imagenes.photoimage(RUTA_LOGO, ancho, alto, master=self.root)
+                
+                ancho, alto = cache_imagenes.tamano_para(self.root, "icono")
+                self.icono = cache_imagenes.photoimage(RUTA_LOGO, ancho, alto, "recortar", master=self.root)
+                self.root.iconphoto(True, self.icono)
                 
                 etiqueta_logo = tk.Label(marco_principal, image=self.imagen_logo, bg='black')
                 etiqueta_logo.pack(pady=20)
@@ -90,15 +788,20 @@ class Cancion:
         self.duracion = duracion
         self.ruta_archivo = ruta_archivo
         self.genero = genero
+        self.fecha_agregada = time.time()
+        self.reproducciones = 0
     
     def __str__(self) -> str:
         return f"{self.titulo} - {self.artista} ({self.duracion:.2f} min)"
     
-    def editar(self, nuevo_titulo: str, nuevo_artista: str, nueva_duracion: float, nuevo_genero: str):
+    def editar(self, nuevo_titulo: str, nuevo_artista: str, nueva_duracion: float, nuevo_genero: str) -> dict:
+        anteriores = {"titulo": self.titulo, "artista": self.artista,
+                      "duracion": self.duracion, "genero": self.genero}
         self.titulo = nuevo_titulo
         self.artista = nuevo_artista
         self.duracion = nueva_duracion
         self.genero = nuevo_genero
+        return anteriores
 
 class NodoCancion:
     def __init__(self, cancion: Cancion):
@@ -114,12 +817,46 @@ class ListaReproduccion:
         self.modo_repeticion = "Ninguno"
         self.volumen = 0.7
         self.posicion_pausa = 0
+        self.posicion_inicio = 0.0
+        self.velocidad = 1.0
+        # Salida de audio: el TrabajadorAudio global o la ZonaAudio de una zona
+        self.audio = trabajador_audio
+        # Turno de self.audio con el que se consulta la posición
+        self.turno = 0
+        # True si el hilo de audio tiene la canción en pausa lista para seguir tal cual
+        self.pausa_valida = False
+        self._fin_en: Optional[float] = None
+        self.recortar_silencios = False
+        self.limites_sonoros: Optional[tuple] = None
         self.fft_data = np.zeros(1024)
         self.audio_lock = threading.Lock()
         self.spectrum_running = True
-        self.spectrum_thread = threading.Thread(target=self.generar_datos_espectro)
-        self.spectrum_thread.daemon = True
-        self.spectrum_thread.start()
+        self.spectrum_thread: Optional[threading.Thread] = None
+        # Funciones f(evento, cancion) para "agregar", "eliminar", "reproducir", "saltar" y "completar"
+        self.oyentes: List = []
+        # f(cancion) -> Optional[Cancion] que elige la siguiente al acabar la lista en modo Radio
+        self.sugerir_siguiente = None
+        # DiarioCambios que recibe las altas y bajas; sólo lo tienen las listas normales
+        self.diario = None
+    
+    def _notificar(self, evento: str, cancion: Cancion) -> None:
+        for oyente in self.oyentes:
+            oyente(evento, cancion)
+    
+    def iniciar_espectro(self):
+        # El hilo del espectro sólo arranca con la primera reproducción
+        if self.spectrum_thread is None and self.spectrum_running and not MODO_SIN_VENTANA:
+            self.spectrum_thread = threading.Thread(target=self.generar_datos_espectro, name="espectro")
+            self.spectrum_thread.daemon = True
+            self.spectrum_thread.start()
+    
+    def detener_espectro(self) -> None:
+        """Termina el hilo del espectro; volverá a arrancar si la lista suena otra vez."""
+        hilo, self.spectrum_thread = self.spectrum_thread, None
+        if hilo:
+            self.spectrum_running = False
+            hilo.join(timeout=0.2)
+            self.spectrum_running = True
     
     def generar_datos_espectro(self):
         while self.spectrum_running:
@@ -158,6 +895,11 @@ class ListaReproduccion:
             return self.fft_data.copy()
     
     def agregar_cancion(self, cancion: Cancion) -> None:
+        self.insertar_antes(cancion, None)
+    
+    def insertar_antes(self, cancion: Cancion, siguiente: Optional[NodoCancion],
+                       registrar: bool = True) -> NodoCancion:
+        """Enlaza la canción justo delante de siguiente (o al final si es None) en O(1)."""
         nuevo_nodo = NodoCancion(cancion)
         if not self.cabeza:
             self.cabeza = nuevo_nodo
@@ -165,42 +907,124 @@ class ListaReproduccion:
             self.cabeza.anterior = self.cabeza
             self.actual = self.cabeza
         else:
-            ultimo = self.cabeza.anterior
-            ultimo.siguiente = nuevo_nodo
-            nuevo_nodo.anterior = ultimo
-            nuevo_nodo.siguiente = self.cabeza
-            self.cabeza.anterior = nuevo_nodo
+            self._enlazar(nuevo_nodo, siguiente)
+        if self.diario and registrar:
+            self.diario.registrar_tramo(self, nuevo_nodo, nuevo_nodo, True)
+        self._notificar("agregar", cancion)
+        if self.recortar_silencios:
+            cache_silencios.analizar([cancion.ruta_archivo])
+        return nuevo_nodo
     
-    def eliminar_cancion(self, titulo: str) -> bool:
-        if not self.cabeza:
-            return False
-        
-        if self.cabeza.cancion.titulo == titulo:
-            if self.cabeza.siguiente == self.cabeza:
-                self.cabeza = None
-                self.actual = None
+    def _enlazar(self, nodo: NodoCancion, siguiente: Optional[NodoCancion]) -> None:
+        destino = siguiente or self.cabeza
+        anterior = destino.anterior
+        anterior.siguiente = nodo
+        nodo.anterior = anterior
+        nodo.siguiente = destino
+        destino.anterior = nodo
+        if siguiente is self.cabeza:
+            self.cabeza = nodo
+    
+    def mover_antes(self, nodo: NodoCancion, siguiente: Optional[NodoCancion]) -> None:
+        """Cambia el nodo de sitio sin avisos; si es el actual, sigue sonando."""
+        if nodo.siguiente is (siguiente or self.cabeza):
+            if siguiente is self.cabeza:
+                self.cabeza = nodo
+            return
+        if self.cabeza is nodo:
+            self.cabeza = nodo.siguiente
+        nodo.anterior.siguiente = nodo.siguiente
+        nodo.siguiente.anterior = nodo.anterior
+        self._enlazar(nodo, siguiente)
+    
+    def agregar_canciones(self, canciones: Iterable[Cancion]) -> int:
+        """Encadena las canciones aparte y las empalma al final de una sola vez."""
+        primero = ultimo = None
+        total = 0
+        for cancion in canciones:
+            nodo = NodoCancion(cancion)
+            if primero is None:
+                primero = nodo
             else:
-                ultimo = self.cabeza.anterior
-                self.cabeza = self.cabeza.siguiente
-                self.cabeza.anterior = ultimo
-                ultimo.siguiente = self.cabeza
-                if self.actual and self.actual.cancion.titulo == titulo:
-                    self.actual = self.cabeza
-            return True
+                ultimo.siguiente = nodo
+                nodo.anterior = ultimo
+            ultimo = nodo
+            total += 1
+            self._notificar("agregar", cancion)
+            if self.recortar_silencios:
+                cache_silencios.analizar([cancion.ruta_archivo])
+        
+        if primero is None:
+            return 0
+        if not self.cabeza:
+            self.cabeza = primero
+            self.actual = primero
+        else:
+            cola = self.cabeza.anterior
+            cola.siguiente = primero
+            primero.anterior = cola
+        ultimo.siguiente = self.cabeza
+        self.cabeza.anterior = ultimo
+        if self.diario:
+            self.diario.registrar_tramo(self, primero, ultimo, True)
+        return total
+    
+    def buscar_nodo(self, titulo: str) -> Optional[NodoCancion]:
+        if not self.cabeza:
+            return None
         
         temp = self.cabeza
         while True:
-            if temp.siguiente.cancion.titulo == titulo:
-                temp.siguiente = temp.siguiente.siguiente
-                temp.siguiente.anterior = temp
-                if self.actual and self.actual.cancion.titulo == titulo:
-                    self.actual = temp.siguiente
-                return True
+            if temp.cancion.titulo == titulo:
+                return temp
+            temp = temp.siguiente
+            if temp == self.cabeza:
+                break
+        return None
+    
+    def eliminar_nodo(self, nodo: NodoCancion) -> None:
+        """Desenlaza el nodo en O(1); si era el actual, lo deja de sonar y pasa al siguiente."""
+        if self.diario:
+            self.diario.registrar_tramo(self, nodo, nodo, False)
+        if nodo is self.actual:
+            self._soltar_actual()
+        if nodo.siguiente is nodo:
+            self.cabeza = None
+            self.actual = None
+        else:
+            nodo.anterior.siguiente = nodo.siguiente
+            nodo.siguiente.anterior = nodo.anterior
+            if self.cabeza is nodo:
+                self.cabeza = nodo.siguiente
+            if self.actual is nodo:
+                self.actual = nodo.siguiente
+        self._notificar("eliminar", nodo.cancion)
+    
+    def _soltar_actual(self) -> None:
+        # La canción que suena va a dejar de estar en la lista: se corta sin aviso de fin,
+        # que si no se atribuiría a la siguiente
+        if self.reproduciendo or self.pausa_valida or self.posicion_pausa > 0:
+            self.audio.detener(silencioso=True)
+            self.reproduciendo = False
+            self.posicion_pausa = 0
+            self.pausa_valida = False
+    
+    def eliminar_cancion(self, titulo: str) -> bool:
+        nodo = self.buscar_nodo(titulo)
+        if not nodo:
+            return False
+        self.eliminar_nodo(nodo)
+        return True
+    
+    def iterar_canciones(self) -> Iterator[Cancion]:
+        if not self.cabeza:
+            return
+        temp = self.cabeza
+        while True:
+            yield temp.cancion
             temp = temp.siguiente
             if temp == self.cabeza:
                 break
-        
-        return False
     
     def obtener_canciones(self) -> List[Cancion]:
         canciones = []
@@ -229,40 +1053,80 @@ class ListaReproduccion:
         return None
     
     def reproducir(self, desde_pausa=False) -> None:
+        """Encola la canción actual en el hilo de audio; no espera a que se abra el archivo."""
         if not self.cabeza or not self.actual:
             return
         
         if not os.path.exists(self.actual.cancion.ruta_archivo):
-            messagebox.showerror("Error", f"Archivo no encontrado: {self.actual.cancion.ruta_archivo}")
+            reportar_error(f"Archivo no encontrado: {self.actual.cancion.ruta_archivo}")
             return
         
-        try:
-            mixer.init()
-            mixer.music.load(self.actual.cancion.ruta_archivo)
-            mixer.music.set_volume(self.volumen)
-            
-            if desde_pausa and self.posicion_pausa > 0:
-                mixer.music.play(start=self.posicion_pausa)
-            else:
-                mixer.music.play()
-                self.posicion_pausa = 0
-                
-            self.reproduciendo = True
-            mixer.music.set_endevent(pygame.USEREVENT)
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo reproducir: {e}")
+        self.iniciar_espectro()
+        self.limites_sonoros = self._buscar_limites()
+        # Con el recorte activo, una canción nueva empieza en su primer sonido
+        desplazamiento = 0.0
+        if not desde_pausa and self.limites_sonoros and self.limites_sonoros[0] > MARGEN_SILENCIO:
+            desplazamiento = self.limites_sonoros[0] - MARGEN_SILENCIO
+        inicio = self.posicion_pausa if desde_pausa else desplazamiento
+        self.turno = self.audio.reproducir(self.actual.cancion.ruta_archivo, inicio,
+                                                 self.velocidad, self.volumen, self._fin_en)
+        self._fin_en = None
+        self.posicion_inicio = inicio
+        if not desde_pausa:
+            self.posicion_pausa = 0
+        self.pausa_valida = False
+        self.reproduciendo = True
+        if not desde_pausa:
+            self._notificar("reproducir", self.actual.cancion)
     
     def manejar_fin(self):
+        # El hilo de audio mide desde aquí hasta que suena la siguiente
+        self._fin_en = time.perf_counter()
+        self._manejar_fin()
+        self._fin_en = None
+    
+    def al_aviso_audio(self, evento: str, turno: int, datos=None) -> Optional[str]:
+        """Aplica un aviso de TrabajadorAudio en el hilo dueño; devuelve el mensaje si era un error suyo."""
+        if evento == "fin" and turno == self.turno and self.reproduciendo:
+            self.manejar_fin()
+        elif evento == "error" and turno in (0, self.turno):
+            self.reproduciendo = False
+            self.pausa_valida = False
+            return datos
+        return None
+    
+    def _manejar_fin(self):
+        # Si fue el recorte de silencios quien adelantó el fin, se corta sin generar otro aviso
+        self.audio.detener(silencioso=True)
+        if self.actual:
+            self._notificar("completar", self.actual.cancion)
+        self.reproduciendo = False
+        self.posicion_pausa = 0
+        
         if self.modo_repeticion == "Una canción":
             self.reproducir()
         elif self.modo_repeticion == "Toda la lista":
             self.siguiente()
-        else:
-            self.reproduciendo = False
+        elif self.modo_repeticion == "Radio" and self.actual:
+            if self.actual.siguiente is not self.cabeza:
+                self.siguiente()
+                return
+            sugerida = self.sugerir_siguiente(self.actual.cancion) if self.sugerir_siguiente else None
+            if sugerida:
+                # Lo que añade la radio no es un cambio del usuario: no entra en el diario
+                self.insertar_antes(sugerida, None, registrar=False)
+                self.actual = self.actual.siguiente
+                self.reproducir()
+    
+    def _registrar_salto(self) -> None:
+        # Cambiar de canción a mitad de reproducción cuenta como salto
+        if self.actual and (self.reproduciendo or self.posicion_pausa > 0):
+            self._notificar("saltar", self.actual.cancion)
     
     def siguiente(self) -> None:
         if not self.cabeza or not self.actual:
             return
+        self._registrar_salto()
         self.actual = self.actual.siguiente
         self.posicion_pausa = 0
         self.reproducir()
@@ -270,29 +1134,93 @@ class ListaReproduccion:
     def anterior(self) -> None:
         if not self.cabeza or not self.actual:
             return
+        self._registrar_salto()
         self.actual = self.actual.anterior
         self.posicion_pausa = 0
         self.reproducir()
     
+    def _buscar_limites(self) -> Optional[tuple]:
+        if not self.recortar_silencios or not self.actual:
+            return None
+        return cache_silencios.obtener(self.actual.cancion.ruta_archivo)
+    
+    def activar_recorte(self, activo: bool) -> None:
+        """Activa en esta lista el salto de silencios al principio y al final de cada canción."""
+        self.recortar_silencios = activo
+        self.limites_sonoros = None
+        if activo:
+            cache_silencios.analizar(cancion.ruta_archivo for cancion in self.iterar_canciones())
+    
+    def alcanzo_silencio_final(self) -> bool:
+        """True si la canción ya sólo tiene silencio por delante; el llamador debe tratarlo como su fin."""
+        if not self.recortar_silencios or not self.reproduciendo:
+            return False
+        if self.limites_sonoros is None:
+            # El análisis pudo terminar después de empezar la canción
+            self.limites_sonoros = self._buscar_limites()
+            if self.limites_sonoros is None:
+                return False
+        _, fin, duracion = self.limites_sonoros
+        if duracion - fin < 2 * MARGEN_SILENCIO:
+            return False
+        return self.obtener_posicion() >= fin + MARGEN_SILENCIO
+    
+    def cambiar_velocidad(self, velocidad: float) -> float:
+        """Cambia la velocidad (0,5x a 2x) sin cambiar el tono, retomando desde la posición actual."""
+        velocidad = round(min(VELOCIDAD_MAXIMA, max(VELOCIDAD_MINIMA, velocidad)), 2)
+        if velocidad == self.velocidad:
+            return velocidad
+        if self.reproduciendo:
+            self.posicion_pausa = self.obtener_posicion()
+            self.velocidad = velocidad
+            self.reproducir(desde_pausa=True)
+        else:
+            # En pausa: se reanudará desde posicion_pausa con la nueva velocidad
+            self.velocidad = velocidad
+            self.pausa_valida = False
+        return velocidad
+    
+    def obtener_posicion(self) -> float:
+        """Segundos reproducidos de la canción actual, contando los saltos."""
+        if self.reproduciendo:
+            posicion = self.audio.posicion(self.turno)
+            return self.posicion_inicio if posicion is None else posicion
+        return float(self.posicion_pausa)
+    
+    def saltar_a(self, segundos: float) -> None:
+        if not self.actual:
+            return
+        self.posicion_pausa = max(0.0, segundos)
+        if self.reproduciendo:
+            self.reproducir(desde_pausa=True)
+        else:
+            self.pausa_valida = False
+    
+    def ajustar_volumen(self, volumen: float) -> None:
+        self.volumen = min(1.0, max(0.0, volumen))
+        self.audio.ajustar_volumen(self.volumen)
+    
     def pausar(self) -> None:
         if self.reproduciendo:
-            self.posicion_pausa = mixer.music.get_pos() / 1000
-            mixer.music.pause()
+            self.posicion_pausa = self.obtener_posicion()
+            self.audio.pausar()
             self.reproduciendo = False
+            self.pausa_valida = True
     
     def reanudar(self) -> None:
         if not self.reproduciendo and self.actual:
-            if self.posicion_pausa > 0:
-                self.reproducir(desde_pausa=True)
+            if self.pausa_valida:
+                self.audio.reanudar()
+                self.reproduciendo = True
+                self.pausa_valida = False
             else:
-                mixer.music.unpause()
-            self.reproduciendo = True
+                self.reproducir(desde_pausa=True)
     
     def detener(self) -> None:
-        if mixer.get_init():
-            mixer.music.stop()
-            self.reproduciendo = False
-            self.posicion_pausa = 0
+        self.audio.detener()
+        self.reproduciendo = False
+        self.posicion_pausa = 0
+        self.pausa_valida = False
     
     def cambiar_modo_repeticion(self) -> str:
         indice_actual = MODOS_REPETICION.index(self.modo_repeticion)
@@ -307,6 +1235,8 @@ class ListaReproduccion:
         temp = self.cabeza
         while True:
             if temp.cancion.titulo == cancion.titulo:
+                if temp is not self.actual:
+                    self._registrar_salto()
                 self.actual = temp
                 self.posicion_pausa = 0
                 self.reproducir()
@@ -315,47 +1245,3485 @@ class ListaReproduccion:
             if temp == self.cabeza:
                 break
 
-class GestorListas:
-    def __init__(self):
-        self.listas: Dict[str, ListaReproduccion] = {}
-        self.lista_actual: Optional[ListaReproduccion] = None
-    
-    def crear_lista(self, nombre: str) -> bool:
-        if nombre in self.listas:
-            return False
-        self.listas[nombre] = ListaReproduccion()
-        return True
-    
-    def seleccionar_lista(self, nombre: str) -> bool:
-        if nombre not in self.listas:
-            return False
-        self.lista_actual = self.listas[nombre]
-        return True
-    
-    def eliminar_lista(self, nombre: str) -> bool:
-        if nombre not in self.listas:
-            return False
-        
-        if self.lista_actual == self.listas[nombre]:
-            self.lista_actual.detener()
-            self.lista_actual = None
-        
-        del self.listas[nombre]
-        return True
-    
-    def obtener_nombres_listas(self) -> List[str]:
-        return list(self.listas.keys())
+# ==================== HISTORIAL ====================
+TIPOS_EVENTO_HISTORIAL = {"reproducir": 0, "saltar": 1, "completar": 2}
+
+class HistorialReproduccion:
+    """Registro de reproducciones, saltos y escuchas completas en SQLite.
+
+    Los eventos se guardan como filas compactas (marca de tiempo, id de pista,
+    tipo) en una tabla de sólo inserción. Un hilo escritor los vuelca por lotes
+    junto con los contadores agregados de cada pista, que además se mantienen en
+    memoria: consultar reproducciones, saltos o última escucha es O(1) aunque el
+    historial tenga años.
+    """
+
+    TAMANO_LOTE = 500
+    INTERVALO_VOLCADO = 1.0
+
+    def __init__(self, ruta: Optional[str] = None):
+        import queue
+        import sqlite3
+        self.ruta = ruta or directorio_datos("data", "historial.sqlite3")
+        if self.ruta != ":memory:":
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        self.conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        with self.conexion:
+            self.conexion.execute("PRAGMA journal_mode=WAL")
+            self.conexion.executescript("""
+                CREATE TABLE IF NOT EXISTS pistas (id INTEGER PRIMARY KEY, ruta TEXT UNIQUE NOT NULL);
+                CREATE TABLE IF NOT EXISTS eventos (ts REAL NOT NULL, pista INTEGER NOT NULL, tipo INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS estadisticas (
+                    pista INTEGER PRIMARY KEY, reproducciones INTEGER NOT NULL DEFAULT 0,
+                    saltos INTEGER NOT NULL DEFAULT 0, completadas INTEGER NOT NULL DEFAULT 0,
+                    ultima REAL);
+            """)
+        self.ids_pista: Dict[str, int] = dict(self.conexion.execute("SELECT ruta, id FROM pistas"))
+        # ruta -> [reproducciones, saltos, completadas, ultima]
+        self.contadores: Dict[str, list] = {
+            ruta: [rep, saltos, comp, ultima] for ruta, rep, saltos, comp, ultima in self.conexion.execute(
+                "SELECT p.ruta, e.reproducciones, e.saltos, e.completadas, e.ultima "
+                "FROM estadisticas e JOIN pistas p ON p.id = e.pista")
+        }
+        self.cola = queue.Queue()
+        self.hilo = threading.Thread(target=self._escribir, name="historial", daemon=True)
+        self.hilo.start()
+
+    @staticmethod
+    def _clave(cancion: Cancion) -> str:
+        return os.path.abspath(cancion.ruta_archivo)
+
+    def registrar(self, evento: str, cancion: Cancion) -> None:
+        tipo = TIPOS_EVENTO_HISTORIAL.get(evento)
+        if tipo is None:
+            return
+        ruta = self._clave(cancion)
+        ahora = time.time()
+        contadores = self.contadores.setdefault(ruta, [0, 0, 0, None])
+        contadores[tipo] += 1
+        if tipo == 0:
+            contadores[3] = ahora
+        self.cola.put((ahora, ruta, tipo))
+
+    def estadisticas(self, cancion: Cancion) -> dict:
+        reproducciones, saltos, completadas, ultima = self.contadores.get(self._clave(cancion), (0, 0, 0, None))
+        return {"reproducciones": reproducciones, "saltos": saltos, "completadas": completadas,
+                "ultima": ultima, "tasa_saltos": saltos / reproducciones if reproducciones else 0.0}
+
+    def reproducciones(self, cancion: Cancion) -> int:
+        return self.contadores.get(self._clave(cancion), (0,))[0]
+
+    def mas_reproducidas(self, cantidad: int = 25) -> List[tuple]:
+        import heapq
+        return heapq.nlargest(cantidad, ((c[0], ruta) for ruta, c in self.contadores.items()))
+
+    def _id_pista(self, ruta: str) -> int:
+        ident = self.ids_pista.get(ruta)
+        if ident is None:
+            self.conexion.execute("INSERT OR IGNORE INTO pistas (ruta) VALUES (?)", (ruta,))
+            ident = self.conexion.execute("SELECT id FROM pistas WHERE ruta = ?", (ruta,)).fetchone()[0]
+            self.ids_pista[ruta] = ident
+        return ident
+
+    def _volcar(self, lote: list):
+        deltas: Dict[int, list] = {}
+        filas = []
+        with self.conexion:
+            for ts, ruta, tipo in lote:
+                pista = self._id_pista(ruta)
+                filas.append((ts, pista, tipo))
+                delta = deltas.setdefault(pista, [0, 0, 0, None])
+                delta[tipo] += 1
+                if tipo == 0:
+                    delta[3] = ts
+            self.conexion.executemany("INSERT INTO eventos (ts, pista, tipo) VALUES (?, ?, ?)", filas)
+            self.conexion.executemany(
+                "INSERT INTO estadisticas (pista, reproducciones, saltos, completadas, ultima) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(pista) DO UPDATE SET "
+                "reproducciones = reproducciones + excluded.reproducciones, "
+                "saltos = saltos + excluded.saltos, completadas = completadas + excluded.completadas, "
+                "ultima = COALESCE(excluded.ultima, ultima)",
+                [(pista, *delta) for pista, delta in deltas.items()])
+
+    def _escribir(self):
+        import queue
+        activo = True
+        while activo:
+            lote = []
+            try:
+                elemento = self.cola.get(timeout=self.INTERVALO_VOLCADO)
+                limite = time.monotonic() + self.INTERVALO_VOLCADO
+                while elemento is not None:
+                    lote.append(elemento)
+                    if len(lote) >= self.TAMANO_LOTE:
+                        break
+                    elemento = self.cola.get(timeout=max(0.0, limite - time.monotonic()))
+                else:
+                    activo = False
+            except queue.Empty:
+                pass
+            if lote:
+                try:
+                    self._volcar(lote)
+                except Exception as e:
+                    logger.error("No se pudo guardar el historial: %s", e)
+
+    def cerrar(self):
+        self.cola.put(None)
+        self.hilo.join(timeout=5)
+        self.conexion.close()
+
+def abrir_historial() -> Optional[HistorialReproduccion]:
+    if os.environ.get("YAUTJA_HISTORIAL", "1") == "0":
+        return None
+    try:
+        return HistorialReproduccion()
+    except Exception as e:
+        logger.error("Historial desactivado: %s", e)
+        return None
+
+# ==================== LISTAS INTELIGENTES ====================
+CAMPOS_TEXTO = ("titulo", "artista", "genero")
+CAMPOS_NUMERICOS = ("duracion", "fecha_agregada", "reproducciones")
+ALIAS_CAMPOS = {"título": "titulo", "género": "genero", "duración": "duracion",
+                "agregada": "fecha_agregada", "reproducida": "reproducciones"}
+OPERADORES = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "~": lambda a, b: b in a,
+}
+PREFIJO_INTELIGENTE = "★ "
+LISTAS_INTELIGENTES_PREDEFINIDAS = {
+    "Recientes": {"reglas": [], "orden": "fecha_agregada", "limite": 50},
+    "Más reproducidas": {"reglas": [("reproducciones", ">", 0)], "orden": "reproducciones", "limite": 25},
+}
+
+def interpretar_reglas(texto: str) -> List[tuple]:
+    """Convierte "genero = Rock y duracion < 5" en [(campo, operador, valor), ...]."""
+    reglas = []
+    for condicion in re.split(r"\s+(?:y|and)\s+|\s*&&\s*", texto.strip(), flags=re.IGNORECASE):
+        if not condicion:
+            continue
+        coincidencia = re.match(r"^\s*([\wáéíóú]+)\s*(<=|>=|!=|=|<|>|~)\s*(.+?)\s*$", condicion)
+        if not coincidencia:
+            raise ValueError(f"Condición no válida: '{condicion}'")
+        campo, operador, valor = coincidencia.groups()
+        campo = ALIAS_CAMPOS.get(campo.lower(), campo.lower())
+        if campo in CAMPOS_NUMERICOS:
+            try:
+                valor = float(valor.lower().removesuffix("min").strip())
+            except ValueError:
+                raise ValueError(f"'{campo}' necesita un número")
+            if operador == "~":
+                raise ValueError(f"'~' sólo sirve para texto")
+        elif campo not in CAMPOS_TEXTO:
+            raise ValueError(f"Campo desconocido: '{campo}'")
+        reglas.append((campo, operador, valor))
+    return reglas
+
+def _valor_campo(cancion: Cancion, campo: str):
+    valor = getattr(cancion, campo)
+    return valor.lower() if campo in CAMPOS_TEXTO else valor
+
+class Biblioteca:
+    """Todas las canciones de las listas normales, con índices por campo.
+
+    Los campos de texto tienen un índice de igualdad (valor -> ids) y los
+    numéricos una lista ordenada de (valor, id) para rangos con bisect.
+    Cada alta, baja o cambio avisa a los oyentes con f(cancion, presente).
+    """
+
+    def __init__(self):
+        self.canciones: Dict[int, Cancion] = {}
+        self.referencias: Dict[int, int] = {}
+        self.por_texto: Dict[str, Dict[str, set]] = {campo: {} for campo in CAMPOS_TEXTO}
+        self.ordenados: Dict[str, list] = {campo: [] for campo in CAMPOS_NUMERICOS}
+        # Ruta absoluta -> ids de las canciones de ese archivo
+        self.rutas: Dict[str, set] = {}
+        self.oyentes: List = []
+
+    def _indexar(self, cancion: Cancion, valores: dict):
+        ident = id(cancion)
+        for campo, valor in valores.items():
+            if campo in CAMPOS_TEXTO:
+                self.por_texto[campo].setdefault(valor.lower(), set()).add(ident)
+            elif campo in CAMPOS_NUMERICOS:
+                bisect.insort(self.ordenados[campo], (valor, ident))
+
+    def _desindexar(self, cancion: Cancion, valores: dict):
+        ident = id(cancion)
+        for campo, valor in valores.items():
+            if campo in CAMPOS_TEXTO:
+                ids = self.por_texto[campo].get(valor.lower())
+                if ids is not None:
+                    ids.discard(ident)
+                    if not ids:
+                        del self.por_texto[campo][valor.lower()]
+            elif campo in CAMPOS_NUMERICOS:
+                ordenados = self.ordenados[campo]
+                i = bisect.bisect_left(ordenados, (valor, ident))
+                if i < len(ordenados) and ordenados[i] == (valor, ident):
+                    del ordenados[i]
+
+    @staticmethod
+    def _valores(cancion: Cancion) -> dict:
+        return {campo: getattr(cancion, campo) for campo in CAMPOS_TEXTO + CAMPOS_NUMERICOS}
+
+    def _avisar(self, cancion: Cancion, presente: bool):
+        for oyente in self.oyentes:
+            oyente(cancion, presente)
+
+    def registrar(self, cancion: Cancion):
+        ident = id(cancion)
+        self.referencias[ident] = self.referencias.get(ident, 0) + 1
+        if self.referencias[ident] == 1:
+            self.canciones[ident] = cancion
+            self.rutas.setdefault(os.path.abspath(cancion.ruta_archivo), set()).add(ident)
+            self._indexar(cancion, self._valores(cancion))
+            self._avisar(cancion, True)
+
+    def retirar(self, cancion: Cancion):
+        ident = id(cancion)
+        if ident not in self.referencias:
+            return
+        self.referencias[ident] -= 1
+        if self.referencias[ident] == 0:
+            del self.referencias[ident]
+            del self.canciones[ident]
+            ruta = os.path.abspath(cancion.ruta_archivo)
+            self.rutas[ruta].discard(ident)
+            if not self.rutas[ruta]:
+                del self.rutas[ruta]
+            self._desindexar(cancion, self._valores(cancion))
+            self._avisar(cancion, False)
+
+    def reindexar(self, cancion: Cancion, anteriores: dict):
+        if id(cancion) not in self.canciones:
+            return
+        cambiados = {campo: valor for campo, valor in anteriores.items() if getattr(cancion, campo) != valor}
+        if cambiados:
+            self._desindexar(cancion, cambiados)
+            self._indexar(cancion, {campo: getattr(cancion, campo) for campo in cambiados})
+            self._avisar(cancion, True)
+
+    def por_ruta(self, ruta: str) -> Optional[Cancion]:
+        idents = self.rutas.get(os.path.abspath(ruta))
+        return self.canciones[next(iter(idents))] if idents else None
+
+    def candidatos(self, regla: tuple) -> Optional[set]:
+        """Ids que pueden cumplir la regla según el índice, o None si no hay índice útil."""
+        campo, operador, valor = regla
+        if campo in CAMPOS_TEXTO:
+            return set(self.por_texto[campo].get(valor.lower(), ())) if operador == "=" else None
+        if operador in ("~", "!="):
+            return None
+        ordenados = self.ordenados[campo]
+        izquierda = bisect.bisect_left(ordenados, (valor, -1))
+        derecha = bisect.bisect_right(ordenados, (valor, math.inf))
+        tramo = {"<": (0, izquierda), "<=": (0, derecha), ">": (derecha, len(ordenados)),
+                 ">=": (izquierda, len(ordenados)), "=": (izquierda, derecha)}[operador]
+        return {ident for _, ident in ordenados[tramo[0]:tramo[1]]}
+
+class ListaInteligente:
+    """Lista definida por reglas (todas deben cumplirse) que se mantiene al día sola.
+
+    Sólo se construye una vez a partir de los índices de la Biblioteca; después
+    cada cambio de una canción se evalúa contra las reglas en O(reglas), sin
+    recorrer la biblioteca. Con "orden" guarda un ranking ordenado (con bisect)
+    y cada canción entra en self.lista en su puesto; con "limite" además sólo
+    son miembros los primeros "limite". Los cambios se avisan como diferencia
+    f(agregadas, retiradas), con agregadas como pares (cancion, posicion) en
+    orden de posición; una canción que sólo cambia de puesto va en las dos.
+    """
+
+    def __init__(self, nombre: str, reglas: List[tuple], biblioteca: Biblioteca,
+                 orden: Optional[str] = None, limite: Optional[int] = None, descendente: bool = True):
+        self.nombre = nombre
+        self.reglas = reglas
+        self.biblioteca = biblioteca
+        self.orden = orden
+        self.limite = limite
+        self.descendente = descendente
+        self.lista = ListaReproduccion()
+        self.miembros: Dict[int, NodoCancion] = {}
+        self.ranking: list = []
+        self.claves: Dict[int, float] = {}
+        self.oyentes: List = []
+        self.reconstruir()
+        biblioteca.oyentes.append(self.actualizar)
+
+    def coincide(self, cancion: Cancion) -> bool:
+        return all(OPERADORES[operador](_valor_campo(cancion, campo),
+                                        valor.lower() if isinstance(valor, str) else valor)
+                   for campo, operador, valor in self.reglas)
+
+    def reconstruir(self):
+        conjuntos = [c for c in (self.biblioteca.candidatos(r) for r in self.reglas) if c is not None]
+        if conjuntos:
+            conjuntos.sort(key=len)
+            base = conjuntos[0].intersection(*conjuntos[1:])
+        else:
+            base = self.biblioteca.canciones.keys()
+        coincidentes = [self.biblioteca.canciones[i] for i in base if self.coincide(self.biblioteca.canciones[i])]
+
+        if self.orden:
+            self.claves = {id(c): getattr(c, self.orden) for c in coincidentes}
+            self.ranking = sorted((clave, ident) for ident, clave in self.claves.items())
+            self._aplicar_ranking()
+        else:
+            self._cambiar(coincidentes, [])
+
+    def _indice_ranking(self, ident: int) -> int:
+        return bisect.bisect_left(self.ranking, (self.claves[ident], ident))
+
+    def _posicion(self, ident: int) -> int:
+        i = self._indice_ranking(ident)
+        return len(self.ranking) - 1 - i if self.descendente else i
+
+    def _nodo_siguiente(self, ident: int) -> Optional[NodoCancion]:
+        # Miembro que va justo detrás en la lista, o None si a ident le toca ser el último
+        j = self._indice_ranking(ident) + (-1 if self.descendente else 1)
+        return self.miembros.get(self.ranking[j][1]) if 0 <= j < len(self.ranking) else None
+
+    def _avisar(self, agregadas: List[tuple], retiradas: List[Cancion]):
+        if agregadas or retiradas:
+            for oyente in self.oyentes:
+                oyente(agregadas, retiradas)
+
+    def _cambiar(self, agregadas: List[Cancion], retiradas: List[Cancion]):
+        for cancion in retiradas:
+            self.lista.eliminar_nodo(self.miembros.pop(id(cancion)))
+        if self.orden:
+            # De atrás adelante: el miembro que sigue a cada nueva ya está enlazado
+            agregadas = sorted(agregadas, key=lambda c: self._posicion(id(c)), reverse=True)
+            for cancion in agregadas:
+                self.miembros[id(cancion)] = self.lista.insertar_antes(cancion, self._nodo_siguiente(id(cancion)))
+            diferencia = [(cancion, self._posicion(id(cancion))) for cancion in reversed(agregadas)]
+        else:
+            diferencia = []
+            for cancion in agregadas:
+                self.miembros[id(cancion)] = self.lista.insertar_antes(cancion, None)
+                diferencia.append((cancion, len(self.miembros) - 1))
+        self._avisar(diferencia, retiradas)
+
+    def _recolocar(self, cancion: Cancion):
+        # Un miembro cuya clave cambió: se mueve su nodo, sin bajas ni altas en la lista
+        nodo = self.miembros[id(cancion)]
+        siguiente = self._nodo_siguiente(id(cancion))
+        if nodo.siguiente is (siguiente or self.lista.cabeza) and siguiente is not self.lista.cabeza:
+            return
+        self.lista.mover_antes(nodo, siguiente)
+        self._avisar([(cancion, self._posicion(id(cancion)))], [cancion])
+
+    def _aplicar_ranking(self):
+        # Como mucho "limite" miembros: comparar los conjuntos es O(limite)
+        ranking = reversed(self.ranking) if self.descendente else iter(self.ranking)
+        primeros = [ident for _, ident in itertools.islice(ranking, self.limite)]
+        nuevos = set(primeros)
+        retiradas = [nodo.cancion for ident, nodo in self.miembros.items() if ident not in nuevos]
+        agregadas = [self.biblioteca.canciones[i] for i in primeros if i not in self.miembros]
+        self._cambiar(agregadas, retiradas)
+
+    def actualizar(self, cancion: Cancion, presente: bool):
+        ident = id(cancion)
+        cumple = presente and self.coincide(cancion)
+        if self.orden:
+            anterior = self.claves.pop(ident, None)
+            if anterior is not None:
+                i = bisect.bisect_left(self.ranking, (anterior, ident))
+                if i < len(self.ranking) and self.ranking[i] == (anterior, ident):
+                    del self.ranking[i]
+            if cumple:
+                clave = getattr(cancion, self.orden)
+                self.claves[ident] = clave
+                bisect.insort(self.ranking, (clave, ident))
+                if ident in self.miembros:
+                    # Sigue dentro: con límite, los demás miembros tampoco cambian
+                    self._recolocar(cancion)
+                    return
+            if self.limite is not None:
+                self._aplicar_ranking()
+                return
+
+        if cumple and ident not in self.miembros:
+            self._cambiar([cancion], [])
+        elif not cumple and ident in self.miembros:
+            self._cambiar([], [cancion])
+
+class GestorListas:
+    def __init__(self, historial: Optional[HistorialReproduccion] = None):
+        self.listas: Dict[str, ListaReproduccion] = {}
+        self.lista_actual: Optional[ListaReproduccion] = None
+        self.historial = historial
+        self.radio = Radio()
+        self.biblioteca = Biblioteca()
+        self.listas_inteligentes: Dict[str, ListaInteligente] = {}
+        # Funciones f(lista_inteligente, agregadas, retiradas) para refrescar vistas;
+        # agregadas son pares (cancion, posicion)
+        self.oyentes_inteligentes: List = []
+        # Funciones f(cancion, valores_anteriores) avisadas tras editar una canción
+        self.al_editar: List = [self.biblioteca.reindexar]
+        self.diario: Optional[DiarioCambios] = None
+        # Se crea con la primera zona
+        self.mezclador: Optional[MezcladorZonas] = None
+        for nombre, definicion in LISTAS_INTELIGENTES_PREDEFINIDAS.items():
+            self.crear_lista_inteligente(nombre, **definicion)
+        self.diario = DiarioCambios(self, ruta_diario_deshacer())
+    
+    def _registrar_lista(self, nombre: str, lista: ListaReproduccion):
+        lista.oyentes.append(self._al_evento_lista)
+        lista.sugerir_siguiente = self.sugerir_radio
+        lista.diario = self.diario
+        self.listas[nombre] = lista
+    
+    def _al_evento_lista(self, evento: str, cancion: Cancion):
+        if evento == "agregar":
+            if self.historial:
+                cancion.reproducciones = self.historial.reproducciones(cancion)
+            self.biblioteca.registrar(cancion)
+        elif evento == "eliminar":
+            self.biblioteca.retirar(cancion)
+        else:
+            self._al_evento_reproduccion(evento, cancion)
+    
+    def _al_evento_reproduccion(self, evento: str, cancion: Cancion):
+        if self.historial:
+            self.historial.registrar(evento, cancion)
+        if evento == "reproducir":
+            self.radio.escuchada(cancion.ruta_archivo)
+            anterior = cancion.reproducciones
+            cancion.reproducciones += 1
+            self.biblioteca.reindexar(cancion, {"reproducciones": anterior})
+    
+    def editar_cancion(self, cancion: Cancion, titulo: str, artista: str, duracion: float, genero: str):
+        anteriores = cancion.editar(titulo, artista, duracion, genero)
+        for oyente in list(self.al_editar):
+            oyente(cancion, anteriores)
+    
+    def sugerir_radio(self, cancion: Cancion) -> Optional[Cancion]:
+        ruta = self.radio.sugerir(cancion.ruta_archivo)
+        if ruta is None:
+            logger.info("Radio: no hay canciones analizadas parecidas a %s", cancion.titulo)
+            return None
+        # La misma Cancion que ya está en la biblioteca conserva sus datos editados y su índice
+        return self.biblioteca.por_ruta(ruta) or cancion_desde_archivo(ruta)
+    
+    def crear_lista(self, nombre: str) -> bool:
+        if nombre in self.listas:
+            return False
+        lista = ListaReproduccion()
+        self._registrar_lista(nombre, lista)
+        self.diario.registrar(OpLista(nombre, lista, True))
+        return True
+    
+    def crear_zona(self, nombre: str, panoramica: float = 0.0) -> bool:
+        """Lista que suena a la vez que las demás por su propio canal del mixer."""
+        if nombre in self.listas:
+            return False
+        if self.mezclador is None:
+            self.mezclador = MezcladorZonas()
+        lista = ListaReproduccion()
+        lista.audio = self.mezclador.crear_zona(nombre, panoramica)
+        # El espectro simulado es sólo para el visualizador de la lista principal
+        lista.spectrum_running = False
+        self._registrar_lista(nombre, lista)
+        self.diario.registrar(OpLista(nombre, lista, True))
+        return True
+    
+    def zonas(self) -> Dict[str, ListaReproduccion]:
+        return {nombre: lista for nombre, lista in self.listas.items() if isinstance(lista.audio, ZonaAudio)}
+    
+    def atender_zonas(self) -> List[ListaReproduccion]:
+        """Aplica en el hilo dueño los fines y errores de las zonas; devuelve las que cambiaron de canción."""
+        if self.mezclador is None:
+            return []
+        por_zona = {lista.audio: lista for lista in self.zonas().values()}
+        cambiadas = []
+        for zona, evento, turno, datos in self.mezclador.avisos_pendientes():
+            lista = por_zona.get(zona)
+            if lista is None:
+                continue
+            if evento == "fin" and turno == lista.turno and lista.reproduciendo:
+                lista.manejar_fin()
+                cambiadas.append(lista)
+            elif evento == "error":
+                lista.al_aviso_audio(evento, turno, datos)
+        for lista in por_zona.values():
+            if lista.alcanzo_silencio_final():
+                lista.manejar_fin()
+                cambiadas.append(lista)
+        return cambiadas
+    
+    def cerrar_zonas(self) -> None:
+        if self.mezclador:
+            self.mezclador.cerrar()
+    
+    def crear_lista_inteligente(self, nombre: str, reglas: List[tuple], orden: Optional[str] = None,
+                                limite: Optional[int] = None) -> bool:
+        if nombre in self.listas_inteligentes:
+            return False
+        inteligente = ListaInteligente(nombre, reglas, self.biblioteca, orden, limite)
+        inteligente.lista.oyentes.append(self._al_evento_reproduccion)
+        inteligente.oyentes.append(
+            lambda agregadas, retiradas: [f(inteligente, agregadas, retiradas) for f in self.oyentes_inteligentes])
+        self.listas_inteligentes[nombre] = inteligente
+        if self.diario:
+            self.diario.registrar(OpInteligente(nombre, reglas, orden, limite, True))
+        return True
+    
+    def seleccionar_lista(self, nombre: str) -> bool:
+        if nombre.startswith(PREFIJO_INTELIGENTE):
+            inteligente = self.listas_inteligentes.get(nombre[len(PREFIJO_INTELIGENTE):])
+            if not inteligente:
+                return False
+            self.lista_actual = inteligente.lista
+            return True
+        if nombre not in self.listas:
+            return False
+        self.lista_actual = self.listas[nombre]
+        return True
+    
+    def eliminar_lista(self, nombre: str) -> bool:
+        if nombre.startswith(PREFIJO_INTELIGENTE):
+            inteligente = self.listas_inteligentes.pop(nombre[len(PREFIJO_INTELIGENTE):], None)
+            if not inteligente:
+                return False
+            self.biblioteca.oyentes.remove(inteligente.actualizar)
+            self.diario.registrar(OpInteligente(inteligente.nombre, inteligente.reglas, inteligente.orden,
+                                                inteligente.limite, False))
+            self._soltar_lista(inteligente.lista)
+            return True
+        if nombre not in self.listas:
+            return False
+        
+        self._soltar_lista(self.listas[nombre])
+        lista = self.listas.pop(nombre)
+        self.diario.registrar(OpLista(nombre, lista, False))
+        lista.oyentes.remove(self._al_evento_lista)
+        lista.diario = None
+        lista.detener_espectro()
+        for cancion in lista.iterar_canciones():
+            self.biblioteca.retirar(cancion)
+        return True
+    
+    def _soltar_lista(self, lista: ListaReproduccion) -> None:
+        # Se para la lista que se va sin cortar lo que otra haya puesto después en trabajador_audio
+        if lista.audio is not trabajador_audio or lista is self.lista_principal():
+            lista.detener()
+        else:
+            lista.reproduciendo = lista.pausa_valida = False
+            lista.posicion_pausa = 0
+        if lista is self.lista_actual:
+            self.lista_actual = None
+    
+    def lista_principal(self) -> Optional[ListaReproduccion]:
+        """Lista que pidió la última reproducción a trabajador_audio, aunque ahora esté elegida otra.
+
+        Sus avisos y su recorte de silencios se atienden aunque haya una zona seleccionada.
+        """
+        turno = trabajador_audio.turno
+        if not turno:
+            return None
+        for lista in itertools.chain(self.listas.values(), (i.lista for i in self.listas_inteligentes.values())):
+            if lista.audio is trabajador_audio and lista.turno == turno:
+                return lista
+        return None
+    
+    def nombre_de(self, lista: Optional[ListaReproduccion]) -> Optional[str]:
+        for nombre, candidata in self.listas.items():
+            if candidata is lista:
+                return nombre
+        for nombre, inteligente in self.listas_inteligentes.items():
+            if inteligente.lista is lista:
+                return PREFIJO_INTELIGENTE + nombre
+        return None
+    
+    def es_inteligente(self, lista: Optional[ListaReproduccion]) -> bool:
+        return any(inteligente.lista is lista for inteligente in self.listas_inteligentes.values())
+    
+    def obtener_nombres_inteligentes(self) -> List[str]:
+        return [PREFIJO_INTELIGENTE + nombre for nombre in self.listas_inteligentes]
+    
+    def obtener_nombres_listas(self) -> List[str]:
+        return list(self.listas.keys())
+    
+    def nombre_libre(self, nombre: str) -> str:
+        candidato, n = nombre, 2
+        while candidato in self.listas:
+            candidato = f"{nombre} ({n})"
+            n += 1
+        return candidato
+    
+    def importar_lista(self, ruta: str, nombre: Optional[str] = None) -> str:
+        """Crea una lista nueva a partir de un archivo M3U/M3U8/PLS/XSPF y devuelve su nombre."""
+        nombre = self.nombre_libre(nombre or os.path.splitext(os.path.basename(ruta))[0])
+        lista = ListaReproduccion()
+        with self.diario.grupo(f"Importar lista «{nombre}»"):
+            self._registrar_lista(nombre, lista)
+            self.diario.registrar(OpLista(nombre, lista, True))
+            lista.agregar_canciones(leer_lista_reproduccion(ruta))
+        return nombre
+    
+    def exportar_lista(self, nombre: str, ruta: str) -> int:
+        if nombre not in self.listas:
+            raise KeyError(nombre)
+        return escribir_lista_reproduccion(self.listas[nombre], ruta)
+    
+    def rutas_en_listas(self) -> List[str]:
+        return list(dict.fromkeys(cancion.ruta_archivo for lista in self.listas.values()
+                                  for cancion in lista.iterar_canciones()))
+    
+    def fusionar_duplicados(self, informe: "InformeDuplicados", aplicar: bool = True) -> List[dict]:
+        """Hace que todas las listas apunten a la copia conservada y quita las repeticiones dentro de cada lista.
+
+        Devuelve un cambio por canción afectada; con aplicar=False sólo lo informa.
+        """
+        canonicas = informe.canonicas()
+        cambios = []
+        with self.diario.grupo("Fusionar duplicados") if aplicar else nullcontext():
+            self._fusionar(canonicas, cambios, aplicar)
+        return cambios
+    
+    def _fusionar(self, canonicas: Dict[str, str], cambios: List[dict], aplicar: bool) -> None:
+        for nombre, lista in self.listas.items():
+            vistas = set()
+            nodos = []
+            if lista.cabeza:
+                nodo = lista.cabeza
+                while True:
+                    nodos.append(nodo)
+                    nodo = nodo.siguiente
+                    if nodo is lista.cabeza:
+                        break
+            for nodo in nodos:
+                ruta = os.path.abspath(nodo.cancion.ruta_archivo)
+                destino = canonicas.get(ruta, ruta)
+                sonando = nodo is lista.actual and lista.reproduciendo
+                if destino in vistas and not sonando:
+                    accion = "eliminada"
+                    if aplicar:
+                        lista.eliminar_nodo(nodo)
+                elif destino != ruta:
+                    accion = "reemplazada"
+                    if aplicar:
+                        self.diario.registrar(OpRuta(nodo.cancion, nodo.cancion.ruta_archivo, destino))
+                        nodo.cancion.ruta_archivo = destino
+                else:
+                    vistas.add(destino)
+                    continue
+                vistas.add(destino)
+                cambios.append({"lista": nombre, "titulo": nodo.cancion.titulo, "ruta": ruta,
+                                "destino": destino, "accion": accion})
+
+# ==================== DESHACER ====================
+MAX_PASOS_DESHACER = 100
+MAX_CANCIONES_DESHACER = 5000
+MAX_BYTES_DESHACER_DISCO = 4 * 1024 * 1024
+
+def _datos_cancion(cancion: Cancion) -> list:
+    return [cancion.titulo, cancion.artista, cancion.duracion, cancion.ruta_archivo, cancion.genero]
+
+def _misma_cancion(cancion: Cancion, datos: list) -> bool:
+    return cancion.ruta_archivo == datos[3] and cancion.titulo == datos[0]
+
+class OpTramo:
+    """Alta o baja de un tramo contiguo de nodos, deshecha reenlazándolo en O(k).
+
+    Guarda los nodos, tomados al registrar el cambio, y sus vecinos; si los
+    vecinos ya no son contiguos el tramo vuelve al final de la lista.
+    """
+
+    def __init__(self, lista: ListaReproduccion, nombre: str, primero: NodoCancion,
+                 ultimo: NodoCancion, presente: bool):
+        self.lista, self.nombre = lista, nombre
+        self.primero, self.ultimo = primero, ultimo
+        # presente: si el tramo está en la lista justo después del cambio
+        self.presente = presente
+        self._capturar_vecinos()
+        # Los enlaces vivos cambian con pasos posteriores; el tramo no se vuelve a recorrer
+        self.nodos = [primero]
+        nodo = primero
+        while nodo is not ultimo:
+            nodo = nodo.siguiente
+            self.nodos.append(nodo)
+
+    def _capturar_vecinos(self) -> None:
+        if self.ultimo.siguiente is self.primero:
+            self.anterior = self.siguiente = None
+        else:
+            self.anterior, self.siguiente = self.primero.anterior, self.ultimo.siguiente
+        self.era_cabeza = self.lista.cabeza is self.primero
+
+    def _quitar(self) -> None:
+        lista = self.lista
+        self._capturar_vecinos()
+        nodos = self.nodos
+        if lista.actual in nodos:
+            lista._soltar_actual()
+        if self.anterior is None:
+            lista.cabeza = lista.actual = None
+        else:
+            self.anterior.siguiente, self.siguiente.anterior = self.siguiente, self.anterior
+            if lista.cabeza in nodos:
+                lista.cabeza = self.siguiente
+            if lista.actual in nodos:
+                lista.actual = self.siguiente
+        for nodo in nodos:
+            lista._notificar("eliminar", nodo.cancion)
+
+    def _poner(self) -> None:
+        lista = self.lista
+        for anterior, siguiente in zip(self.nodos, self.nodos[1:]):
+            anterior.siguiente, siguiente.anterior = siguiente, anterior
+        if lista.cabeza is None:
+            self.ultimo.siguiente, self.primero.anterior = self.primero, self.ultimo
+            lista.cabeza = lista.actual = self.primero
+        else:
+            anterior, siguiente = self.anterior, self.siguiente
+            en_su_sitio = anterior is not None and anterior.siguiente is siguiente and siguiente.anterior is anterior
+            if not en_su_sitio:
+                anterior, siguiente = lista.cabeza.anterior, lista.cabeza
+            anterior.siguiente, self.primero.anterior = self.primero, anterior
+            self.ultimo.siguiente, siguiente.anterior = siguiente, self.ultimo
+            if self.era_cabeza and en_su_sitio:
+                lista.cabeza = self.primero
+        for nodo in self.nodos:
+            lista._notificar("agregar", nodo.cancion)
+
+    def deshacer(self, gestor) -> None:
+        self._quitar() if self.presente else self._poner()
+
+    def rehacer(self, gestor) -> None:
+        self._poner() if self.presente else self._quitar()
+
+    @property
+    def peso(self) -> int:
+        return len(self.nodos)
+
+    def descripcion(self) -> str:
+        verbo = "Agregar" if self.presente else "Eliminar"
+        return f"{verbo} «{self.primero.cancion.titulo}»" if self.peso == 1 else f"{verbo} {self.peso} canciones"
+
+    def a_dict(self) -> dict:
+        ancla = self.anterior.cancion if self.anterior is not None else None
+        return {"op": "tramo", "lista": self.nombre, "presente": self.presente,
+                "ancla": _datos_cancion(ancla) if ancla else None,
+                "canciones": [_datos_cancion(nodo.cancion) for nodo in self.nodos]}
+
+class OpEdicion:
+    def __init__(self, cancion: Cancion, antes: dict, despues: dict):
+        self.cancion, self.antes, self.despues = cancion, antes, despues
+        self.peso = 1
+
+    def _aplicar(self, gestor, valores: dict) -> None:
+        gestor.editar_cancion(self.cancion, valores["titulo"], valores["artista"],
+                              valores["duracion"], valores["genero"])
+
+    def deshacer(self, gestor) -> None:
+        self._aplicar(gestor, self.antes)
+
+    def rehacer(self, gestor) -> None:
+        self._aplicar(gestor, self.despues)
+
+    def descripcion(self) -> str:
+        return f"Editar «{self.antes['titulo']}»"
+
+    def a_dict(self) -> dict:
+        return {"op": "edicion", "ruta": self.cancion.ruta_archivo, "antes": self.antes, "despues": self.despues}
+
+class OpRuta:
+    def __init__(self, cancion: Cancion, antes: str, despues: str):
+        self.cancion, self.antes, self.despues = cancion, antes, despues
+        self.peso = 1
+
+    def deshacer(self, gestor) -> None:
+        self.cancion.ruta_archivo = self.antes
+
+    def rehacer(self, gestor) -> None:
+        self.cancion.ruta_archivo = self.despues
+
+    def descripcion(self) -> str:
+        return f"Cambiar archivo de «{self.cancion.titulo}»"
+
+    def a_dict(self) -> dict:
+        return {"op": "ruta", "titulo": self.cancion.titulo, "antes": self.antes, "despues": self.despues}
+
+class OpLista:
+    """Alta o baja de una lista entera; la lista se conserva tal cual, sin copiarla."""
+
+    def __init__(self, nombre: str, lista: ListaReproduccion, presente: bool):
+        self.nombre, self.lista, self.presente = nombre, lista, presente
+        self.peso = max(1, sum(1 for _ in lista.iterar_canciones()))
+
+    def _quitar(self, gestor) -> None:
+        nombre = gestor.nombre_de(self.lista)
+        if nombre:
+            self.nombre = nombre
+            gestor.eliminar_lista(nombre)
+
+    def _poner(self, gestor) -> None:
+        self.nombre = gestor.nombre_libre(self.nombre)
+        gestor._registrar_lista(self.nombre, self.lista)
+        for cancion in self.lista.iterar_canciones():
+            gestor.biblioteca.registrar(cancion)
+
+    def deshacer(self, gestor) -> None:
+        self._quitar(gestor) if self.presente else self._poner(gestor)
+
+    def rehacer(self, gestor) -> None:
+        self._poner(gestor) if self.presente else self._quitar(gestor)
+
+    def descripcion(self) -> str:
+        return f"{'Crear' if self.presente else 'Eliminar'} lista «{self.nombre}»"
+
+    def a_dict(self) -> dict:
+        canciones = [] if self.presente else [_datos_cancion(c) for c in self.lista.iterar_canciones()]
+        return {"op": "lista", "nombre": self.nombre, "presente": self.presente, "canciones": canciones}
+
+class OpInteligente:
+    def __init__(self, nombre: str, reglas: List[tuple], orden: Optional[str], limite: Optional[int],
+                 presente: bool):
+        self.nombre, self.reglas, self.orden, self.limite = nombre, reglas, orden, limite
+        self.presente = presente
+        self.peso = 1
+
+    def _quitar(self, gestor) -> None:
+        gestor.eliminar_lista(PREFIJO_INTELIGENTE + self.nombre)
+
+    def _poner(self, gestor) -> None:
+        gestor.crear_lista_inteligente(self.nombre, self.reglas, self.orden, self.limite)
+
+    def deshacer(self, gestor) -> None:
+        self._quitar(gestor) if self.presente else self._poner(gestor)
+
+    def rehacer(self, gestor) -> None:
+        self._poner(gestor) if self.presente else self._quitar(gestor)
+
+    def descripcion(self) -> str:
+        return f"{'Crear' if self.presente else 'Eliminar'} lista inteligente «{self.nombre}»"
+
+    def a_dict(self) -> dict:
+        return {"op": "inteligente", "nombre": self.nombre, "reglas": [list(r) for r in self.reglas],
+                "orden": self.orden, "limite": self.limite, "presente": self.presente}
+
+def op_desde_dict(gestor, datos: dict):
+    """Reconstruye una operación guardada en disco buscando por valor lo que antes eran referencias.
+
+    Localizar las canciones cuesta un recorrido de la lista; sólo pasa con
+    pasos que salieron de memoria o de una sesión anterior.
+    """
+    tipo = datos["op"]
+    if tipo == "inteligente":
+        return OpInteligente(datos["nombre"], [tuple(r) for r in datos["reglas"]], datos["orden"],
+                             datos["limite"], datos["presente"])
+    if tipo == "lista":
+        if datos["presente"]:
+            lista = gestor.listas.get(datos["nombre"])
+            if lista is None:
+                return None
+        else:
+            lista = ListaReproduccion()
+            for fila in datos["canciones"]:
+                lista.agregar_cancion(Cancion(*fila))
+        return OpLista(datos["nombre"], lista, datos["presente"])
+    if tipo in ("edicion", "ruta"):
+        for lista in gestor.listas.values():
+            for cancion in lista.iterar_canciones():
+                if tipo == "edicion" and cancion.ruta_archivo == datos["ruta"] and all(
+                        getattr(cancion, campo) == valor for campo, valor in datos["despues"].items()):
+                    return OpEdicion(cancion, datos["antes"], datos["despues"])
+                if tipo == "ruta" and cancion.ruta_archivo == datos["despues"] and cancion.titulo == datos["titulo"]:
+                    return OpRuta(cancion, datos["antes"], datos["despues"])
+        return None
+
+    lista = gestor.listas.get(datos["lista"])
+    if lista is None:
+        return None
+    nodos = []
+    if lista.cabeza:
+        nodo = lista.cabeza
+        while True:
+            nodos.append(nodo)
+            nodo = nodo.siguiente
+            if nodo is lista.cabeza:
+                break
+    ancla = datos["ancla"]
+    canciones = datos["canciones"]
+    if datos["presente"]:
+        # El tramo sigue en la lista: se busca tras su ancla
+        for i in range(len(nodos) - len(canciones) + 1):
+            if ancla and not (i > 0 and _misma_cancion(nodos[i - 1].cancion, ancla)):
+                continue
+            if all(_misma_cancion(nodos[i + j].cancion, fila) for j, fila in enumerate(canciones)):
+                return OpTramo(lista, datos["lista"], nodos[i], nodos[i + len(canciones) - 1], True)
+        return None
+    primero = ultimo = None
+    for fila in canciones:
+        nodo = NodoCancion(Cancion(*fila))
+        if primero is None:
+            primero = nodo
+        else:
+            ultimo.siguiente, nodo.anterior = nodo, ultimo
+        ultimo = nodo
+    ultimo.siguiente, primero.anterior = primero, ultimo
+    op = OpTramo(lista, datos["lista"], primero, ultimo, False)
+    anterior = next((n for n in nodos if ancla and _misma_cancion(n.cancion, ancla)), None)
+    op.anterior, op.siguiente = (anterior, anterior.siguiente) if anterior else (None, None)
+    op.era_cabeza = False
+    return op
+
+class PasoDeshacer:
+    def __init__(self, descripcion: str):
+        self.descripcion = descripcion
+        self.operaciones: List = []
+
+    @property
+    def peso(self) -> int:
+        return sum(op.peso for op in self.operaciones)
+
+class DiarioCambios:
+    """Diario de deshacer/rehacer con una operación inversa por cambio.
+
+    Cada paso guarda referencias a los nodos y listas afectados, así que
+    deshacer cuesta O(k) en el tamaño del cambio. grupo() junta varias
+    operaciones en un único paso. Cuando se supera MAX_PASOS_DESHACER o
+    MAX_CANCIONES_DESHACER, los pasos más antiguos se descartan o, con ruta,
+    se escriben en un JSONL que también recibe el resto al cerrar, de modo
+    que el historial sobrevive a un reinicio.
+    """
+
+    def __init__(self, gestor, ruta: Optional[str] = None):
+        from collections import deque
+        self.gestor = gestor
+        self.ruta = ruta
+        self.deshacer_pasos = deque()
+        self.rehacer_pasos: List[PasoDeshacer] = []
+        self.grupo_actual: Optional[PasoDeshacer] = None
+        self.aplicando = False
+        self.peso = 0
+        gestor.al_editar.append(self._al_editar)
+
+    def _al_editar(self, cancion: Cancion, anteriores: dict):
+        despues = {campo: getattr(cancion, campo) for campo in anteriores}
+        if despues != anteriores:
+            self.registrar(OpEdicion(cancion, anteriores, despues))
+
+    def registrar(self, operacion) -> None:
+        if self.aplicando:
+            return
+        if self.grupo_actual is not None:
+            self.grupo_actual.operaciones.append(operacion)
+            return
+        paso = PasoDeshacer(operacion.descripcion())
+        paso.operaciones.append(operacion)
+        self._apilar(paso)
+
+    def registrar_tramo(self, lista: ListaReproduccion, primero: NodoCancion, ultimo: NodoCancion,
+                        presente: bool) -> None:
+        if not self.aplicando:
+            self.registrar(OpTramo(lista, self.gestor.nombre_de(lista) or "", primero, ultimo, presente))
+
+    @contextmanager
+    def grupo(self, descripcion: str):
+        if self.grupo_actual is not None or self.aplicando:
+            yield
+            return
+        self.grupo_actual = PasoDeshacer(descripcion)
+        try:
+            yield
+        finally:
+            paso, self.grupo_actual = self.grupo_actual, None
+            if paso.operaciones:
+                self._apilar(paso)
+
+    def _apilar(self, paso: PasoDeshacer) -> None:
+        self.deshacer_pasos.append(paso)
+        self.peso += paso.peso
+        self.rehacer_pasos.clear()
+        while len(self.deshacer_pasos) > 1 and (len(self.deshacer_pasos) > MAX_PASOS_DESHACER
+                                                or self.peso > MAX_CANCIONES_DESHACER):
+            antiguo = self.deshacer_pasos.popleft()
+            self.peso -= antiguo.peso
+            if self.ruta:
+                self._volcar([antiguo])
+
+    def puede_deshacer(self) -> bool:
+        return bool(self.deshacer_pasos) or bool(self.ruta and os.path.exists(self.ruta)
+                                                 and os.path.getsize(self.ruta) > 0)
+
+    def puede_rehacer(self) -> bool:
+        return bool(self.rehacer_pasos)
+
+    def deshacer(self) -> Optional[str]:
+        """Deshace el último paso y devuelve su descripción (None si no había).
+
+        Lanza ValueError si el paso guardado en disco ya no se puede aplicar.
+        """
+        if self.deshacer_pasos:
+            paso = self.deshacer_pasos.pop()
+            self.peso -= paso.peso
+        else:
+            paso = self._recuperar()
+            if paso is None:
+                return None
+        self._ejecutar(paso, atras=True)
+        self.rehacer_pasos.append(paso)
+        return paso.descripcion
+
+    def rehacer(self) -> Optional[str]:
+        if not self.rehacer_pasos:
+            return None
+        paso = self.rehacer_pasos.pop()
+        self._ejecutar(paso, atras=False)
+        self.deshacer_pasos.append(paso)
+        self.peso += paso.peso
+        return paso.descripcion
+
+    def _ejecutar(self, paso: PasoDeshacer, atras: bool) -> None:
+        self.aplicando = True
+        try:
+            for op in (reversed(paso.operaciones) if atras else paso.operaciones):
+                op.deshacer(self.gestor) if atras else op.rehacer(self.gestor)
+        finally:
+            self.aplicando = False
+
+    def _volcar(self, pasos: List[PasoDeshacer]) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                for paso in pasos:
+                    f.write(json.dumps({"descripcion": paso.descripcion,
+                                        "operaciones": [op.a_dict() for op in paso.operaciones]},
+                                       ensure_ascii=False) + "\n")
+            if os.path.getsize(self.ruta) > MAX_BYTES_DESHACER_DISCO:
+                # Se quedan las líneas más recientes
+                with open(self.ruta, encoding="utf-8") as f:
+                    lineas = f.readlines()
+                with open(self.ruta, "w", encoding="utf-8") as f:
+                    f.writelines(lineas[len(lineas) // 2:])
+        except OSError as e:
+            logger.warning("No se pudo guardar el historial de deshacer: %s", e)
+
+    def _recuperar(self) -> Optional[PasoDeshacer]:
+        """Reconstruye la última línea del JSONL y sólo entonces la quita del archivo.
+
+        Si no se puede reconstruir, la línea se queda y se lanza ValueError.
+        """
+        if not self.ruta or not os.path.exists(self.ruta):
+            return None
+        with open(self.ruta, "r+b") as f:
+            # Última línea, leyendo el archivo desde el final
+            f.seek(0, os.SEEK_END)
+            posicion, resto = f.tell(), b""
+            while posicion > 0:
+                leido = min(4096, posicion)
+                posicion -= leido
+                f.seek(posicion)
+                resto = f.read(leido) + resto
+                corte = resto.rstrip(b"\n").rfind(b"\n")
+                if corte >= 0:
+                    posicion += corte + 1
+                    resto = resto[corte + 1:]
+                    break
+            if not resto.strip():
+                f.truncate(posicion)
+                return None
+            try:
+                datos = json.loads(resto)
+                paso = PasoDeshacer(datos["descripcion"])
+                for op_datos in datos["operaciones"]:
+                    op = op_desde_dict(self.gestor, op_datos)
+                    if op is None:
+                        raise ValueError(f"No se pudo deshacer '{datos['descripcion']}': la lista ya no coincide")
+                    paso.operaciones.append(op)
+            except (KeyError, TypeError, json.JSONDecodeError) as e:
+                raise ValueError(f"El historial de deshacer está dañado: {e}") from None
+            f.truncate(posicion)
+        return paso
+
+    def guardar(self) -> None:
+        """Pasa a disco los pasos que quedan en memoria (sólo con ruta)."""
+        if self.ruta and self.deshacer_pasos:
+            self._volcar(list(self.deshacer_pasos))
+            self.deshacer_pasos.clear()
+            self.peso = 0
+
+def ruta_diario_deshacer() -> Optional[str]:
+    valor = os.environ.get("YAUTJA_DESHACER", "0")
+    if valor in ("", "0"):
+        return None
+    return directorio_datos("data", "deshacer.jsonl") if valor == "1" else valor
+
+# ==================== IMPORTAR / EXPORTAR LISTAS ====================
+FORMATOS_LISTA = (".m3u", ".m3u8", ".pls", ".xspf")
+XSPF_NS = "http://xspf.org/ns/0/"
+
+def _resolver_ruta(entrada: str, carpeta: str) -> Optional[str]:
+    entrada = entrada.strip()
+    if not entrada:
+        return None
+    if entrada.lower().startswith("file://"):
+        from urllib.parse import urlparse, unquote
+        entrada = unquote(urlparse(entrada).path)
+        if os.name == "nt" and entrada.startswith("/") and entrada[2:3] == ":":
+            entrada = entrada[1:]
+    elif "://" in entrada:
+        logger.warning("Se omite la URL %s: sólo se admiten archivos locales", entrada)
+        return None
+    if os.sep == "/" and "\\" in entrada:
+        entrada = entrada.replace("\\", "/")
+    return os.path.normpath(os.path.join(carpeta, os.path.expanduser(entrada)))
+
+def _cancion_de_lista(ruta_archivo: str, titulo: Optional[str], artista: Optional[str],
+                      segundos: Optional[float]) -> Cancion:
+    cancion = cancion_desde_archivo(ruta_archivo)
+    if titulo:
+        cancion.titulo = titulo
+    if artista:
+        cancion.artista = artista
+    if segundos and segundos > 0:
+        cancion.duracion = round(segundos / 60, 2)
+    return cancion
+
+def _leer_m3u(ruta: str) -> Iterator[Cancion]:
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    titulo = artista = segundos = None
+    with open(ruta, encoding="utf-8-sig", errors="replace") as f:
+        for linea in f:
+            linea = linea.strip()
+            if linea.startswith("#EXTINF:"):
+                duracion, _, nombre = linea[8:].partition(",")
+                try:
+                    segundos = float(duracion.split()[0]) if duracion.strip() else None
+                except ValueError:
+                    segundos = None
+                artista, separador, titulo = nombre.partition(" - ")
+                if not separador:
+                    artista, titulo = None, nombre
+                continue
+            if not linea or linea.startswith("#"):
+                continue
+            ruta_archivo = _resolver_ruta(linea, carpeta)
+            if ruta_archivo:
+                yield _cancion_de_lista(ruta_archivo, titulo, artista, segundos)
+            titulo = artista = segundos = None
+
+def _leer_pls(ruta: str) -> Iterator[Cancion]:
+    # Las entradas suelen venir agrupadas (File1, Title1, Length1, File2...):
+    # se emite cada una en cuanto aparece la siguiente, así la memoria no crece.
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    pendientes: Dict[int, dict] = {}
+
+    def emitir(hasta: Optional[int] = None):
+        for indice in sorted(pendientes):
+            if hasta is not None and indice >= hasta:
+                break
+            datos = pendientes.pop(indice)
+            ruta_archivo = _resolver_ruta(datos.get("file", ""), carpeta)
+            if ruta_archivo:
+                artista, separador, titulo = datos.get("title", "").partition(" - ")
+                if not separador:
+                    artista, titulo = None, artista
+                yield _cancion_de_lista(ruta_archivo, titulo, artista, datos.get("length"))
+
+    with open(ruta, encoding="utf-8-sig", errors="replace") as f:
+        for linea in f:
+            clave, igual, valor = linea.strip().partition("=")
+            if not igual:
+                continue
+            campo = clave.rstrip("0123456789").lower()
+            numero = clave[len(campo):]
+            if campo not in ("file", "title", "length") or not numero.isdigit():
+                continue
+            indice = int(numero)
+            if indice not in pendientes:
+                yield from emitir(indice)
+                pendientes[indice] = {}
+            if campo == "length":
+                try:
+                    pendientes[indice]["length"] = float(valor)
+                except ValueError:
+                    pass
+            else:
+                pendientes[indice][campo] = valor
+    yield from emitir()
+
+def _leer_xspf(ruta: str) -> Iterator[Cancion]:
+    import xml.etree.ElementTree as ET
+    from urllib.parse import unquote
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    raiz = None
+    for evento, elemento in ET.iterparse(ruta, events=("start", "end")):
+        if raiz is None:
+            raiz = elemento
+        if evento != "end" or elemento.tag.rsplit("}", 1)[-1] != "track":
+            continue
+
+        campos = {hijo.tag.rsplit("}", 1)[-1]: (hijo.text or "").strip() for hijo in elemento}
+        ubicacion = campos.get("location", "")
+        if "://" not in ubicacion:
+            ubicacion = unquote(ubicacion)
+        ruta_archivo = _resolver_ruta(ubicacion, carpeta)
+        if ruta_archivo:
+            try:
+                segundos = int(campos["duration"]) / 1000 if campos.get("duration") else None
+            except ValueError:
+                segundos = None
+            yield _cancion_de_lista(ruta_archivo, campos.get("title"), campos.get("creator"), segundos)
+        # Se descartan las pistas ya leídas para que el árbol no crezca
+        elemento.clear()
+        for hijo in raiz:
+            if hijo.tag.rsplit("}", 1)[-1] == "trackList":
+                del hijo[:]
+
+def leer_lista_reproduccion(ruta: str) -> Iterator[Cancion]:
+    """Generador de canciones para M3U/M3U8/PLS/XSPF; las rutas relativas parten de la lista."""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in (".m3u", ".m3u8"):
+        return _leer_m3u(ruta)
+    if extension == ".pls":
+        return _leer_pls(ruta)
+    if extension == ".xspf":
+        return _leer_xspf(ruta)
+    raise ValueError(f"Formato de lista no soportado: {extension}")
+
+def _ruta_para_lista(ruta_archivo: str, carpeta: str) -> str:
+    try:
+        return os.path.relpath(ruta_archivo, carpeta)
+    except ValueError:
+        # En Windows no hay ruta relativa entre unidades distintas
+        return ruta_archivo
+
+def escribir_lista_reproduccion(lista: ListaReproduccion, ruta: str, rutas_relativas: bool = True) -> int:
+    """Escribe la lista recorriendo los nodos uno a uno, sin construir una lista intermedia."""
+    from xml.sax.saxutils import escape
+    from urllib.parse import quote
+
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in FORMATOS_LISTA:
+        raise ValueError(f"Formato de lista no soportado: {extension}")
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    total = 0
+
+    try:
+        with open(temporal, "w", encoding="utf-8", newline="\n") as f:
+            if extension in (".m3u", ".m3u8"):
+                f.write("#EXTM3U\n")
+            elif extension == ".pls":
+                f.write("[playlist]\n")
+            else:
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        f'<playlist version="1" xmlns="{XSPF_NS}">\n  <trackList>\n')
+
+            for cancion in lista.iterar_canciones():
+                total += 1
+                segundos = round(cancion.duracion * 60)
+                destino = _ruta_para_lista(cancion.ruta_archivo, carpeta) if rutas_relativas else cancion.ruta_archivo
+                if extension in (".m3u", ".m3u8"):
+                    f.write(f"#EXTINF:{segundos or -1},{cancion.artista} - {cancion.titulo}\n{destino}\n")
+                elif extension == ".pls":
+                    f.write(f"File{total}={destino}\nTitle{total}={cancion.artista} - {cancion.titulo}\n"
+                            f"Length{total}={segundos or -1}\n")
+                else:
+                    if os.path.isabs(destino):
+                        ubicacion = "file://" + quote(destino.replace(os.sep, "/"))
+                    else:
+                        ubicacion = quote(destino.replace(os.sep, "/"))
+                    f.write(f"    <track>\n      <location>{escape(ubicacion)}</location>\n"
+                            f"      <title>{escape(cancion.titulo)}</title>\n"
+                            f"      <creator>{escape(cancion.artista)}</creator>\n")
+                    if segundos:
+                        f.write(f"      <duration>{segundos * 1000}</duration>\n")
+                    f.write("    </track>\n")
+
+            if extension == ".pls":
+                f.write(f"NumberOfEntries={total}\nVersion=2\n")
+            elif extension == ".xspf":
+                f.write("  </trackList>\n</playlist>\n")
+        os.replace(temporal, ruta)
+    except BaseException:
+        # Disco lleno, ruta inválida o la lista cambió a mitad: no queda el temporal
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return total
+
+# ==================== DECODIFICACIÓN DE AUDIO ====================
+MUESTRAS_BLOQUE = 1 << 16
+# Sin soundfile, los comprimidos mayores no se decodifican enteros para reproducirlos
+MAX_BYTES_DECODIFICACION_COMPLETA = 6 * 1024 * 1024
+
+def _bloques_wav(ruta: str, muestras_bloque: int, inicio: float = 0.0) -> Iterator[tuple]:
+    import wave
+    with wave.open(ruta, "rb") as w:
+        canales, ancho, frecuencia = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        if inicio > 0:
+            w.setpos(min(w.getnframes(), int(inicio * frecuencia)))
+        while True:
+            datos = w.readframes(muestras_bloque)
+            if not datos:
+                break
+            if ancho == 1:
+                muestras = (np.frombuffer(datos, np.uint8).astype(np.float32) - 128) / 128
+            elif ancho == 2:
+                muestras = np.frombuffer(datos, "<i2").astype(np.float32) / 32768
+            elif ancho == 3:
+                crudos = np.frombuffer(datos, np.uint8).reshape(-1, 3)
+                enteros = (crudos[:, 0].astype(np.int32) | (crudos[:, 1].astype(np.int32) << 8)
+                           | (crudos[:, 2].astype(np.int32) << 16))
+                enteros = np.where(enteros & 0x800000, enteros - 0x1000000, enteros)
+                muestras = enteros.astype(np.float32) / 8388608
+            else:
+                muestras = np.frombuffer(datos, "<i4").astype(np.float32) / 2147483648
+            yield muestras.reshape(-1, canales), frecuencia
+
+def _bloques_soundfile(ruta: str, muestras_bloque: int, inicio: float = 0.0) -> Iterator[tuple]:
+    import soundfile
+    with soundfile.SoundFile(ruta) as f:
+        if inicio > 0:
+            f.seek(min(f.frames, int(inicio * f.samplerate)))
+        for bloque in f.blocks(blocksize=muestras_bloque, dtype="float32", always_2d=True):
+            yield bloque, f.samplerate
+
+def _bloques_pygame(ruta: str, muestras_bloque: int, inicio: float = 0.0) -> Iterator[tuple]:
+    # Sin soundfile, pygame decodifica el archivo entero antes del primer bloque
+    if not mixer.get_init():
+        mixer.init()
+    frecuencia, formato, _ = mixer.get_init()
+    sonido = mixer.Sound(ruta)
+    muestras = pygame.sndarray.array(sonido)
+    del sonido
+    if muestras.ndim == 1:
+        muestras = muestras[:, None]
+    escala = float(1 << (abs(formato) - 1)) if muestras.dtype.kind in "iu" else 1.0
+    for posicion in range(int(inicio * frecuencia), len(muestras), muestras_bloque):
+        yield muestras[posicion:posicion + muestras_bloque].astype(np.float32) / escala, frecuencia
+
+def _lector_por_bloques(ruta: str):
+    """Lector que no decodifica ruta entero antes del primer bloque, o None si sólo vale pygame."""
+    import wave
+    if ruta.lower().endswith(".wav"):
+        try:
+            with wave.open(ruta, "rb"):
+                return _bloques_wav
+        except (wave.Error, EOFError):
+            pass
+    try:
+        # Opcional: libsndfile lee FLAC, OGG y (desde 1.1) MP3 por bloques
+        import soundfile
+    except (ImportError, OSError):
+        return None
+    try:
+        with soundfile.SoundFile(ruta):
+            return _bloques_soundfile
+    except (RuntimeError, OSError):
+        return None
+
+def decodificacion_acotada(ruta: str) -> bool:
+    """True si empezar a leer ruta cuesta poco: se lee por bloques o es lo bastante pequeño para pygame."""
+    if _lector_por_bloques(ruta) is not None:
+        return True
+    try:
+        return os.path.getsize(ruta) <= MAX_BYTES_DECODIFICACION_COMPLETA
+    except OSError:
+        return False
+
+def duracion_audio(ruta: str) -> Optional[float]:
+    """Duración en segundos según la cabecera (wav o soundfile), sin decodificar; None si no se sabe."""
+    lector = _lector_por_bloques(ruta)
+    try:
+        if lector is _bloques_wav:
+            import wave
+            with wave.open(ruta, "rb") as w:
+                return w.getnframes() / w.getframerate()
+        if lector is _bloques_soundfile:
+            import soundfile
+            return soundfile.info(ruta).duration
+    except (OSError, RuntimeError, EOFError, ZeroDivisionError):
+        pass
+    return None
+
+def bloques_audio(ruta: str, muestras_bloque: int = MUESTRAS_BLOQUE, mono: bool = True,
+                  inicio: float = 0.0) -> Iterator[tuple]:
+    """Genera (bloque float32 en [-1, 1], frecuencia) desde inicio segundos; mono por defecto, si no (muestras, canales)."""
+    lector = _lector_por_bloques(ruta) or _bloques_pygame
+    for bloque, frecuencia in lector(ruta, muestras_bloque, inicio):
+        yield (bloque.mean(axis=1) if mono else bloque), frecuencia
+
+# ==================== VELOCIDAD DE REPRODUCCIÓN ====================
+VELOCIDAD_MINIMA = 0.5
+VELOCIDAD_MAXIMA = 2.0
+SEGUNDOS_TROZO_SALIDA = 0.1
+# Cada cuánto mira el hilo de audio si mixer.music terminó la canción
+SONDEO_FIN_AUDIO = 0.05
+CANAL_VELOCIDAD = 0
+_canales_reservados = 0
+
+def reservar_canal(numero: int):
+    """Devuelve mixer.Channel(numero) apartado de la asignación automática de Sound.play()."""
+    global _canales_reservados
+    if mixer.get_num_channels() <= numero:
+        mixer.set_num_channels(numero + 1)
+    _canales_reservados = max(_canales_reservados, numero + 1)
+    mixer.set_reserved(_canales_reservados)
+    return mixer.Channel(numero)
+
+def volumen_estereo(volumen: float, panoramica: float) -> tuple:
+    """(izquierda, derecha) para Channel.set_volume; panoramica -1 sólo suena a la izquierda y 1 a la derecha."""
+    return volumen * min(1.0, 1.0 - panoramica), volumen * min(1.0, 1.0 + panoramica)
+
+class Remuestreador:
+    """Cambio de frecuencia de muestreo por interpolación lineal, bloque a bloque sin cortes."""
+
+    def __init__(self, origen: int, destino: int):
+        self.paso = origen / destino
+        self.fase = 0.0
+        self.previa: Optional[np.ndarray] = None
+
+    def procesar(self, bloque: np.ndarray) -> np.ndarray:
+        datos = bloque if self.previa is None else np.concatenate([self.previa, bloque])
+        if len(datos) < 2:
+            self.previa = datos
+            return datos[:0]
+        posiciones = np.arange(self.fase, len(datos) - 1, self.paso)
+        indices = posiciones.astype(np.int64)
+        fraccion = (posiciones - indices)[:, None].astype(np.float32)
+        salida = datos[indices] * (1 - fraccion) + datos[indices + 1] * fraccion
+        siguiente = posiciones[-1] + self.paso if len(posiciones) else self.fase
+        self.fase = siguiente - (len(datos) - 1)
+        self.previa = datos[-1:]
+        return salida
+
+class EstiradorWSOLA:
+    """Cambia el tempo sin cambiar el tono (WSOLA: solapamiento y suma con búsqueda de forma de onda).
+
+    Cada marco de 40 ms se toma de la entrada avanzando velocidad * salto, pero
+    desplazado hasta ±10 ms hacia donde mejor continúa el marco anterior; la
+    correlación se calcula con FFT. Sólo se guarda lo que hará falta para los
+    marcos siguientes, así que la memoria no depende de la duración.
+    """
+
+    def __init__(self, canales: int, frecuencia: int, velocidad: float):
+        self.largo = 2 * int(0.02 * frecuencia)
+        self.salto = self.largo // 2
+        self.tolerancia = self.largo // 4
+        self.velocidad = velocidad
+        self.avance = self.salto * velocidad
+        # Hann periódica: a medio marco de salto las ventanas suman exactamente 1
+        n = np.arange(self.largo)
+        self.ventana = (0.5 - 0.5 * np.cos(2 * np.pi * n / self.largo)).astype(np.float32)[:, None]
+        self.entrada = np.zeros((0, canales), np.float32)
+        self.base = 0
+        self.marco = 0
+        self.anterior: Optional[int] = None
+        self.acumulado = np.zeros((self.largo, canales), np.float32)
+        self.tamano_fft = 1 << int(np.ceil(np.log2(2 * self.largo + 2 * self.tolerancia)))
+
+    def _elegir(self, nominal: int) -> int:
+        if self.anterior is None:
+            return nominal
+        desde = max(0, nominal - self.tolerancia)
+        plantilla = self.entrada[self.anterior + self.salto - self.base:
+                                 self.anterior + self.salto + self.largo - self.base].sum(axis=1)
+        region = self.entrada[desde - self.base:nominal + self.tolerancia + self.largo - self.base].sum(axis=1)
+        correlacion = np.fft.irfft(np.fft.rfft(region, self.tamano_fft)
+                                   * np.conj(np.fft.rfft(plantilla, self.tamano_fft)), self.tamano_fft)
+        return desde + int(np.argmax(correlacion[:len(region) - self.largo + 1]))
+
+    def _marcos(self, limite: Optional[int] = None) -> List[np.ndarray]:
+        salidas = []
+        while True:
+            nominal = int(round(self.marco * self.avance))
+            if limite is not None and nominal >= limite:
+                break
+            necesario = nominal + self.tolerancia + self.largo
+            if self.anterior is not None:
+                necesario = max(necesario, self.anterior + self.salto + self.largo)
+            if necesario > self.base + len(self.entrada):
+                break
+            inicio = self._elegir(nominal)
+            self.acumulado += self.entrada[inicio - self.base:inicio - self.base + self.largo] * self.ventana
+            salidas.append(self.acumulado[:self.salto].copy())
+            self.acumulado[:-self.salto] = self.acumulado[self.salto:]
+            self.acumulado[-self.salto:] = 0
+            self.anterior = inicio
+            self.marco += 1
+            corte = min(int(round(self.marco * self.avance)) - self.tolerancia, self.anterior + self.salto)
+            if corte > self.base:
+                self.entrada = self.entrada[corte - self.base:]
+                self.base = corte
+        return salidas
+
+    def procesar(self, bloque: np.ndarray) -> np.ndarray:
+        self.entrada = np.concatenate([self.entrada, bloque.astype(np.float32)])
+        salidas = self._marcos()
+        return np.concatenate(salidas) if salidas else self.entrada[:0]
+
+    def terminar(self) -> np.ndarray:
+        fin = self.base + len(self.entrada)
+        relleno = np.zeros((2 * self.largo + 2 * self.tolerancia + int(self.avance) + 1, self.entrada.shape[1]),
+                           np.float32)
+        self.entrada = np.concatenate([self.entrada, relleno])
+        salidas = self._marcos(limite=fin)
+        salidas.append(self.acumulado[:self.largo - self.salto].copy())
+        return np.concatenate(salidas)
+
+def _muestras_para_mixer(muestras: np.ndarray, formato: int, canales: int) -> np.ndarray:
+    if muestras.shape[1] != canales:
+        muestras = (np.repeat(muestras.mean(axis=1, keepdims=True), canales, axis=1) if canales > 1
+                    else muestras.mean(axis=1, keepdims=True))
+    muestras = np.clip(muestras, -1.0, 1.0)
+    if formato == 32:
+        convertidas = muestras.astype(np.float32)
+    else:
+        bits = abs(formato)
+        tipo = {8: np.int8, 16: np.int16, 32: np.int32}[bits]
+        convertidas = (muestras * (2 ** (bits - 1) - 1)).astype(tipo)
+        if formato > 0:
+            convertidas = (convertidas.astype(np.int64) + 2 ** (bits - 1)).astype(
+                {8: np.uint8, 16: np.uint16}[bits])
+    return np.ascontiguousarray(convertidas if canales > 1 else convertidas[:, 0])
+
+class SalidaEstirada:
+    """Reproduce un archivo a otra velocidad en un canal del mixer, por delante de mixer.music.
+
+    Un hilo decodifica por bloques, estira con WSOLA y mantiene siempre un
+    trozo de 0,1 s sonando y otro en la cola del canal: la latencia queda
+    acotada a dos trozos siempre que bloques_audio lea el archivo por bloques
+    (WAV, o con soundfile instalado); si no, sólo se usa con archivos por
+    debajo de MAX_BYTES_DECODIFICACION_COMPLETA. Al acabar llama a al_terminar desde su hilo; las
+    zonas pasan además su propio canal y su panorámica.
+    """
+
+    def __init__(self, ruta: str, inicio: float, velocidad: float, volumen: float,
+                 canal: int = CANAL_VELOCIDAD, al_terminar=None, panoramica: float = 0.0):
+        self.ruta = ruta
+        self.inicio = inicio
+        self.velocidad = velocidad
+        self.volumen = volumen
+        self.panoramica = panoramica
+        self.activo = False
+        self.pausada_desde: Optional[float] = None
+        self.pausa_total = 0.0
+        self.comienzo: Optional[float] = None
+        self.fuente_emitida = inicio
+        self.hilo: Optional[threading.Thread] = None
+        self.numero_canal = canal
+        self.canal = None
+        self.al_terminar = al_terminar
+
+    def iniciar(self) -> None:
+        self.canal = reservar_canal(self.numero_canal)
+        self.canal.stop()
+        self._aplicar_volumen()
+        self.activo = True
+        self.hilo = threading.Thread(target=self._alimentar, daemon=True)
+        self.hilo.start()
+
+    def _trozos(self, frecuencia: int, canales: int, formato: int) -> Iterator[tuple]:
+        """Genera (muestras para el mixer, segundos de origen que cubren)."""
+        estirador = remuestreador = None
+        tamano = int(SEGUNDOS_TROZO_SALIDA * frecuencia)
+        pendiente = []
+        acumuladas = 0
+        fuente = bloques_audio(self.ruta, 1 << 14, mono=False, inicio=self.inicio)
+        for bloque, frecuencia_origen in itertools.chain(fuente, [(None, None)]):
+            if estirador is None and bloque is not None:
+                estirador = EstiradorWSOLA(bloque.shape[1], frecuencia, self.velocidad)
+                if frecuencia_origen != frecuencia:
+                    remuestreador = Remuestreador(frecuencia_origen, frecuencia)
+            if estirador is None:
+                return
+            if bloque is None:
+                salida = estirador.terminar()
+            else:
+                salida = estirador.procesar(remuestreador.procesar(bloque) if remuestreador else bloque)
+            pendiente.append(salida)
+            acumuladas += len(salida)
+            while acumuladas >= tamano or (bloque is None and acumuladas):
+                datos = np.concatenate(pendiente)
+                trozo, resto = datos[:tamano], datos[tamano:]
+                pendiente, acumuladas = [resto], len(resto)
+                yield _muestras_para_mixer(trozo, formato, canales), len(trozo) / frecuencia * self.velocidad
+                if not self.activo:
+                    return
+
+    def _alimentar(self) -> None:
+        frecuencia, formato, canales = mixer.get_init()
+        try:
+            trozos = self._trozos(frecuencia, canales, formato)
+            for muestras, segundos in trozos:
+                while self.activo and (self.canal.get_queue() is not None or self.pausada_desde is not None):
+                    time.sleep(SEGUNDOS_TROZO_SALIDA / 4)
+                if not self.activo:
+                    return
+                sonido = pygame.sndarray.make_sound(muestras)
+                if self.canal.get_busy():
+                    self.canal.queue(sonido)
+                else:
+                    if self.comienzo is not None:
+                        logger.warning("Velocidad: el canal se vació antes de tiempo")
+                    self.canal.play(sonido)
+                    # Al vaciarse el canal SDL_mixer le quita la panorámica: se vuelve a poner
+                    self._aplicar_volumen()
+                    if self.comienzo is None:
+                        self.comienzo = time.perf_counter()
+                self.fuente_emitida += segundos
+            while self.activo and (self.canal.get_busy() or self.pausada_desde is not None):
+                time.sleep(SEGUNDOS_TROZO_SALIDA / 4)
+        except Exception as e:
+            logger.error("Error en la reproducción a velocidad %.2fx: %s", self.velocidad, e)
+        if self.activo:
+            self.activo = False
+            if self.al_terminar:
+                self.al_terminar()
+
+    def posicion(self) -> float:
+        """Segundos del archivo ya escuchados: el reloj de salida avanza velocidad veces más despacio."""
+        if self.comienzo is None:
+            return self.inicio
+        ahora = self.pausada_desde or time.perf_counter()
+        escuchado = (ahora - self.comienzo - self.pausa_total) * self.velocidad
+        return min(self.inicio + max(0.0, escuchado), self.fuente_emitida)
+
+    def pausar(self) -> None:
+        if self.pausada_desde is None:
+            self.pausada_desde = time.perf_counter()
+            self.canal.pause()
+
+    def reanudar(self) -> None:
+        if self.pausada_desde is not None:
+            self.pausa_total += time.perf_counter() - self.pausada_desde
+            self.pausada_desde = None
+            self.canal.unpause()
+
+    def _aplicar_volumen(self) -> None:
+        self.canal.set_volume(*volumen_estereo(self.volumen, self.panoramica))
+
+    def ajustar_volumen(self, volumen: float) -> None:
+        self.volumen = volumen
+        if self.canal:
+            self._aplicar_volumen()
+
+    def detener(self) -> None:
+        self.activo = False
+        if self.canal:
+            self.canal.stop()
+        if self.hilo and self.hilo is not threading.current_thread():
+            self.hilo.join(timeout=1)
+
+# ==================== HILO DE AUDIO ====================
+class TrabajadorAudio:
+    """Hilo único dueño de pygame.mixer; las listas le encolan órdenes y vuelven al momento.
+
+    Abrir archivos, play/pause/stop y arrancar SalidaEstirada pasan aquí, nunca
+    en el hilo de Tk. Cada vez que despierta toma todo lo pendiente: una orden
+    de reproducir o detener anula las de transporte anteriores (pulsar
+    "siguiente" diez veces abre un solo archivo) y el volumen se guarda aparte,
+    así que arrastrar la barra sólo aplica el último valor. La posición se
+    publica bajo un candado y los avisos van a oyentes f(evento, turno, datos)
+    desde este hilo: quien toque Tk debe pasarlos a su hilo dueño. El fin de
+    pista también es un aviso ("fin") con su turno, así que el de una canción
+    ya sustituida se descarta en vez de saltarse la siguiente.
+    """
+
+    TRANSPORTE = ("reproducir", "detener", "pausar", "reanudar")
+
+    def __init__(self):
+        import queue
+        self.cola = queue.Queue()
+        self.candado = threading.Lock()
+        self.hilo: Optional[threading.Thread] = None
+        self.salida: Optional[SalidaEstirada] = None
+        self.volumen_pendiente: Optional[float] = None
+        # turno: última reproducción pedida; sonando: la que de verdad arrancó
+        self.turno = 0
+        self.sonando = 0
+        self.base = 0.0
+        self.arranque: Optional[float] = None
+        self.oyentes: List = []
+
+    def _enviar(self, orden: str, *args) -> None:
+        with self.candado:
+            if self.hilo is None:
+                self.hilo = threading.Thread(target=self._bucle, name="audio", daemon=True)
+                self.hilo.start()
+        self.cola.put((orden, args))
+
+    def preparar(self) -> None:
+        """Abre el dispositivo de audio en este hilo, antes de la primera canción."""
+        self._enviar("preparar")
+
+    def reproducir(self, ruta: str, inicio: float, velocidad: float, volumen: float,
+                   pedido_en: Optional[float] = None) -> int:
+        """Pide reproducir ruta desde inicio y devuelve el turno con el que se sigue su posición."""
+        with self.candado:
+            self.turno += 1
+            turno = self.turno
+        self._enviar("reproducir", turno, ruta, inicio, velocidad, volumen, pedido_en)
+        return turno
+
+    def pausar(self) -> None:
+        self._enviar("pausar")
+
+    def reanudar(self) -> None:
+        self._enviar("reanudar")
+
+    def detener(self, silencioso: bool = False) -> None:
+        """Detener nunca produce aviso de fin; con silencioso tampoco avisa de "detenida"."""
+        self._enviar("detener", silencioso)
+
+    def ajustar_volumen(self, volumen: float) -> None:
+        with self.candado:
+            pendiente = self.volumen_pendiente is not None
+            self.volumen_pendiente = volumen
+        if not pendiente:
+            self._enviar("volumen")
+
+    def posicion(self, turno: int) -> Optional[float]:
+        """Segundos escuchados de la reproducción turno, o None si todavía no ha arrancado."""
+        with self.candado:
+            if turno != self.sonando:
+                return None
+            if self.salida:
+                return self.salida.posicion()
+            return self.base + (time.perf_counter() - self.arranque if self.arranque else 0.0)
+
+    def cerrar(self) -> None:
+        if self.hilo is not None:
+            self.cola.put(None)
+            self.hilo.join(timeout=5)
+            self.hilo = None
+
+    def _avisar(self, evento: str, turno: int, datos=None) -> None:
+        for oyente in self.oyentes:
+            oyente(evento, turno, datos)
+
+    def _bucle(self) -> None:
+        import queue
+        while True:
+            # Mientras suena mixer.music se despierta a menudo para ver si ha acabado
+            vigilar = self.sonando and self.salida is None and self.arranque is not None
+            try:
+                ordenes = [self.cola.get(timeout=SONDEO_FIN_AUDIO if vigilar else None)]
+            except queue.Empty:
+                self._comprobar_fin()
+                continue
+            try:
+                while True:
+                    ordenes.append(self.cola.get_nowait())
+            except queue.Empty:
+                pass
+            ultima = max((i for i, orden in enumerate(ordenes)
+                          if orden and orden[0] in ("reproducir", "detener")), default=0)
+            for i, orden in enumerate(ordenes):
+                if orden is None:
+                    self._detener(False)
+                    return
+                nombre, args = orden
+                if i < ultima and nombre in self.TRANSPORTE:
+                    instrumentacion.contar("audio.ordenes_fusionadas")
+                    continue
+                try:
+                    getattr(self, "_" + nombre)(*args)
+                except Exception as e:
+                    logger.error("Error de audio en '%s': %s", nombre, e)
+                    self._avisar("error", args[0] if nombre == "reproducir" else self.sonando,
+                                 f"No se pudo reproducir: {e}")
+
+    def _terminar(self, turno: int) -> None:
+        if turno != self.sonando:
+            return
+        with self.candado:
+            self.sonando, self.arranque = 0, None
+        self._avisar("fin", turno)
+
+    def _comprobar_fin(self) -> None:
+        if mixer.get_init() and not mixer.music.get_busy():
+            self._terminar(self.sonando)
+
+    def _terminada(self, turno: int) -> None:
+        # Fin de una SalidaEstirada; llega por la cola desde su hilo
+        if turno == self.sonando:
+            self._cerrar_salida()
+            self._terminar(turno)
+
+    def _preparar(self) -> None:
+        if not iniciar_audio():
+            self._avisar("error", 0, "No se pudo inicializar el audio")
+
+    def _cerrar_salida(self) -> None:
+        if self.salida:
+            self.salida.detener()
+            with self.candado:
+                self.salida = None
+
+    def _reproducir(self, turno: int, ruta: str, inicio: float, velocidad: float, volumen: float,
+                    pedido_en: Optional[float]) -> None:
+        if turno != self.turno:
+            return
+        if not iniciar_audio():
+            self._avisar("error", turno, "No se pudo inicializar el audio")
+            return
+        self._cerrar_salida()
+        salida = None
+        if velocidad != 1.0 and not decodificacion_acotada(ruta):
+            logger.warning("%s se reproduce a 1x: sin soundfile habría que decodificarlo entero", ruta)
+            velocidad = 1.0
+        if velocidad != 1.0:
+            mixer.music.stop()
+            with instrumentacion.medir("audio.inicio"):
+                salida = SalidaEstirada(ruta, inicio, velocidad, volumen,
+                                        al_terminar=lambda: self.cola.put(("terminada", (turno,))))
+                salida.iniciar()
+        else:
+            with instrumentacion.medir("audio.carga"):
+                mixer.music.load(ruta)
+            mixer.music.set_volume(volumen)
+            # play() abre el decodificador y llena el primer búfer
+            with instrumentacion.medir("audio.inicio"):
+                mixer.music.play(start=inicio)
+        with self.candado:
+            self.salida = salida
+            self.sonando = turno
+            self.base = inicio
+            self.arranque = time.perf_counter()
+        if pedido_en is not None and instrumentacion.activa:
+            instrumentacion.registrar("audio.fin_a_inicio", pedido_en, time.perf_counter() - pedido_en)
+        self._avisar("iniciada", turno, inicio)
+
+    def _pausar(self) -> None:
+        if self.salida:
+            self.salida.pausar()
+        elif mixer.get_init():
+            mixer.music.pause()
+        with self.candado:
+            if self.arranque is not None:
+                self.base += time.perf_counter() - self.arranque
+                self.arranque = None
+
+    def _reanudar(self) -> None:
+        if self.salida:
+            self.salida.reanudar()
+        elif mixer.get_init():
+            mixer.music.unpause()
+        with self.candado:
+            if self.arranque is None:
+                self.arranque = time.perf_counter()
+
+    def _detener(self, silencioso: bool) -> None:
+        self._cerrar_salida()
+        if mixer.get_init():
+            mixer.music.stop()
+        with self.candado:
+            self.arranque = None
+            turno, self.sonando = self.sonando, 0
+        if not silencioso:
+            self._avisar("detenida", turno)
+
+    def _volumen(self) -> None:
+        with self.candado:
+            volumen, self.volumen_pendiente = self.volumen_pendiente, None
+        if volumen is None:
+            return
+        if self.salida:
+            self.salida.ajustar_volumen(volumen)
+        if mixer.get_init():
+            mixer.music.set_volume(volumen)
+
+trabajador_audio = TrabajadorAudio()
+
+# ==================== ZONAS ====================
+CACHE_AUDIO_BYTES = 32 * 1024 * 1024
+# Lo que se guarda decodificado de cada archivo: su comienzo, para arrancar al momento
+SEGUNDOS_VENTANA_CACHE = 2.0
+PRIMER_CANAL_ZONAS = CANAL_VELOCIDAD + 1
+PERIODO_MEZCLADOR = 0.02
+
+def trozos_para_mixer(ruta: str, inicio: float = 0.0, fin: Optional[float] = None) -> Iterator[np.ndarray]:
+    """Trozos de SEGUNDOS_TROZO_SALIDA en el formato del mixer, decodificados bloque a bloque desde inicio."""
+    frecuencia, formato, canales = mixer.get_init()
+    tamano = int(SEGUNDOS_TROZO_SALIDA * frecuencia)
+    restantes = None if fin is None else int((fin - inicio) * frecuencia)
+    remuestreador, pendiente, acumuladas = None, [], 0
+    fuente = bloques_audio(ruta, 1 << 14, mono=False, inicio=inicio)
+    for bloque, frecuencia_origen in itertools.chain(fuente, [(None, None)]):
+        if bloque is not None:
+            if frecuencia_origen != frecuencia:
+                remuestreador = remuestreador or Remuestreador(frecuencia_origen, frecuencia)
+                bloque = remuestreador.procesar(bloque)
+            pendiente.append(bloque)
+            acumuladas += len(bloque)
+        while acumuladas >= tamano or (bloque is None and acumuladas):
+            datos = np.concatenate(pendiente)
+            trozo, resto = datos[:tamano], datos[tamano:]
+            pendiente, acumuladas = [resto], len(resto)
+            if restantes is not None:
+                trozo = trozo[:restantes]
+                restantes -= len(trozo)
+            yield _muestras_para_mixer(trozo, formato, canales)
+            if restantes == 0:
+                return
+
+class CacheAudio:
+    """Decodificación compartida por todas las zonas.
+
+    Un solo pool de hilos adelanta el siguiente trozo de cada zona, así que
+    el hilo mezclador nunca decodifica. De cada archivo sólo se guardan sus
+    primeros SEGUNDOS_VENTANA_CACHE, con LRU por bytes; el resto se decodifica
+    sobre la marcha y una zona nunca tiene más de un bloque en memoria.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_AUDIO_BYTES, hilos: int = 2):
+        from collections import OrderedDict
+        self.max_bytes = max_bytes
+        self.hilos = hilos
+        self.ventanas: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self.bytes = 0
+        self.candado = threading.Lock()
+        self.pool = None
+
+    def _ventana(self, ruta: str) -> np.ndarray:
+        clave = (ruta, firma_archivo(ruta))
+        with self.candado:
+            ventana = self.ventanas.get(clave)
+            if ventana is not None:
+                self.ventanas.move_to_end(clave)
+                return ventana
+        trozos = list(trozos_para_mixer(ruta, 0.0, SEGUNDOS_VENTANA_CACHE))
+        if not trozos:
+            raise ValueError(f"{ruta} no tiene audio")
+        ventana = np.concatenate(trozos)
+        with self.candado:
+            if clave not in self.ventanas:
+                self.ventanas[clave] = ventana
+                self.bytes += ventana.nbytes
+            while self.bytes > self.max_bytes and len(self.ventanas) > 1:
+                _, antigua = self.ventanas.popitem(last=False)
+                self.bytes -= antigua.nbytes
+        return ventana
+
+    def trozos(self, ruta: str, inicio: float) -> Iterator[np.ndarray]:
+        """Trozos para el mixer desde inicio: el comienzo sale de la caché y el resto del archivo."""
+        frecuencia = mixer.get_init()[0]
+        if inicio < SEGUNDOS_VENTANA_CACHE:
+            ventana = self._ventana(ruta)
+            tamano = int(SEGUNDOS_TROZO_SALIDA * frecuencia)
+            for posicion in range(int(inicio * frecuencia), len(ventana), tamano):
+                yield ventana[posicion:posicion + tamano]
+            if len(ventana) < int(SEGUNDOS_VENTANA_CACHE * frecuencia):
+                return
+            # La zona no retiene la ventana: si sale de la caché, se libera
+            del ventana
+            inicio = SEGUNDOS_VENTANA_CACHE
+        yield from trozos_para_mixer(ruta, inicio)
+
+    def siguiente(self, trozos: Iterator[np.ndarray]):
+        """Future con el próximo trozo de trozos, o None si ya no quedan."""
+        from concurrent.futures import ThreadPoolExecutor
+        with self.candado:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(self.hilos, thread_name_prefix="decodificar")
+        return self.pool.submit(next, trozos, None)
+
+    def cerrar(self) -> None:
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+class ZonaAudio:
+    """Salida de una zona por un canal propio del mixer, con la interfaz de TrabajadorAudio.
+
+    Una ListaReproduccion la usa como self.audio. Las órdenes se encolan en el
+    MezcladorZonas y los métodos con guion bajo sólo corren en su hilo. A
+    velocidad normal no abre hilos propios: una zona cuesta su canal, un trozo
+    sonando, otro en cola y el bloque que el pool de CacheAudio esté
+    decodificando para ella. A otra velocidad suena con una SalidaEstirada,
+    que sí tiene su hilo mientras dura la canción.
+    """
+
+    def __init__(self, mezclador: "MezcladorZonas", nombre: str, canal: int, panoramica: float = 0.0):
+        self.mezclador = mezclador
+        self.nombre = nombre
+        self.numero_canal = canal
+        # -1 sólo altavoz izquierdo, 1 sólo derecho
+        self.panoramica = max(-1.0, min(1.0, panoramica))
+        self.turno = 0
+        self.volumen_pendiente: Optional[float] = None
+        # Estado del hilo mezclador
+        self.canal = None
+        self.trozos: Optional[Iterator[np.ndarray]] = None
+        # Future del próximo trozo; None cuando el archivo se acabó
+        self.pendiente = None
+        self.salida: Optional[SalidaEstirada] = None
+        self.sonando = 0
+        self.cursor = 0
+        self.inicio = 0.0
+        self.volumen = 0.7
+        self.comienzo: Optional[float] = None
+        self.pausada_desde: Optional[float] = None
+        self.pausa_total = 0.0
+
+    # --- Interfaz para la lista (cualquier hilo) ---
+    def reproducir(self, ruta: str, inicio: float, velocidad: float, volumen: float,
+                   pedido_en: Optional[float] = None) -> int:
+        with self.mezclador.candado:
+            self.turno += 1
+            turno = self.turno
+        self.mezclador.enviar(self, "reproducir", turno, ruta, inicio, velocidad, volumen)
+        return turno
+
+    def pausar(self) -> None:
+        self.mezclador.enviar(self, "pausar")
+
+    def reanudar(self) -> None:
+        self.mezclador.enviar(self, "reanudar")
+
+    def detener(self, silencioso: bool = False) -> None:
+        self.mezclador.enviar(self, "detener", silencioso)
+
+    def ajustar_volumen(self, volumen: float) -> None:
+        with self.mezclador.candado:
+            pendiente = self.volumen_pendiente is not None
+            self.volumen_pendiente = volumen
+        if not pendiente:
+            self.mezclador.enviar(self, "volumen")
+
+    def posicion(self, turno: int) -> Optional[float]:
+        with self.mezclador.candado:
+            if turno != self.sonando:
+                return None
+            if self.salida:
+                return self.salida.posicion()
+            if self.comienzo is None:
+                return self.inicio
+            ahora = self.pausada_desde or time.perf_counter()
+            escuchado = self.inicio + max(0.0, ahora - self.comienzo - self.pausa_total)
+            return min(escuchado, self.cursor / mixer.get_init()[0])
+
+    # --- Hilo mezclador ---
+    def _aplicar_volumen(self) -> None:
+        self.canal.set_volume(*volumen_estereo(self.volumen, self.panoramica))
+
+    def _reproducir(self, turno: int, ruta: str, inicio: float, velocidad: float, volumen: float) -> None:
+        if turno != self.turno:
+            return
+        self._detener()
+        if not decodificacion_acotada(ruta):
+            raise ValueError(f"{os.path.basename(ruta)} es demasiado grande para decodificarlo entero; "
+                             "las zonas necesitan soundfile para este formato")
+        if self.canal is None:
+            self.canal = reservar_canal(self.numero_canal)
+        self.volumen = volumen
+        if velocidad != 1.0:
+            salida = SalidaEstirada(ruta, inicio, velocidad, volumen, canal=self.numero_canal,
+                                    al_terminar=lambda: self.mezclador.avisar(self, "fin", turno),
+                                    panoramica=self.panoramica)
+            salida.iniciar()
+            with self.mezclador.candado:
+                self.salida, self.sonando = salida, turno
+            return
+        trozos = self.mezclador.cache.trozos(ruta, inicio)
+        with self.mezclador.candado:
+            self.trozos, self.pendiente = trozos, self.mezclador.cache.siguiente(trozos)
+            self.sonando = turno
+            self.inicio = inicio
+            self.comienzo = self.pausada_desde = None
+            self.pausa_total = 0.0
+            self.cursor = int(inicio * mixer.get_init()[0])
+
+    def _pausar(self) -> None:
+        if self.salida:
+            self.salida.pausar()
+        elif self.pausada_desde is None and self.sonando:
+            with self.mezclador.candado:
+                self.pausada_desde = time.perf_counter()
+            if self.canal:
+                self.canal.pause()
+
+    def _reanudar(self) -> None:
+        if self.salida:
+            self.salida.reanudar()
+        elif self.pausada_desde is not None:
+            with self.mezclador.candado:
+                if self.comienzo is not None:
+                    self.pausa_total += time.perf_counter() - self.pausada_desde
+                self.pausada_desde = None
+            self.canal.unpause()
+
+    def _detener(self, silencioso: bool = True) -> None:
+        if self.salida:
+            self.salida.detener()
+        if self.canal:
+            self.canal.stop()
+        if self.pendiente:
+            self.pendiente.cancel()
+        with self.mezclador.candado:
+            self.salida = self.trozos = self.pendiente = None
+            turno, self.sonando = self.sonando, 0
+            self.pausada_desde = None
+        if turno and not silencioso:
+            self.mezclador.avisar(self, "detenida", turno)
+
+    def _volumen(self) -> None:
+        with self.mezclador.candado:
+            volumen, self.volumen_pendiente = self.volumen_pendiente, None
+        if volumen is None:
+            return
+        self.volumen = volumen
+        if self.salida:
+            self.salida.ajustar_volumen(volumen)
+        elif self.canal:
+            self._aplicar_volumen()
+
+    def _alimentar(self) -> None:
+        """Deja un trozo sonando y otro en cola; avisa del fin cuando el canal se queda sin nada."""
+        if self.salida or not self.sonando or self.pausada_desde is not None:
+            return
+        if self.canal.get_queue() is not None:
+            return
+        if self.pendiente is not None:
+            if not self.pendiente.done():
+                return
+            try:
+                trozo = self.pendiente.result()
+            except Exception as e:
+                turno = self.sonando
+                self._detener()
+                logger.error("Zona %s: no se pudo decodificar: %s", self.nombre, e)
+                self.mezclador.avisar(self, "error", turno, f"No se pudo reproducir: {e}")
+                return
+            if trozo is not None:
+                self._poner_trozo(trozo)
+                self.pendiente = self.mezclador.cache.siguiente(self.trozos)
+                return
+            self.pendiente = None
+        if not self.canal.get_busy():
+            turno = self.sonando
+            with self.mezclador.candado:
+                self.sonando = 0
+                self.trozos = None
+            self.mezclador.avisar(self, "fin", turno)
+
+    def _poner_trozo(self, trozo: np.ndarray) -> None:
+        sonido = pygame.sndarray.make_sound(trozo)
+        if self.canal.get_busy():
+            self.canal.queue(sonido)
+        else:
+            self.canal.play(sonido)
+            self._aplicar_volumen()
+            if self.comienzo is None:
+                with self.mezclador.candado:
+                    self.comienzo = time.perf_counter()
+        with self.mezclador.candado:
+            self.cursor += len(trozo)
+
+class MezcladorZonas:
+    """Un único hilo para todas las zonas: aplica sus órdenes y rellena sus canales cada 20 ms.
+
+    Los avisos ("fin", "error") se acumulan en una cola que el hilo dueño
+    vacía con GestorListas.atender_zonas().
+    """
+
+    def __init__(self, cache: Optional[CacheAudio] = None):
+        import queue
+        self.cache = cache or CacheAudio()
+        self.candado = threading.Lock()
+        self.cola = queue.Queue()
+        self.avisos = queue.Queue()
+        self.zonas: List[ZonaAudio] = []
+        self.hilo: Optional[threading.Thread] = None
+
+    def crear_zona(self, nombre: str, panoramica: float = 0.0) -> ZonaAudio:
+        with self.candado:
+            usados = {zona.numero_canal for zona in self.zonas}
+            canal = next(n for n in itertools.count(PRIMER_CANAL_ZONAS) if n not in usados)
+            zona = ZonaAudio(self, nombre, canal, panoramica)
+            self.zonas.append(zona)
+        return zona
+
+    def enviar(self, zona: ZonaAudio, orden: str, *args) -> None:
+        with self.candado:
+            if self.hilo is None:
+                self.hilo = threading.Thread(target=self._bucle, name="zonas", daemon=True)
+                self.hilo.start()
+        self.cola.put((zona, orden, args))
+
+    def avisar(self, zona: ZonaAudio, evento: str, turno: int, datos=None) -> None:
+        self.avisos.put((zona, evento, turno, datos))
+
+    def avisos_pendientes(self) -> List[tuple]:
+        import queue
+        pendientes = []
+        try:
+            while True:
+                pendientes.append(self.avisos.get_nowait())
+        except queue.Empty:
+            return pendientes
+
+    def _bucle(self) -> None:
+        import queue
+        if not iniciar_audio():
+            logger.error("Zonas: no se pudo inicializar el audio")
+        while True:
+            orden = ()
+            try:
+                orden = self.cola.get(timeout=PERIODO_MEZCLADOR)
+                while orden is not None:
+                    zona, nombre, args = orden
+                    try:
+                        getattr(zona, "_" + nombre)(*args)
+                    except Exception as e:
+                        logger.error("Zona %s: error en '%s': %s", zona.nombre, nombre, e)
+                        self.avisar(zona, "error", zona.turno, f"No se pudo reproducir: {e}")
+                    orden = self.cola.get_nowait()
+            except queue.Empty:
+                pass
+            if orden is None:
+                for zona in self.zonas:
+                    zona._detener()
+                return
+            for zona in list(self.zonas):
+                try:
+                    zona._alimentar()
+                except Exception as e:
+                    logger.error("Zona %s: %s", zona.nombre, e)
+                    zona._detener()
+
+    def cerrar(self) -> None:
+        if self.hilo is not None:
+            self.cola.put(None)
+            self.hilo.join(timeout=5)
+            self.hilo = None
+        self.cache.cerrar()
+
+# ==================== SILENCIOS ====================
+UMBRAL_SILENCIO_DB = -48.0
+VENTANA_SILENCIO = 0.05
+MARGEN_SILENCIO = 0.15
+
+def buscar_silencios(ruta: str) -> tuple:
+    """(primer sonido, último sonido, duración) en segundos, con RMS por ventanas de 50 ms."""
+    umbral = 10 ** (UMBRAL_SILENCIO_DB / 20)
+    primero = ultimo = None
+    muestras, resto, frecuencia = 0, None, None
+    for bloque, frecuencia in bloques_audio(ruta):
+        ventana = max(1, int(VENTANA_SILENCIO * frecuencia))
+        datos = bloque if resto is None else np.concatenate([resto, bloque])
+        completas = len(datos) // ventana
+        rms = np.sqrt(np.mean(datos[:completas * ventana].reshape(completas, ventana) ** 2, axis=1))
+        sonoras = np.flatnonzero(rms > umbral)
+        if len(sonoras):
+            desplazamiento = muestras - (0 if resto is None else len(resto))
+            if primero is None:
+                primero = desplazamiento + sonoras[0] * ventana
+            ultimo = desplazamiento + (sonoras[-1] + 1) * ventana
+        resto = datos[completas * ventana:]
+        muestras += len(bloque)
+    if frecuencia is None:
+        return 0.0, 0.0, 0.0
+    duracion = muestras / frecuencia
+    if primero is None:
+        return 0.0, duracion, duracion
+    return float(primero / frecuencia), float(ultimo / frecuencia), duracion
+
+class CacheSilencios:
+    """Límites sonoros de cada archivo, calculados en segundo plano y guardados en un JSON.
+
+    obtener() nunca bloquea: si el archivo no está analizado (o cambió desde
+    entonces) lo encola y devuelve None hasta que el resultado esté listo.
+    """
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta or directorio_datos("cache", "silencios.json")
+        self.datos: Optional[Dict[str, list]] = None
+        self.en_curso: set = set()
+        self.sin_guardar = 0
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def _cargar(self) -> Dict[str, list]:
+        if self.datos is None:
+            try:
+                with open(self.ruta, encoding="utf-8") as f:
+                    self.datos = json.load(f)
+            except (OSError, ValueError):
+                self.datos = {}
+        return self.datos
+
+    def _guardar(self) -> None:
+        with self.lock:
+            contenido = json.dumps(self.datos, ensure_ascii=False)
+            self.sin_guardar = 0
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(contenido)
+        os.replace(temporal, self.ruta)
+
+    def obtener(self, ruta_archivo: str) -> Optional[tuple]:
+        ruta = os.path.abspath(ruta_archivo)
+        try:
+            firma = list(firma_archivo(ruta))
+        except OSError:
+            return None
+        with self.lock:
+            guardado = self._cargar().get(ruta)
+        if guardado and guardado[:2] == firma:
+            return tuple(guardado[2:])
+        self.analizar([ruta])
+        return None
+
+    def analizar(self, rutas: Iterable[str]) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+        with self.lock:
+            datos = self._cargar()
+            for ruta in map(os.path.abspath, rutas):
+                if ruta in self.en_curso:
+                    continue
+                try:
+                    firma = list(firma_archivo(ruta))
+                except OSError:
+                    continue
+                if datos.get(ruta, [])[:2] == firma:
+                    continue
+                if self.pool is None:
+                    self.pool = ThreadPoolExecutor(2, thread_name_prefix="silencios")
+                self.en_curso.add(ruta)
+                self.pool.submit(self._analizar, ruta, firma)
+
+    def _analizar(self, ruta: str, firma: list) -> None:
+        try:
+            with instrumentacion.medir("silencios.analisis"):
+                limites = buscar_silencios(ruta)
+        except Exception as e:
+            logger.warning("No se pudieron buscar silencios en %s: %s", ruta, e)
+            limites = None
+        with self.lock:
+            self.en_curso.discard(ruta)
+            if limites:
+                self.datos[ruta] = firma + [round(valor, 3) for valor in limites]
+                self.sin_guardar += 1
+            guardar = self.sin_guardar and (not self.en_curso or self.sin_guardar >= 100)
+        if guardar:
+            try:
+                self._guardar()
+            except OSError as e:
+                logger.warning("No se pudo guardar la caché de silencios: %s", e)
+
+    def cerrar(self) -> None:
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.sin_guardar:
+            self._guardar()
+
+cache_silencios = CacheSilencios()
+
+# ==================== ANÁLISIS DE AUDIO ====================
+NOMBRES_CARACTERISTICAS = (
+    ["duracion", "rms_media", "rms_desv", "centroide_media", "centroide_desv", "rolloff_media",
+     "planitud_media", "zcr_media", "flujo_media", "tempo", "tonalidad", "confianza_tonalidad"]
+    + [f"croma_{i}" for i in range(12)]
+)
+NOTAS = ["Do", "Do#", "Re", "Re#", "Mi", "Fa", "Fa#", "Sol", "Sol#", "La", "La#", "Si"]
+# Perfiles de Krumhansl-Kessler para tonalidades mayores y menores
+PERFIL_MAYOR = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+PERFIL_MENOR = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+def nombre_tonalidad(indice: float) -> str:
+    indice = int(indice)
+    return f"{NOTAS[indice % 12]} {'mayor' if indice < 12 else 'menor'}"
+
+class ExtractorCaracteristicas:
+    """Calcula características de una pista procesando marcos FFT por bloques.
+
+    Cada bloque se trocea en marcos solapados sin copiar (vista deslizante) y
+    todo se calcula con operaciones vectorizadas sobre la matriz de marcos;
+    entre bloques sólo se conservan acumuladores y la envolvente de ataques.
+    """
+
+    TAMANO_MARCO = 2048
+    SALTO = 1024
+
+    def __init__(self, frecuencia: int):
+        self.frecuencia = frecuencia
+        self.ventana = np.hanning(self.TAMANO_MARCO).astype(np.float32)
+        self.frecuencias = np.fft.rfftfreq(self.TAMANO_MARCO, 1 / frecuencia).astype(np.float32)
+        validas = (self.frecuencias > 27.5) & (self.frecuencias < 5000)
+        clases = np.round(69 + 12 * np.log2(self.frecuencias[validas] / 440)).astype(int) % 12
+        self.matriz_croma = np.zeros((len(self.frecuencias), 12), np.float32)
+        self.matriz_croma[np.nonzero(validas)[0], clases] = 1
+        self.resto = np.zeros(0, np.float32)
+        self.anterior: Optional[np.ndarray] = None
+        self.muestras = 0
+        self.marcos = 0
+        self.sumas = np.zeros(8)
+        self.cuadrados = np.zeros(2)
+        self.croma = np.zeros(12)
+        self.envolvente: List[np.ndarray] = []
+
+    def procesar(self, bloque: np.ndarray) -> None:
+        self.muestras += len(bloque)
+        datos = np.concatenate([self.resto, bloque.astype(np.float32)]) if len(self.resto) else bloque
+        if len(datos) < self.TAMANO_MARCO:
+            self.resto = datos
+            return
+        cantidad = 1 + (len(datos) - self.TAMANO_MARCO) // self.SALTO
+        marcos = np.lib.stride_tricks.sliding_window_view(datos, self.TAMANO_MARCO)[::self.SALTO][:cantidad]
+        self.resto = datos[cantidad * self.SALTO:]
+
+        eps = 1e-10
+        rms = np.sqrt(np.mean(marcos ** 2, axis=1))
+        zcr = np.mean(np.abs(np.diff(np.signbit(marcos), axis=1)), axis=1)
+        magnitud = np.abs(np.fft.rfft(marcos * self.ventana, axis=1)).astype(np.float32)
+        potencia = magnitud ** 2
+        total = magnitud.sum(axis=1) + eps
+        centroide = (magnitud @ self.frecuencias) / total
+        acumulada = np.cumsum(potencia, axis=1)
+        rolloff = self.frecuencias[np.argmax(acumulada >= 0.85 * acumulada[:, -1:], axis=1)]
+        planitud = np.exp(np.mean(np.log(magnitud + eps), axis=1)) / (np.mean(magnitud, axis=1) + eps)
+
+        # Flujo espectral (sobre magnitud comprimida) como envolvente de ataques
+        comprimida = np.log1p(magnitud)
+        previa = np.vstack([comprimida[:1] if self.anterior is None else self.anterior, comprimida[:-1]])
+        flujo = np.maximum(comprimida - previa, 0).sum(axis=1)
+        self.anterior = comprimida[-1:]
+        self.envolvente.append(flujo.astype(np.float32))
+
+        self.marcos += cantidad
+        self.sumas += [rms.sum(), centroide.sum(), rolloff.sum(), planitud.sum(), zcr.sum(), flujo.sum(), 0, 0]
+        self.cuadrados += [(rms ** 2).sum(), (centroide ** 2).sum()]
+        self.croma += (potencia @ self.matriz_croma).sum(axis=0)
+
+    def _tempo(self) -> float:
+        if not self.envolvente:
+            return 0.0
+        envolvente = np.concatenate(self.envolvente)
+        envolvente = envolvente - envolvente.mean()
+        if len(envolvente) < 8 or not envolvente.any():
+            return 0.0
+        tasa = self.frecuencia / self.SALTO
+        n = 1 << int(np.ceil(np.log2(2 * len(envolvente))))
+        espectro = np.fft.rfft(envolvente, n)
+        autocorrelacion = np.fft.irfft(espectro * np.conj(espectro), n)[:len(envolvente)]
+        minimo, maximo = int(60 * tasa / 200), int(np.ceil(60 * tasa / 60))
+        if maximo >= len(autocorrelacion) or minimo < 1:
+            return 0.0
+        retardos = np.arange(minimo, maximo + 1)
+        bpm = 60 * tasa / retardos
+        # Preferencia suave por tempos cercanos a 120 para evitar errores de octava
+        peso = np.exp(-0.5 * (np.log2(bpm / 120) / 1.0) ** 2)
+        mejor = retardos[np.argmax(autocorrelacion[retardos] * peso)]
+        return float(60 * tasa / mejor)
+
+    def _tonalidad(self) -> tuple:
+        if not self.croma.any():
+            return 0.0, 0.0
+        croma = (self.croma - self.croma.mean()) / (self.croma.std() + 1e-10)
+        perfiles = np.array([np.roll(p, k) for p in (PERFIL_MAYOR, PERFIL_MENOR) for k in range(12)])
+        perfiles = (perfiles - perfiles.mean(axis=1, keepdims=True)) / perfiles.std(axis=1, keepdims=True)
+        correlaciones = perfiles @ croma / 12
+        mejor = int(np.argmax(correlaciones))
+        return float(mejor), float(correlaciones[mejor])
+
+    def resultado(self) -> np.ndarray:
+        n = max(1, self.marcos)
+        medias = self.sumas / n
+        rms_desv = math.sqrt(max(0.0, self.cuadrados[0] / n - medias[0] ** 2))
+        centroide_desv = math.sqrt(max(0.0, self.cuadrados[1] / n - medias[1] ** 2))
+        tonalidad, confianza = self._tonalidad()
+        croma = self.croma / (self.croma.sum() + 1e-10)
+        return np.array([self.muestras / self.frecuencia, medias[0], rms_desv, medias[1], centroide_desv,
+                         medias[2], medias[3], medias[4], medias[5], self._tempo(), tonalidad, confianza,
+                         *croma], dtype=np.float32)
+
+def firma_archivo(ruta: str) -> tuple:
+    info = os.stat(ruta)
+    return info.st_size, info.st_mtime_ns
+
+def analizar_archivo(ruta: str) -> tuple:
+    """Trabajo de un proceso del pool: (ruta, firma, vector o None, error)."""
+    try:
+        firma = firma_archivo(ruta)
+        if not decodificacion_acotada(ruta):
+            # pygame lo decodificaría entero en memoria: queda como fila NaN hasta que cambie
+            return ruta, firma, None, "hace falta soundfile para leerlo por partes"
+        extractor = None
+        for bloque, frecuencia in bloques_audio(ruta):
+            if extractor is None:
+                extractor = ExtractorCaracteristicas(frecuencia)
+            extractor.procesar(bloque)
+        if extractor is None:
+            return ruta, firma, None, "archivo vacío"
+        return ruta, firma, extractor.resultado(), None
+    except Exception as e:
+        try:
+            firma = firma_archivo(ruta)
+        except OSError:
+            firma = (0, 0)
+        return ruta, firma, None, str(e)
+
+def _iniciar_trabajador_analisis():
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try:
+        mixer.init()
+    except pygame.error as e:
+        logger.warning("Sin mixer en el proceso de análisis (sólo WAV): %s", e)
+
+class AlmacenCaracteristicas:
+    """Matriz de características por columnas (una fila por pista) guardada en disco.
+
+    Cada lote terminado se escribe como un archivo parte_NNNNN.npz nuevo, así que
+    un análisis interrumpido se retoma donde quedó sin reescribir lo anterior;
+    compactar() junta las partes en una sola. Los fallos se guardan como filas NaN
+    para no reintentarlos hasta que el archivo cambie.
+    """
+
+    def __init__(self, directorio: Optional[str] = None):
+        self.directorio = directorio or directorio_datos("data", "caracteristicas")
+        self.rutas: List[str] = []
+        # Búferes con hueco libre al final; firmas y matriz son sus primeras len(rutas) filas
+        self._firmas = np.zeros((0, 2), np.int64)
+        self._matriz = np.zeros((0, len(NOMBRES_CARACTERISTICAS)), np.float32)
+        self.indice: Dict[str, int] = {}
+        # Funciones f(rutas, matriz) avisadas con cada lote guardado
+        self.oyentes: List = []
+        self.cargar()
+
+    @property
+    def firmas(self) -> np.ndarray:
+        return self._firmas[:len(self.rutas)]
+
+    @property
+    def matriz(self) -> np.ndarray:
+        return self._matriz[:len(self.rutas)]
+
+    def _reservar(self, filas: int) -> None:
+        # Crecimiento geométrico: añadir n filas cuesta O(n) amortizado
+        if filas <= len(self._matriz):
+            return
+        capacidad = max(filas, 2 * len(self._matriz), 256)
+        for nombre in ("_firmas", "_matriz"):
+            viejo = getattr(self, nombre)
+            nuevo = np.zeros((capacidad, viejo.shape[1]), viejo.dtype)
+            nuevo[:len(self.rutas)] = viejo[:len(self.rutas)]
+            setattr(self, nombre, nuevo)
+
+    def _partes(self) -> List[str]:
+        if not os.path.isdir(self.directorio):
+            return []
+        # Sólo parte_NNNNN.npz: los temporales de agregar_lote y compactar no cuentan
+        return sorted(os.path.join(self.directorio, n) for n in os.listdir(self.directorio)
+                      if re.fullmatch(r"parte_\d{5}\.npz", n))
+
+    def cargar(self) -> None:
+        rutas, firmas, filas = [], [], []
+        for parte in self._partes():
+            with np.load(parte, allow_pickle=False) as datos:
+                if datos["matriz"].shape[1] != len(NOMBRES_CARACTERISTICAS):
+                    logger.warning("Se ignora %s: columnas distintas", parte)
+                    continue
+                rutas.extend(datos["rutas"].tolist())
+                firmas.append(datos["firmas"])
+                filas.append(datos["matriz"])
+        self.rutas, self.indice = [], {}
+        if not rutas:
+            return
+        firmas, filas = np.concatenate(firmas), np.concatenate(filas)
+        # Si una ruta se analizó varias veces gana la última
+        ultimas = {ruta: i for i, ruta in enumerate(rutas)}
+        orden = np.fromiter(ultimas.values(), np.int64, len(ultimas))
+        self.rutas = list(ultimas)
+        self._firmas, self._matriz = firmas[orden], filas[orden]
+        self.indice = {ruta: i for i, ruta in enumerate(self.rutas)}
+
+    def pendientes(self, rutas: Iterable[str]) -> List[str]:
+        resultado = []
+        for ruta in rutas:
+            i = self.indice.get(ruta)
+            try:
+                if i is None or tuple(self.firmas[i]) != firma_archivo(ruta):
+                    resultado.append(ruta)
+            except OSError:
+                continue
+        return resultado
+
+    def agregar_lote(self, resultados: List[tuple]) -> None:
+        if not resultados:
+            return
+        rutas = [r[0] for r in resultados]
+        firmas = np.array([r[1] for r in resultados], np.int64)
+        matriz = np.array([r[2] if r[2] is not None else np.full(len(NOMBRES_CARACTERISTICAS), np.nan)
+                           for r in resultados], np.float32)
+        os.makedirs(self.directorio, exist_ok=True)
+        partes = self._partes()
+        numero = int(os.path.basename(partes[-1])[6:11]) + 1 if partes else 0
+        destino = os.path.join(self.directorio, f"parte_{numero:05d}.npz")
+        temporal = destino + ".tmp.npz"
+        np.savez(temporal, rutas=np.array(rutas), firmas=firmas, matriz=matriz)
+        os.replace(temporal, destino)
+
+        self._reservar(len(self.rutas) + len(rutas))
+        for ruta, firma, fila in zip(rutas, firmas, matriz):
+            i = self.indice.get(ruta)
+            if i is None:
+                i = self.indice[ruta] = len(self.rutas)
+                self.rutas.append(ruta)
+            self._firmas[i], self._matriz[i] = firma, fila
+        for oyente in self.oyentes:
+            oyente(rutas, matriz)
+
+    def compactar(self) -> None:
+        partes = self._partes()
+        if len(partes) <= 1:
+            return
+        destino = os.path.join(self.directorio, "parte_00000.npz.nuevo.npz")
+        np.savez(destino, rutas=np.array(self.rutas), firmas=self.firmas, matriz=self.matriz)
+        for parte in partes:
+            os.remove(parte)
+        os.replace(destino, os.path.join(self.directorio, "parte_00000.npz"))
+
+    def vector(self, ruta: str) -> Optional[np.ndarray]:
+        i = self.indice.get(ruta)
+        return None if i is None else self.matriz[i]
+
+    def columna(self, nombre: str) -> np.ndarray:
+        return self.matriz[:, NOMBRES_CARACTERISTICAS.index(nombre)]
+
+def analizar_biblioteca(rutas: Iterable[str], almacen: AlmacenCaracteristicas,
+                        procesos: Optional[int] = None, tamano_lote: int = 200) -> int:
+    """Analiza en un pool de procesos las rutas que falten en el almacén; devuelve cuántas procesó."""
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    pendientes = almacen.pendientes(dict.fromkeys(os.path.abspath(r) for r in rutas))
+    total = len(pendientes)
+    logger.info("Análisis: %d pistas pendientes", total)
+    if not total:
+        return 0
+
+    procesos = procesos or os.cpu_count() or 1
+    cola = iter(pendientes)
+    lote, hechas, inicio = [], 0, time.monotonic()
+    with ProcessPoolExecutor(procesos, initializer=_iniciar_trabajador_analisis) as pool:
+        en_curso = set()
+        try:
+            while True:
+                # Sólo unas pocas tareas en vuelo: la memoria no depende del tamaño de la biblioteca
+                for ruta in itertools.islice(cola, 2 * procesos - len(en_curso)):
+                    en_curso.add(pool.submit(analizar_archivo, ruta))
+                if not en_curso:
+                    break
+                listas, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in listas:
+                    ruta, firma, vector, error = futuro.result()
+                    if error:
+                        logger.warning("No se pudo analizar %s: %s", ruta, error)
+                    lote.append((ruta, firma, vector))
+                    hechas += 1
+                if len(lote) >= tamano_lote:
+                    almacen.agregar_lote(lote)
+                    lote = []
+                    ritmo = hechas / max(1e-6, time.monotonic() - inicio)
+                    logger.info("Análisis: %d/%d (%.1f pistas/s)", hechas, total, ritmo)
+        finally:
+            # También al interrumpir: lo ya calculado queda guardado
+            almacen.agregar_lote(lote)
+            for futuro in en_curso:
+                futuro.cancel()
+    return hechas
+
+# ==================== RADIO ====================
+RADIO_RECIENTES = 50
+RADIO_CANDIDATOS = 5
+# Posición de cada tónica en el círculo de quintas
+_QUINTAS = np.array([(7 * i) % 12 for i in range(12)]) * (2 * np.pi / 12)
+
+def vectores_similitud(matriz: np.ndarray) -> np.ndarray:
+    """Convierte filas de NOMBRES_CARACTERISTICAS en vectores comparables por coseno."""
+    columna = {nombre: i for i, nombre in enumerate(NOMBRES_CARACTERISTICAS)}
+    tonalidad = np.nan_to_num(matriz[:, columna["tonalidad"]]).astype(int) % 24
+    confianza = np.clip(np.nan_to_num(matriz[:, columna["confianza_tonalidad"]]), 0, 1)
+    angulo = _QUINTAS[tonalidad % 12] + np.where(tonalidad >= 12, np.pi / 4, 0)
+    tempo = np.log2(np.maximum(matriz[:, columna["tempo"]], 30))
+    timbre = matriz[:, [columna[n] for n in ("rms_media", "rms_desv", "centroide_media", "centroide_desv",
+                                             "rolloff_media", "planitud_media", "zcr_media", "flujo_media")]]
+    croma = matriz[:, columna["croma_0"]:columna["croma_11"] + 1]
+    return np.column_stack([timbre, tempo, confianza * np.cos(angulo), confianza * np.sin(angulo), croma]
+                           ).astype(np.float32)
+
+class IndiceSimilitud:
+    """Vecinos más cercanos por distancia coseno sobre una matriz NumPy.
+
+    Las filas se guardan tipificadas y normalizadas, así que una consulta es un
+    único producto matriz-vector. La capacidad crece al doble para que añadir
+    sea barato, y la media y desviación se recalculan cada vez que el número de
+    filas se duplica.
+    """
+
+    def __init__(self):
+        self.rutas: List[str] = []
+        self.posiciones: Dict[str, int] = {}
+        self.crudos: Optional[np.ndarray] = None
+        self.vectores: Optional[np.ndarray] = None
+        self.validas = np.zeros(0, bool)
+        self.media: Optional[np.ndarray] = None
+        self.escala: Optional[np.ndarray] = None
+        self.filas_estadisticas = 0
+
+    def __len__(self) -> int:
+        return len(self.rutas)
+
+    def _normalizar(self, filas) -> None:
+        crudos = self.crudos[filas]
+        validas = np.isfinite(crudos).all(axis=1)
+        tipificados = np.nan_to_num((crudos - self.media) / self.escala)
+        normas = np.linalg.norm(tipificados, axis=1, keepdims=True)
+        self.vectores[filas] = tipificados / np.maximum(normas, 1e-12)
+        self.validas[filas] = validas & (normas[:, 0] > 0)
+
+    def _reajustar(self) -> None:
+        n = len(self.rutas)
+        crudos = self.crudos[:n]
+        finitas = crudos[np.isfinite(crudos).all(axis=1)]
+        if len(finitas) < 2:
+            self.media = None
+            self.validas[:n] = False
+            return
+        self.media = finitas.mean(axis=0)
+        self.escala = finitas.std(axis=0) + 1e-6
+        self.filas_estadisticas = n
+        self._normalizar(slice(0, n))
+
+    def construir(self, rutas: List[str], matriz: np.ndarray) -> None:
+        self.__init__()
+        self.agregar(rutas, matriz)
+
+    def agregar(self, rutas: List[str], matriz: np.ndarray) -> None:
+        if not len(rutas):
+            return
+        crudos = vectores_similitud(matriz)
+        nuevas = [ruta for ruta in dict.fromkeys(rutas) if ruta not in self.posiciones]
+        necesarias = len(self.rutas) + len(nuevas)
+        if self.crudos is None or necesarias > len(self.crudos):
+            capacidad = max(necesarias, 2 * (0 if self.crudos is None else len(self.crudos)), 1024)
+            ampliados = np.full((capacidad, crudos.shape[1]), np.nan, np.float32)
+            if self.crudos is not None:
+                ampliados[:len(self.rutas)] = self.crudos[:len(self.rutas)]
+            self.crudos = ampliados
+            self.vectores = np.zeros_like(ampliados)
+            self.validas = np.zeros(capacidad, bool)
+            self.media = None
+        for ruta in nuevas:
+            self.posiciones[ruta] = len(self.rutas)
+            self.rutas.append(ruta)
+        filas = np.fromiter((self.posiciones[ruta] for ruta in rutas), np.int64, len(rutas))
+        self.crudos[filas] = crudos
+        if self.media is None or len(self.rutas) >= 2 * self.filas_estadisticas:
+            self._reajustar()
+        else:
+            self._normalizar(filas)
+
+    def vector(self, ruta: str) -> Optional[np.ndarray]:
+        i = self.posiciones.get(ruta)
+        if i is None or not self.validas[i]:
+            return None
+        return self.vectores[i]
+
+    def vecinos(self, consulta: np.ndarray, k: int = RADIO_CANDIDATOS,
+                excluir: Iterable[str] = ()) -> List[tuple]:
+        """Las k rutas más parecidas a consulta como (ruta, similitud), de mayor a menor."""
+        n = len(self.rutas)
+        if not n:
+            return []
+        similitudes = self.vectores[:n] @ (consulta / (np.linalg.norm(consulta) or 1))
+        similitudes[~self.validas[:n]] = -np.inf
+        for ruta in excluir:
+            i = self.posiciones.get(ruta)
+            if i is not None:
+                similitudes[i] = -np.inf
+        k = min(k, n)
+        mejores = np.argpartition(-similitudes, k - 1)[:k]
+        mejores = mejores[np.argsort(-similitudes[mejores])]
+        return [(self.rutas[i], float(similitudes[i])) for i in mejores if np.isfinite(similitudes[i])]
+
+class Radio:
+    """Elige la siguiente canción por parecido con la actual, evitando las recientes.
+
+    El índice se construye en un hilo aparte con preparar() a partir del almacén
+    de características y después crece con cada lote analizado; hasta que está
+    listo, sugerir() no propone nada en vez de bloquear a quien la llama.
+    """
+
+    def __init__(self, almacen: Optional[AlmacenCaracteristicas] = None):
+        from collections import deque
+        self._almacen = almacen
+        self._indice: Optional[IndiceSimilitud] = None
+        self._hilo: Optional[threading.Thread] = None
+        self.recientes = deque(maxlen=RADIO_RECIENTES)
+
+    @property
+    def indice(self) -> Optional[IndiceSimilitud]:
+        return self._indice
+
+    def preparar(self) -> None:
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._construir, name="indice-radio", daemon=True)
+            self._hilo.start()
+
+    def _construir(self) -> None:
+        try:
+            with registro_arranque.medir("índice de radio"):
+                almacen = self._almacen or AlmacenCaracteristicas()
+                indice = IndiceSimilitud()
+                indice.construir(almacen.rutas, almacen.matriz)
+                almacen.oyentes.append(indice.agregar)
+                self._almacen, self._indice = almacen, indice
+        except Exception as e:
+            logger.warning("No se pudo construir el índice de radio: %s", e)
+
+    def escuchada(self, ruta: str) -> None:
+        self.recientes.append(os.path.abspath(ruta))
+
+    def sugerir(self, ruta: str) -> Optional[str]:
+        indice = self._indice
+        if indice is None:
+            self.preparar()
+            logger.info("Radio: el índice de similitud todavía se está construyendo")
+            return None
+        ruta = os.path.abspath(ruta)
+        consulta = indice.vector(ruta)
+        if consulta is None:
+            # Canción sin analizar: se usa el perfil medio de lo escuchado
+            previos = [v for v in map(indice.vector, self.recientes) if v is not None]
+            if not previos:
+                return None
+            consulta = np.mean(previos, axis=0)
+        excluir = set(self.recientes)
+        excluir.add(ruta)
+        candidatas = [r for r, _ in indice.vecinos(consulta, RADIO_CANDIDATOS, excluir) if os.path.exists(r)]
+        return random.choice(candidatas) if candidatas else None
+
+# ==================== DUPLICADOS ====================
+TROZO_HASH = 64 * 1024
+HUELLA_SEGUNDOS = 60
+HUELLA_BANDAS = 33
+HUELLA_UMBRAL = 0.35
+HUELLA_TOLERANCIA_DURACION = 3.0
+
+def hash_parcial(ruta: str, tamano: int) -> str:
+    """SHA-1 del tamaño y de tres trozos (inicio, mitad y final): barato y casi siempre decisivo."""
+    h = hashlib.sha1(str(tamano).encode())
+    with open(ruta, "rb") as f:
+        for posicion in (0, max(0, tamano // 2 - TROZO_HASH // 2), max(0, tamano - TROZO_HASH)):
+            f.seek(posicion)
+            h.update(f.read(TROZO_HASH))
+    return h.hexdigest()
+
+def hash_completo(ruta: str) -> str:
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for trozo in iter(lambda: f.read(16 * TROZO_HASH), b""):
+            h.update(trozo)
+    return h.hexdigest()
+
+def huella_audio(ruta: str) -> tuple:
+    """Huella gruesa para reconocer recodificaciones: (ruta, duración, huella uint32 o None).
+
+    Cada 0,1 s se miden 33 bandas logarítmicas entre 300 y 3000 Hz y cada bit
+    dice si la diferencia entre bandas vecinas sube o baja respecto al marco
+    anterior; sólo se leen los primeros HUELLA_SEGUNDOS y la duración sale de
+    la cabecera. Los archivos que pygame tendría que decodificar enteros y no
+    caben en MAX_BYTES_DECODIFICACION_COMPLETA se saltan.
+    """
+    try:
+        if not decodificacion_acotada(ruta):
+            logger.info("Sin huella de audio para %s: hace falta soundfile para leerlo por partes", ruta)
+            return ruta, 0.0, None
+        duracion = duracion_audio(ruta)
+        marcos_huella, resto, muestras, frecuencia = [], None, 0, None
+        anterior, total_marcos = None, 0
+        for bloque, frecuencia_bloque in bloques_audio(ruta):
+            if frecuencia is None:
+                frecuencia = frecuencia_bloque
+                largo, salto = int(frecuencia * 0.2), int(frecuencia * 0.1)
+                ventana = np.hanning(largo).astype(np.float32)
+                bins = np.fft.rfftfreq(largo, 1 / frecuencia)
+                bordes = np.searchsorted(bins, np.geomspace(300, 3000, HUELLA_BANDAS + 1))
+                resto = np.zeros(0, np.float32)
+            muestras += len(bloque)
+            if total_marcos * salto >= HUELLA_SEGUNDOS * frecuencia:
+                if duracion is not None:
+                    break
+                # Sin cabecera que la diga, la duración obliga a contar hasta el final
+                continue
+            datos = np.concatenate([resto, bloque])
+            if len(datos) < largo:
+                resto = datos
+                continue
+            cantidad = 1 + (len(datos) - largo) // salto
+            marcos = np.lib.stride_tricks.sliding_window_view(datos, largo)[::salto][:cantidad]
+            resto = datos[cantidad * salto:]
+            total_marcos += cantidad
+            potencia = np.abs(np.fft.rfft(marcos * ventana, axis=1)) ** 2
+            energia = np.add.reduceat(potencia, bordes[:-1], axis=1)
+            diferencia = energia[:, :-1] - energia[:, 1:]
+            previa = np.vstack([diferencia[:1] if anterior is None else anterior, diferencia[:-1]])
+            anterior = diferencia[-1:]
+            bits = (diferencia - previa) > 0
+            marcos_huella.append(np.packbits(bits, axis=1, bitorder="little").view("<u4")[:, 0])
+        if frecuencia is None or not marcos_huella:
+            return ruta, 0.0, None
+        if duracion is None:
+            duracion = muestras / frecuencia
+        return ruta, duracion, np.concatenate(marcos_huella)
+    except Exception as e:
+        logger.warning("Sin huella de audio para %s: %s", ruta, e)
+        return ruta, 0.0, None
+
+def distancia_huellas(a: np.ndarray, b: np.ndarray, desplazamiento: int = 5) -> float:
+    """Proporción mínima de bits distintos entre dos huellas, probando pequeños desfases."""
+    mejor = 1.0
+    for d in range(-desplazamiento, desplazamiento + 1):
+        x, y = (a[d:], b) if d >= 0 else (a, b[-d:])
+        n = min(len(x), len(y))
+        if n < 20:
+            continue
+        distintos = np.unpackbits(np.bitwise_xor(x[:n], y[:n]).view(np.uint8)).sum()
+        mejor = min(mejor, distintos / (32 * n))
+    return mejor
+
+class InformeDuplicados:
+    """Grupos de archivos repetidos; la primera ruta de cada grupo es la que se conserva."""
+
+    def __init__(self):
+        # (tipo, rutas) con tipo "idéntico" (mismo contenido) o "audio" (misma grabación)
+        self.grupos: List[tuple] = []
+        self.revisados = 0
+        self.segundos = 0.0
+
+    def agregar(self, tipo: str, rutas: List[str], tamanos: Dict[str, int]) -> None:
+        if tipo == "audio":
+            # Entre recodificaciones se conserva la de mayor tamaño (más calidad)
+            rutas = sorted(rutas, key=lambda r: (-tamanos.get(r, 0), r))
+        else:
+            rutas = sorted(rutas, key=lambda r: (len(r), r))
+        self.grupos.append((tipo, rutas))
+
+    def canonicas(self) -> Dict[str, str]:
+        destinos = {ruta: rutas[0] for _, rutas in self.grupos for ruta in rutas[1:]}
+        # Un grupo de audio puede conservar una copia que otro grupo da por repetida
+        for ruta, destino in destinos.items():
+            while destino in destinos and destinos[destino] != ruta:
+                destino = destinos[destino]
+            destinos[ruta] = destino
+        return destinos
+
+    def a_dict(self) -> dict:
+        return {"revisados": self.revisados, "segundos": round(self.segundos, 3),
+                "grupos": [{"tipo": tipo, "conservar": rutas[0], "duplicados": rutas[1:]}
+                           for tipo, rutas in self.grupos]}
+
+    def resumen(self) -> str:
+        sobrantes = sum(len(rutas) - 1 for _, rutas in self.grupos)
+        lineas = [f"{len(self.grupos)} grupos, {sobrantes} copias sobrantes de {self.revisados} archivos"]
+        for tipo, rutas in self.grupos:
+            lineas.append(f"[{tipo}] {rutas[0]}")
+            lineas.extend(f"    = {ruta}" for ruta in rutas[1:])
+        return "\n".join(lineas)
+
+def _agrupar(rutas: List[str], clave, hilos: int) -> List[List[str]]:
+    from concurrent.futures import ThreadPoolExecutor
+    grupos: Dict[str, List[str]] = {}
+    with ThreadPoolExecutor(hilos) as pool:
+        for ruta, valor in zip(rutas, pool.map(clave, rutas)):
+            if valor is not None:
+                grupos.setdefault(valor, []).append(ruta)
+    return [grupo for grupo in grupos.values() if len(grupo) > 1]
+
+def buscar_duplicados(rutas: Iterable[str], comparar_audio: bool = False,
+                      procesos: Optional[int] = None) -> InformeDuplicados:
+    """Detecta archivos repetidos por etapas: tamaño, hash parcial, hash completo y, opcionalmente, huella de audio.
+
+    Cada etapa sólo mira los candidatos que dejó la anterior. Los hashes se leen
+    por trozos en un pool de hilos (la E/S y hashlib liberan el GIL) y las
+    huellas se calculan en un pool de procesos.
+    """
+    inicio = time.perf_counter()
+    informe = InformeDuplicados()
+    tamanos: Dict[str, int] = {}
+    for ruta in dict.fromkeys(os.path.abspath(r) for r in rutas):
+        try:
+            tamanos[ruta] = os.path.getsize(ruta)
+        except OSError:
+            continue
+    informe.revisados = len(tamanos)
+    hilos = min(32, 2 * (os.cpu_count() or 1))
+
+    def leer(funcion):
+        def clave(ruta):
+            try:
+                return funcion(ruta)
+            except OSError as e:
+                logger.warning("No se pudo leer %s: %s", ruta, e)
+                return None
+        return clave
+
+    por_tamano: Dict[int, List[str]] = {}
+    for ruta, tamano in tamanos.items():
+        por_tamano.setdefault(tamano, []).append(ruta)
+    candidatas = [ruta for grupo in por_tamano.values() if len(grupo) > 1 for ruta in grupo]
+    for grupo in _agrupar(candidatas, leer(lambda r: hash_parcial(r, tamanos[r])), hilos):
+        if tamanos[grupo[0]] <= 3 * TROZO_HASH:
+            # Los tres trozos ya cubrían el archivo entero
+            informe.agregar("idéntico", grupo, tamanos)
+            continue
+        for identicos in _agrupar(grupo, leer(hash_completo), hilos):
+            informe.agregar("idéntico", identicos, tamanos)
+
+    if comparar_audio:
+        repetidas = set(informe.canonicas())
+        unicas = [ruta for ruta in tamanos
+                  if ruta not in repetidas and ruta.lower().endswith(EXTENSIONES_AUDIO)]
+        for grupo in _agrupar_por_huella(unicas, procesos):
+            informe.agregar("audio", grupo, tamanos)
+
+    informe.segundos = time.perf_counter() - inicio
+    logger.info("Duplicados: %d grupos en %d archivos (%.2f s)",
+                len(informe.grupos), informe.revisados, informe.segundos)
+    return informe
+
+def _agrupar_por_huella(rutas: List[str], procesos: Optional[int]) -> List[List[str]]:
+    from concurrent.futures import ProcessPoolExecutor
+    if len(rutas) < 2:
+        return []
+    procesos = procesos or os.cpu_count() or 1
+    with ProcessPoolExecutor(procesos, initializer=_iniciar_trabajador_analisis) as pool:
+        huellas = [h for h in pool.map(huella_audio, rutas, chunksize=4) if h[2] is not None]
+
+    # Sólo se comparan pistas de duración parecida, recorriéndolas ordenadas
+    huellas.sort(key=lambda h: h[1])
+    padres = list(range(len(huellas)))
+
+    def raiz(i):
+        while padres[i] != i:
+            padres[i] = padres[padres[i]]
+            i = padres[i]
+        return i
+
+    for i, (_, duracion, huella) in enumerate(huellas):
+        for j in range(i + 1, len(huellas)):
+            if huellas[j][1] - duracion > HUELLA_TOLERANCIA_DURACION:
+                break
+            if raiz(i) != raiz(j) and distancia_huellas(huella, huellas[j][2]) < HUELLA_UMBRAL:
+                padres[raiz(j)] = raiz(i)
+
+    grupos: Dict[int, List[str]] = {}
+    for i, (ruta, _, _) in enumerate(huellas):
+        grupos.setdefault(raiz(i), []).append(ruta)
+    return [grupo for grupo in grupos.values() if len(grupo) > 1]
+
+# ==================== CONTROL REMOTO ====================
+def ruta_socket_control() -> str:
+    base = os.environ.get("XDG_RUNTIME_DIR") or directorio_datos("cache")
+    return os.environ.get("YAUTJA_SOCKET") or os.path.join(base, "yautja-music.sock")
+
+def estado_reproduccion(gestor: GestorListas) -> dict:
+    lista = gestor.lista_actual
+    nombre = gestor.nombre_de(lista)
+    estado = {"lista": nombre, "reproduciendo": False, "cancion": None,
+              "posicion": 0.0, "volumen": None, "repeticion": None, "velocidad": None}
+    if lista:
+        estado.update(reproduciendo=lista.reproduciendo, posicion=round(lista.obtener_posicion(), 3),
+                      volumen=round(lista.volumen * 100), repeticion=lista.modo_repeticion,
+                      velocidad=lista.velocidad, recortar_silencios=lista.recortar_silencios)
+        if lista.actual:
+            cancion = lista.actual.cancion
+            estado["cancion"] = {"titulo": cancion.titulo, "artista": cancion.artista,
+                                 "duracion": cancion.duracion, "genero": cancion.genero,
+                                 "ruta": cancion.ruta_archivo}
+    return estado
+
+class DespachadorComandos:
+    """Cola de llamadas que otros hilos piden ejecutar en el hilo dueño (Tk o demonio)."""
+
+    def __init__(self):
+        import queue
+        self.cola = queue.Queue()
+
+    def ejecutar(self, funcion, *args):
+        from concurrent.futures import Future
+        futuro = Future()
+        self.cola.put((funcion, args, futuro))
+        return futuro
+
+    def procesar_pendientes(self, limite: int = 100) -> int:
+        procesados = 0
+        while procesados < limite and not self.cola.empty():
+            funcion, args, futuro = self.cola.get_nowait()
+            procesados += 1
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            try:
+                futuro.set_result(funcion(*args))
+            except Exception as e:
+                futuro.set_exception(e)
+        return procesados
+
+class ComandosReproductor:
+    """Órdenes de control sobre GestorListas. Se ejecutan siempre en el hilo dueño."""
+
+    def __init__(self, gestor: GestorListas):
+        self.gestor = gestor
+
+    def _lista(self) -> ListaReproduccion:
+        if not self.gestor.lista_actual:
+            raise ValueError("No hay lista activa")
+        return self.gestor.lista_actual
+
+    def play(self):
+        lista = self._lista()
+        if not lista.reproduciendo:
+            if not lista.actual and lista.cabeza:
+                lista.actual = lista.cabeza
+            if lista.posicion_pausa > 0:
+                lista.reanudar()
+            else:
+                lista.reproducir()
+
+    def pause(self):
+        self._lista().pausar()
+
+    def toggle(self):
+        if self._lista().reproduciendo:
+            self.pause()
+        else:
+            self.play()
+
+    def stop(self):
+        self._lista().detener()
+
+    def next(self):
+        self._lista().siguiente()
+
+    def previous(self):
+        self._lista().anterior()
+
+    def seek(self, segundos):
+        self._lista().saltar_a(float(segundos))
+
+    def volume(self, valor):
+        self._lista().ajustar_volumen(float(valor) / 100)
+
+    def trim(self, activo):
+        self._lista().activar_recorte(str(activo).lower() in ("1", "on", "true", "si", "sí"))
+        return self._lista().recortar_silencios
+
+    def speed(self, valor):
+        return self._lista().cambiar_velocidad(float(valor))
+
+    def undo(self):
+        return self.gestor.diario.deshacer()
+
+    def redo(self):
+        return self.gestor.diario.rehacer()
+
+    def repeat(self, modo):
+        if modo not in MODOS_REPETICION:
+            raise ValueError(f"Modo desconocido, usa uno de {MODOS_REPETICION}")
+        self._lista().modo_repeticion = modo
+        if modo == "Radio":
+            self.gestor.radio.preparar()
+
+    def select(self, nombre):
+        if not self.gestor.seleccionar_lista(nombre):
+            raise ValueError(f"No existe la lista '{nombre}'")
+
+    def lists(self):
+        return self.gestor.obtener_nombres_listas() + self.gestor.obtener_nombres_inteligentes()
+
+    def zones(self):
+        return [{"zona": nombre, "reproduciendo": lista.reproduciendo,
+                 "cancion": lista.actual.cancion.titulo if lista.actual else None,
+                 "posicion": round(lista.obtener_posicion(), 3), "volumen": round(lista.volumen * 100)}
+                for nombre, lista in self.gestor.zonas().items()]
+
+    def songs(self):
+        return [{"titulo": c.titulo, "artista": c.artista, "duracion": c.duracion}
+                for c in self._lista().obtener_canciones()]
+
+class ServidorControl:
+    """Servidor asyncio local (socket Unix, o TCP en localhost) para controlar el reproductor.
+
+    Protocolo de líneas: cada petición es texto ("seek 30") o JSON
+    ({"cmd": "seek", "args": [30], "id": 1}) y cada respuesta es una línea JSON.
+    "status" se responde desde la última instantánea publicada por el hilo dueño,
+    sin pasar por él; el resto de órdenes se encolan en el DespachadorComandos.
+    "subscribe" deja la conexión abierta recibiendo {"evento": "estado", ...}.
+    """
+
+    PUERTO_TCP = 47800
+    LIMITE_BUFFER = 64 * 1024
+
+    def __init__(self, comandos: ComandosReproductor, despachador: DespachadorComandos,
+                 ruta: Optional[str] = None, puerto: Optional[int] = None):
+        self.comandos = comandos
+        self.despachador = despachador
+        self.ruta = ruta or ruta_socket_control()
+        self.puerto = puerto
+        self.estado: dict = {"reproduciendo": False}
+        self.marca_estado = time.monotonic()
+        self._firma_estado = None
+        self.suscriptores = set()
+        self.conexiones = {}
+        self.loop = None
+        self.hilo: Optional[threading.Thread] = None
+        self._detenido = None
+
+    def iniciar(self):
+        """Arranca el hilo del servidor; lanza OSError si otro proceso ya atiende en la misma dirección."""
+        self._comprobar_libre()
+        self.hilo = threading.Thread(target=self._ejecutar, name="control-remoto", daemon=True)
+        self.hilo.start()
+
+    def _comprobar_libre(self):
+        # Un socket Unix que nadie atiende lo dejó un cierre brusco y se puede borrar
+        unix = self.puerto is None and hasattr(socket, "AF_UNIX")
+        if unix and not os.path.exists(self.ruta):
+            return
+        direccion = self.ruta if unix else ("127.0.0.1", self.puerto or self.PUERTO_TCP)
+        prueba = socket.socket(socket.AF_UNIX if unix else socket.AF_INET, socket.SOCK_STREAM)
+        prueba.settimeout(1)
+        try:
+            prueba.connect(direccion)
+        except (ConnectionRefusedError, FileNotFoundError):
+            if unix:
+                os.unlink(self.ruta)
+            return
+        finally:
+            prueba.close()
+        raise OSError(f"Ya hay otro reproductor atendiendo el control remoto en {direccion}")
+
+    def detener(self):
+        if self.loop and self._detenido:
+            self.loop.call_soon_threadsafe(self._detenido.set)
+        if self.hilo:
+            self.hilo.join(timeout=2)
+
+    def publicar(self, estado: dict):
+        """Llamado desde el hilo dueño; avisa a los suscriptores sólo si algo cambió."""
+        firma = tuple((k, str(v)) for k, v in estado.items() if k != "posicion")
+        self.estado = estado
+        self.marca_estado = time.monotonic()
+        if firma != self._firma_estado:
+            self._firma_estado = firma
+            if self.loop and self.suscriptores:
+                mensaje = {"evento": "estado", **estado}
+                self.loop.call_soon_threadsafe(self._difundir, mensaje)
+
+    def _ejecutar(self):
+        import asyncio
+        try:
+            asyncio.run(self._principal())
+        except Exception as e:
+            logger.error("Servidor de control detenido: %s", e)
+
+    async def _principal(self):
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self._detenido = asyncio.Event()
+
+        if self.puerto is None and hasattr(socket, "AF_UNIX"):
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            servidor = await asyncio.start_unix_server(self._atender, path=self.ruta)
+            os.chmod(self.ruta, 0o600)
+            logger.info("Control remoto en %s", self.ruta)
+        else:
+            puerto = self.puerto or self.PUERTO_TCP
+            servidor = await asyncio.start_server(self._atender, "127.0.0.1", puerto)
+            logger.info("Control remoto en 127.0.0.1:%d", puerto)
+
+        async with servidor:
+            await self._detenido.wait()
+            # Cerrar los clientes deja terminar sus tareas antes de apagar el bucle
+            for escritor in list(self.conexiones):
+                escritor.close()
+            if self.conexiones:
+                await asyncio.wait(list(self.conexiones.values()), timeout=1)
+        if self.puerto is None and os.path.exists(self.ruta):
+            os.unlink(self.ruta)
+
+    def _estado_actual(self) -> dict:
+        estado = dict(self.estado)
+        if estado.get("reproduciendo"):
+            estado["posicion"] = round(estado.get("posicion", 0.0) + time.monotonic() - self.marca_estado, 3)
+        return estado
+
+    def _difundir(self, mensaje: dict):
+        linea = (json.dumps(mensaje, ensure_ascii=False) + "\n").encode("utf-8")
+        for escritor in list(self.suscriptores):
+            # Un suscriptor que no lee no debe hacer crecer la memoria
+            if escritor.transport.is_closing() or escritor.transport.get_write_buffer_size() > self.LIMITE_BUFFER:
+                self.suscriptores.discard(escritor)
+                escritor.close()
+            else:
+                escritor.write(linea)
+
+    @staticmethod
+    def _interpretar(linea: str):
+        linea = linea.strip()
+        if linea.startswith("{"):
+            peticion = json.loads(linea)
+            if not isinstance(peticion, dict):
+                raise ValueError("se esperaba un objeto JSON")
+            args = peticion.get("args", [])
+            if not isinstance(args, list):
+                raise ValueError("\"args\" debe ser una lista")
+            return str(peticion.get("cmd", "")), args, peticion.get("id")
+        partes = linea.split(maxsplit=1)
+        if not partes:
+            return "", [], None
+        return partes[0], partes[1:], None
+
+    async def _atender(self, lector, escritor):
+        import asyncio
+        self.conexiones[escritor] = asyncio.current_task()
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                try:
+                    orden, args, ident = self._interpretar(linea.decode("utf-8"))
+                except ValueError as e:
+                    respuesta = {"ok": False, "error": f"Petición inválida: {e}"}
+                else:
+                    respuesta = await self._responder(orden.lower(), args, escritor)
+                    if ident is not None:
+                        respuesta["id"] = ident
+                escritor.write((json.dumps(respuesta, ensure_ascii=False) + "\n").encode("utf-8"))
+                await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.suscriptores.discard(escritor)
+            self.conexiones.pop(escritor, None)
+            escritor.close()
+
+    async def _responder(self, orden: str, args: list, escritor) -> dict:
+        import asyncio
+        if orden == "status":
+            return {"ok": True, "resultado": self._estado_actual()}
+        if orden == "subscribe":
+            self.suscriptores.add(escritor)
+            return {"ok": True, "resultado": self._estado_actual()}
+        if orden == "unsubscribe":
+            self.suscriptores.discard(escritor)
+            return {"ok": True}
+
+        funcion = getattr(self.comandos, orden, None) if not orden.startswith("_") else None
+        if not callable(funcion):
+            return {"ok": False, "error": f"Orden desconocida: {orden}"}
+        try:
+            resultado = await asyncio.wait_for(asyncio.wrap_future(self.despachador.ejecutar(funcion, *args)), 5)
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": "El reproductor no respondió"}
+        except (TypeError, ValueError) as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            logger.exception("Control remoto: fallo en '%s'", orden)
+            return {"ok": False, "error": f"Error interno: {e}"}
+        return {"ok": True, "resultado": resultado}
+
+# ==================== ESPECTROGRAMA ====================
+ESPECTROGRAMA_ANCHO = 800
+ESPECTROGRAMA_ALTO = 150
+ESPECTROGRAMA_RANGO_DB = 60.0
+MODOS_VISUALIZADOR = ("Líneas", "Espectrograma")
+
+def tabla_colores(fondo: str, resaltado: str, texto: str) -> np.ndarray:
+    """Tabla de 256 colores RGB que va del fondo al resaltado y termina en el color del texto."""
+    paradas = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in (fondo, resaltado, texto)],
+                       dtype=float)
+    niveles = np.linspace(0.0, 1.0, 256)
+    return np.stack([np.interp(niveles, (0.0, 0.6, 1.0), paradas[:, canal]) for canal in range(3)],
+                    axis=1).round().astype(np.uint8)
+
+class Espectrograma:
+    """Espectrograma desplazable de ancho x alto sobre un búfer circular de NumPy.
+
+    Cada columna se escribe dos veces, en i y en i + ancho, así la ventana
+    visible es siempre la vista contigua buf[:, i+1:i+1+ancho] sin copiar.
+    Las bandas se agrupan en escala logarítmica con índices calculados una
+    vez y el cuadro se colorea con una tabla de 256 entradas y se entrega a
+    Tk como un único PPM binario.
+    """
+
+    def __init__(self, ancho: int = ESPECTROGRAMA_ANCHO, alto: int = ESPECTROGRAMA_ALTO, bins: int = 1024,
+                 colores: Optional[np.ndarray] = None):
+        self.ancho, self.alto = ancho, alto
+        self.buffer = np.zeros((alto, 2 * ancho), dtype=np.uint8)
+        self.posicion = 0
+        self.tabla = colores if colores is not None else tabla_colores("#000000", "#FF8000", "#FFFFFF")
+        self.cabecera = f"P6 {ancho} {alto} 255\n".encode("ascii")
+        self.bins = bins
+        self.inicios = np.minimum(np.geomspace(1, bins, alto + 1)[:-1].astype(np.intp), bins - 1)
+        # Techo en dB; no baja de 0 (amplitud 1) para que el silencio se vea como fondo
+        self.maximo_db = 0.0
+
+    def agregar(self, fft: np.ndarray) -> None:
+        if len(fft) != self.bins:
+            fft = np.interp(np.linspace(0, len(fft) - 1, self.bins), np.arange(len(fft)), fft)
+        # En graves varias filas comparten bin: reduceat devuelve ese bin tal cual.
+        # Se invierte para que la primera fila de la imagen sea la frecuencia más alta
+        bandas = np.maximum.reduceat(np.abs(fft), self.inicios)[::-1]
+        db = 20.0 * np.log10(bandas + 1e-6)
+        # El techo baja despacio para seguir el volumen sin parpadear
+        self.maximo_db = max(self.maximo_db - 0.05, float(db.max()), 0.0)
+        piso = self.maximo_db - ESPECTROGRAMA_RANGO_DB
+        columna = np.clip((db - piso) * (255.0 / ESPECTROGRAMA_RANGO_DB), 0, 255).astype(np.uint8)
+        self.buffer[:, self.posicion] = columna
+        self.buffer[:, self.posicion + self.ancho] = columna
+        self.posicion = (self.posicion + 1) % self.ancho
+
+    def vista(self) -> np.ndarray:
+        return self.buffer[:, self.posicion:self.posicion + self.ancho]
+
+    def ppm(self) -> bytes:
+        return self.cabecera + self.tabla[self.vista()].tobytes()
+
+    def limpiar(self) -> None:
+        self.buffer.fill(0)
+        self.maximo_db = 0.0
 
 # ==================== INTERFAZ PRINCIPAL ====================
 class ReproductorApp:
     def __init__(self, root: tk.Tk):
         self.root = root
-        self.gestor = GestorListas()
+        self.gestor = GestorListas(abrir_historial())
         self.tema = TEMAS_PREDEFINIDOS["Oscuro"].copy()
         self.mini_player = None
         self.mini_player_visible = False
         self.animacion_activa = True
         self.animacion_alpha = 1.0
+        self.caratulas = GestorCaratulas(root)
+        self.filas_canciones: Dict[str, Cancion] = {}
+        self.filas_por_cancion: Dict[int, str] = {}
+        self._caratulas_programadas = False
+        self._ruta_caratula_mini = None
+        self.letras = CacheLetras()
+        self._cancion_letra: Optional[Cancion] = None
+        self._letra: Optional[Letra] = None
+        self._indice_letra = -1
+        self.despachador = DespachadorComandos()
+        trabajador_audio.oyentes.append(
+            lambda evento, turno, datos: self.despachador.ejecutar(self._al_aviso_audio, evento, turno, datos))
+        self.servidor_control: Optional[ServidorControl] = None
+        # El modo Radio lo necesitará al acabarse la lista; se construye sin bloquear la ventana
+        self.gestor.radio.preparar()
         
         self._configurar_ui()
         self._configurar_eventos()
@@ -363,6 +4731,9 @@ class ReproductorApp:
         self._crear_mini_player()
         self.actualizar_animacion()
         self._actualizar_visualizador()
+        self._atender_caratulas()
+        self._actualizar_letra()
+        self._iniciar_control_remoto()
     
     def _configurar_ui(self):
         self.root.title("Yautja-Music")
@@ -391,6 +4762,11 @@ class ReproductorApp:
         # Visualizador de espectro
         self._configurar_visualizador()
         
+        # Letra sincronizada
+        self.etiqueta_letra = tk.Label(self.marco_principal, text="", bg=self.tema["fondo"],
+                                       fg=self.tema["resaltado"], font=("Arial", 14, "italic"))
+        self.etiqueta_letra.pack(fill=tk.X, pady=(5, 0))
+        
         # Controles
         self._configurar_controles()
         
@@ -403,6 +4779,11 @@ class ReproductorApp:
             self.marco_principal.configure(bg=self.tema["fondo"])
         if hasattr(self, 'etiqueta_titulo'):
             self.etiqueta_titulo.configure(bg=self.tema["fondo"], fg=self.tema["texto"])
+        if hasattr(self, 'etiqueta_letra'):
+            self.etiqueta_letra.configure(bg=self.tema["fondo"], fg=self.tema["resaltado"])
+        if getattr(self, 'espectrograma', None):
+            self.espectrograma.tabla = tabla_colores(self.tema["fondo"], self.tema["resaltado"], self.tema["texto"])
+            self.etiqueta_espectrograma.configure(bg=self.tema["fondo"])
         
         estilo = ttk.Style()
         estilo.configure("Treeview", 
@@ -434,7 +4815,22 @@ class ReproductorApp:
     def _configurar_visualizador(self):
         self.marco_visualizador = tk.Frame(self.marco_principal, bg=self.tema["fondo"], height=150)
         self.marco_visualizador.pack(fill=tk.X, pady=(10, 0))
+        self.var_modo_visual = tk.StringVar(value=MODOS_VISUALIZADOR[0])
+        self.espectrograma: Optional[Espectrograma] = None
+        self.imagen_espectrograma: Optional[tk.PhotoImage] = None
+        self.etiqueta_espectrograma = tk.Label(self.marco_visualizador, bg=self.tema["fondo"], bd=0)
         
+        # La figura se construye cuando la ventana ya está en pantalla
+        self.root.after_idle(self._construir_figura)
+    
+    def _construir_figura(self):
+        if hasattr(self, 'canvas') or self.var_modo_visual.get() != "Líneas":
+            return
+        with registro_arranque.medir("visualizador"):
+            FigureCanvasTkAgg, Figure = cargar_matplotlib()
+            self._crear_figura(FigureCanvasTkAgg, Figure)
+    
+    def _crear_figura(self, FigureCanvasTkAgg, Figure):
         self.fig = Figure(figsize=(8, 2), dpi=100, facecolor=self.tema["fondo"])
         self.ax = self.fig.add_subplot(111)
         self.ax.set_facecolor(self.tema["fondo"])
@@ -446,15 +4842,40 @@ class ReproductorApp:
         self.canvas.draw()
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
     
+    @instrumentado("tk.visualizador")
     def _actualizar_visualizador(self):
-        if hasattr(self, 'canvas') and self.gestor.lista_actual:
+        espectrograma = self.var_modo_visual.get() == "Espectrograma"
+        periodo = 0.033 if espectrograma else 0.05
+        instrumentacion.cuadro("tk.visualizador", periodo)
+        if espectrograma and self.espectrograma and self.gestor.lista_actual:
+            self.espectrograma.agregar(self.gestor.lista_actual.obtener_fft())
+            self.imagen_espectrograma.configure(data=self.espectrograma.ppm(), format="PPM")
+        elif hasattr(self, 'canvas') and self.gestor.lista_actual:
             fft_data = self.gestor.lista_actual.obtener_fft()
             if len(fft_data) > 0:
                 self.line.set_ydata(fft_data)
                 self.ax.set_ylim(0, max(100, np.max(fft_data)*1.1))
                 self.canvas.draw()
         
-        self.root.after(50, self._actualizar_visualizador)
+        self.root.after(int(periodo * 1000), self._actualizar_visualizador)
+    
+    def cambiar_modo_visualizador(self):
+        if self.var_modo_visual.get() == "Espectrograma":
+            if hasattr(self, 'canvas'):
+                self.canvas.get_tk_widget().pack_forget()
+            if self.espectrograma is None:
+                self.espectrograma = Espectrograma(colores=tabla_colores(
+                    self.tema["fondo"], self.tema["resaltado"], self.tema["texto"]))
+                self.imagen_espectrograma = tk.PhotoImage(master=self.root, width=ESPECTROGRAMA_ANCHO,
+                                                          height=ESPECTROGRAMA_ALTO)
+                self.etiqueta_espectrograma.configure(image=self.imagen_espectrograma)
+            self.etiqueta_espectrograma.pack(fill=tk.BOTH, expand=True)
+        else:
+            self.etiqueta_espectrograma.pack_forget()
+            if hasattr(self, 'canvas'):
+                self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            else:
+                self._construir_figura()
     
     def _configurar_panel_listas(self):
         marco = tk.Frame(self.marco_principal, bg=self.tema["botones"], padx=10, pady=10)
@@ -471,32 +4892,48 @@ class ReproductorApp:
                             bg=self.tema["resaltado"], fg=self.tema["texto"], relief=tk.FLAT)
         btn_nueva.pack(side=tk.LEFT, padx=5)
         
+        btn_inteligente = tk.Button(marco, text="Inteligente", command=self.nueva_lista_inteligente,
+                                   bg=self.tema["resaltado"], fg=self.tema["texto"], relief=tk.FLAT)
+        btn_inteligente.pack(side=tk.LEFT, padx=5)
+        
         btn_eliminar = tk.Button(marco, text="Eliminar", command=self.eliminar_lista,
                                 bg=self.tema["resaltado"], fg=self.tema["texto"], relief=tk.FLAT)
         btn_eliminar.pack(side=tk.LEFT, padx=5)
+        
+        self.combo_listas["values"] = self.gestor.obtener_nombres_inteligentes()
+        self.gestor.oyentes_inteligentes.append(self._aplicar_diferencia)
     
     def _configurar_panel_canciones(self):
         marco = tk.Frame(self.marco_principal, bg=self.tema["fondo"])
         marco.pack(fill=tk.BOTH, expand=True)
         
         # Lista de canciones
-        self.lista_canciones = ttk.Treeview(marco, columns=("titulo", "artista", "duracion", "genero"), 
-                                          show="headings", selectmode="browse")
+        self.lista_canciones = ttk.Treeview(marco, columns=("titulo", "artista", "duracion", "genero", "reproducciones"), 
+                                          show="tree headings", selectmode="browse")
         
         # Configurar columnas
-        self.lista_canciones.heading("titulo", text="Título")
-        self.lista_canciones.heading("artista", text="Artista")
-        self.lista_canciones.heading("duracion", text="Duración (min)")
-        self.lista_canciones.heading("genero", text="Género")
+        self.lista_canciones.column("#0", width=cache_imagenes.tamano_para(self.root, "caratula_lista")[0] + 20,
+                                    stretch=False)
+        encabezados = {"titulo": "Título", "artista": "Artista", "duracion": "Duración (min)",
+                       "genero": "Género", "reproducciones": "Reproducciones"}
+        for columna, texto in encabezados.items():
+            self.lista_canciones.heading(columna, text=texto, command=lambda c=columna: self.ordenar_canciones(c))
         
         self.lista_canciones.column("titulo", width=300)
         self.lista_canciones.column("artista", width=250)
         self.lista_canciones.column("duracion", width=120)
         self.lista_canciones.column("genero", width=180)
+        self.lista_canciones.column("reproducciones", width=110, anchor=tk.E)
+        self.gestor.biblioteca.oyentes.append(self._al_cambiar_cancion)
         
         # Scrollbar
         scroll = ttk.Scrollbar(marco, orient="vertical", command=self.lista_canciones.yview)
-        self.lista_canciones.configure(yscrollcommand=scroll.set)
+        
+        def al_desplazar(inicio, fin):
+            scroll.set(inicio, fin)
+            self._programar_caratulas_visibles()
+        
+        self.lista_canciones.configure(yscrollcommand=al_desplazar)
         
         self.lista_canciones.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scroll.pack(side=tk.RIGHT, fill=tk.Y)
@@ -531,6 +4968,11 @@ class ReproductorApp:
                                     relief=tk.FLAT, font=("Arial", 10))
         self.btn_repetir.pack(side=tk.LEFT, padx=10)
         
+        self.var_recorte = tk.BooleanVar(value=False)
+        tk.Checkbutton(marco, text="Sin silencios", variable=self.var_recorte, command=self.cambiar_recorte,
+                       bg=self.tema["botones"], fg=self.tema["texto"], selectcolor=self.tema["fondo"],
+                       activebackground=self.tema["botones"]).pack(side=tk.LEFT, padx=5)
+        
         # Controles de reproducción
         btn_anterior = tk.Button(marco, text="⏮", command=self.cancion_anterior,
                                 bg=self.tema["botones"], fg=self.tema["texto"], 
@@ -555,6 +4997,13 @@ class ReproductorApp:
                                      command=self.ajustar_volumen, length=200)
         self.barra_volumen.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
         
+        # Velocidad de reproducción (mantiene el tono)
+        self.combo_velocidad = ttk.Combobox(marco, state="readonly", width=6,
+                                            values=["0.5x", "0.75x", "1x", "1.25x", "1.5x", "2x"])
+        self.combo_velocidad.set("1x")
+        self.combo_velocidad.bind("<<ComboboxSelected>>", self.cambiar_velocidad)
+        self.combo_velocidad.pack(side=tk.LEFT, padx=5)
+        
         # Botón mini player
         btn_mini = tk.Button(marco, text="🗖", command=self.toggle_mini_player,
                            bg=self.tema["botones"], fg=self.tema["texto"], 
@@ -573,6 +5022,26 @@ class ReproductorApp:
     def _configurar_menu(self):
         barra_menu = tk.Menu(self.root)
         
+        # Menú Archivo
+        menu_archivo = tk.Menu(barra_menu, tearoff=0)
+        menu_archivo.add_command(label="Importar lista...", command=self.importar_lista)
+        menu_archivo.add_command(label="Exportar lista...", command=self.exportar_lista)
+        menu_archivo.add_separator()
+        menu_archivo.add_command(label="Buscar duplicados...", command=self.buscar_duplicados)
+        barra_menu.add_cascade(label="Archivo", menu=menu_archivo)
+        
+        # Menú Editar
+        menu_editar = tk.Menu(barra_menu, tearoff=0)
+        menu_editar.add_command(label="Deshacer", accelerator="Ctrl+Z", command=self.deshacer)
+        menu_editar.add_command(label="Rehacer", accelerator="Ctrl+Y", command=self.rehacer)
+        barra_menu.add_cascade(label="Editar", menu=menu_editar)
+        
+        # Menú Zonas
+        menu_zonas = tk.Menu(barra_menu, tearoff=0)
+        menu_zonas.add_command(label="Nueva zona...", command=self.nueva_zona)
+        menu_zonas.add_command(label="Detener todas las zonas", command=self.detener_zonas)
+        barra_menu.add_cascade(label="Zonas", menu=menu_zonas)
+        
         # Menú Apariencia
         menu_apariencia = tk.Menu(barra_menu, tearoff=0)
         menu_apariencia.add_command(label="Cambiar color de fondo...", command=self.cambiar_color_fondo)
@@ -593,6 +5062,17 @@ class ReproductorApp:
         menu_visual = tk.Menu(barra_menu, tearoff=0)
         menu_visual.add_command(label="Mostrar/Ocultar visualizador", command=self.toggle_visualizador)
         menu_visual.add_command(label="Activar/Desactivar animaciones", command=self.toggle_animaciones)
+        menu_visual.add_separator()
+        for modo in MODOS_VISUALIZADOR:
+            menu_visual.add_radiobutton(label=modo, variable=self.var_modo_visual, value=modo,
+                                        command=self.cambiar_modo_visualizador)
+        menu_visual.add_separator()
+        menu_visual.add_command(label="Mostrar/Ocultar rendimiento", command=self.toggle_rendimiento)
+        menu_visual.add_command(label="Reiniciar mediciones", command=instrumentacion.reiniciar)
+        menu_visual.add_command(label="Exportar mediciones (JSON)...",
+                                command=lambda: self.exportar_mediciones("json"))
+        menu_visual.add_command(label="Exportar traza (Chrome)...",
+                                command=lambda: self.exportar_mediciones("chrome"))
         barra_menu.add_cascade(label="Visualización", menu=menu_visual)
         
         # Menú Ayuda
@@ -605,6 +5085,9 @@ class ReproductorApp:
     def _configurar_eventos(self):
         self.lista_canciones.bind("<Double-1>", self.seleccionar_cancion)
         self.root.bind("<space>", lambda e: self.toggle_reproduccion())
+        self.root.bind("<Control-z>", lambda e: self.deshacer())
+        self.root.bind("<Control-y>", lambda e: self.rehacer())
+        self.root.bind("<Control-Z>", lambda e: self.rehacer())
         self.root.protocol("WM_DELETE_WINDOW", self.al_cerrar)
     
     def toggle_visualizador(self):
@@ -613,11 +5096,48 @@ class ReproductorApp:
         else:
             self.marco_visualizador.pack(fill=tk.X, pady=(10, 0))
     
+    def toggle_rendimiento(self):
+        if getattr(self, "panel_rendimiento", None) and self.panel_rendimiento.winfo_ismapped():
+            self.panel_rendimiento.place_forget()
+            return
+        if not getattr(self, "panel_rendimiento", None):
+            self.panel_rendimiento = tk.Label(self.root, justify=tk.LEFT, anchor="nw", font=("Courier", 9),
+                                              bg="#000000", fg="#7CFC00", padx=6, pady=4)
+        instrumentacion.activar()
+        self.panel_rendimiento.place(relx=1.0, x=-10, y=10, anchor="ne")
+        self.panel_rendimiento.lift()
+        self._refrescar_rendimiento()
+    
+    def _refrescar_rendimiento(self):
+        if not self.panel_rendimiento.winfo_ismapped():
+            return
+        self.panel_rendimiento.config(text=instrumentacion.texto() or "Sin mediciones todavía")
+        self.root.after(500, self._refrescar_rendimiento)
+    
+    def exportar_mediciones(self, formato: str):
+        if not instrumentacion.activa and not instrumentacion.histogramas:
+            messagebox.showinfo("Rendimiento", "Activa primero el panel de rendimiento para tomar mediciones")
+            return
+        sufijo = ".trace.json" if formato == "chrome" else ".json"
+        archivo = filedialog.asksaveasfilename(title="Exportar mediciones", initialfile=f"yautja{sufijo}",
+                                               defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if archivo:
+            try:
+                if formato == "chrome":
+                    instrumentacion.exportar_chrome(archivo)
+                else:
+                    instrumentacion.exportar_json(archivo)
+            except OSError as e:
+                messagebox.showerror("Error", f"No se pudo exportar: {e}")
+                return
+            self.var_estado.set(f"Mediciones exportadas a {archivo}")
+    
     def toggle_animaciones(self):
         self.animacion_activa = not self.animacion_activa
         if self.animacion_activa:
             self.animacion_alpha = 1.0
     
+    @instrumentado("tk.animacion")
     def actualizar_animacion(self):
         if self.animacion_activa and self.gestor.lista_actual and self.gestor.lista_actual.reproduciendo:
             self.animacion_alpha = 0.5 + (math.sin(time.time() * 5) + 1) / 4
@@ -655,7 +5175,7 @@ class ReproductorApp:
     def _crear_mini_player(self):
         self.mini_player = tk.Toplevel(self.root)
         self.mini_player.title("Yautja-Music Mini")
-        self.mini_player.geometry("400x100+{}+{}".format(
+        self.mini_player.geometry("400x120+{}+{}".format(
             self.root.winfo_x() + 50,
             self.root.winfo_y() + 50
         ))
@@ -684,12 +5204,20 @@ class ReproductorApp:
         marco_contenido = tk.Frame(self.mini_player, bg=self.tema["fondo"])
         marco_contenido.pack(fill=tk.BOTH, expand=True)
         
+        # Carátula
+        self.mini_caratula = tk.Label(marco_contenido, bg=self.tema["fondo"])
+        self.mini_caratula.pack(side=tk.LEFT, padx=(5, 0))
+        
         # Info de la canción
         self.mini_info = tk.Label(marco_contenido, text="No hay canción reproduciéndose",
                                  bg=self.tema["fondo"], fg=self.tema["texto"],
                                  font=("Arial", 10))
         self.mini_info.pack(pady=5)
         
+        self.mini_letra = tk.Label(marco_contenido, text="", bg=self.tema["fondo"], fg=self.tema["texto"],
+                                   font=("Arial", 9, "italic"), wraplength=300)
+        self.mini_letra.pack()
+        
         # Controles
         marco_controles = tk.Frame(marco_contenido, bg=self.tema["fondo"])
         marco_controles.pack(pady=5)
@@ -735,12 +5263,121 @@ class ReproductorApp:
                 cancion = self.gestor.lista_actual.actual.cancion
                 self.mini_info.config(text=f"{cancion.titulo} - {cancion.artista}")
                 self.mini_btn_play.config(text="⏸" if self.gestor.lista_actual.reproduciendo else "▶")
+                self._mostrar_caratula_mini(cancion.ruta_archivo)
             else:
                 self.mini_info.config(text="No hay canción reproduciéndose")
                 self.mini_btn_play.config(text="▶")
+                self._mostrar_caratula_mini(None)
             
             self.root.after(1000, self._actualizar_mini_player)
     
+    def _mostrar_caratula_mini(self, ruta_archivo: Optional[str]):
+        # Sólo se pide la carátula cuando cambia la canción
+        if ruta_archivo == self._ruta_caratula_mini:
+            return
+        self._ruta_caratula_mini = ruta_archivo
+        self.mini_caratula.config(image="")
+        if ruta_archivo:
+            def al_cargar(imagen, ruta=ruta_archivo):
+                if ruta == self._ruta_caratula_mini and self.mini_caratula.winfo_exists():
+                    self.mini_caratula.config(image=imagen)
+            self.caratulas.solicitar(ruta_archivo, "caratula_mini", al_cargar)
+    
+    @instrumentado("tk.letra")
+    def _actualizar_letra(self):
+        lista = self.gestor.lista_actual
+        cancion = lista.actual.cancion if lista and lista.actual else None
+        if cancion is not self._cancion_letra:
+            # Sólo al cambiar de canción se busca el .lrc; la caché evita volver a interpretarlo
+            self._cancion_letra = cancion
+            self._letra = self.letras.obtener(cancion.ruta_archivo) if cancion else None
+            self._indice_letra = None
+        
+        indice = self._letra.indice_en(lista.obtener_posicion()) if self._letra else -1
+        if indice != self._indice_letra:
+            self._indice_letra = indice
+            texto = self._letra.lineas[indice] if indice >= 0 else ""
+            self.etiqueta_letra.config(text=texto)
+            if hasattr(self, 'mini_letra'):
+                self.mini_letra.config(text=texto)
+        self.root.after(100, self._actualizar_letra)
+    
+    def _atender_caratulas(self):
+        self.caratulas.procesar_resultados()
+        self.root.after(100, self._atender_caratulas)
+    
+    def _programar_caratulas_visibles(self):
+        # Agrupa los eventos de desplazamiento en una sola actualización
+        if not self._caratulas_programadas:
+            self._caratulas_programadas = True
+            self.root.after(80, self._actualizar_caratulas_visibles)
+    
+    def _actualizar_caratulas_visibles(self):
+        self._caratulas_programadas = False
+        fila = self.lista_canciones.identify_row(5)
+        alto = self.lista_canciones.winfo_height()
+        while fila:
+            caja = self.lista_canciones.bbox(fila)
+            if not caja or caja[1] > alto:
+                break
+            cancion = self.filas_canciones.get(fila)
+            if cancion:
+                def al_cargar(imagen, fila=fila):
+                    if self.lista_canciones.exists(fila):
+                        self.lista_canciones.item(fila, image=imagen)
+                self.caratulas.solicitar(cancion.ruta_archivo, "caratula_lista", al_cargar)
+            fila = self.lista_canciones.next(fila)
+    
+    def _iniciar_control_remoto(self):
+        if os.environ.get("YAUTJA_CONTROL", "1") != "0":
+            self.servidor_control = ServidorControl(ComandosReproductor(self.gestor), self.despachador)
+            try:
+                self.servidor_control.iniciar()
+            except OSError as e:
+                logger.warning("Control remoto desactivado: %s", e)
+                self.servidor_control = None
+        self._atender_control()
+    
+    def _atender_control(self):
+        # Las órdenes remotas se ejecutan aquí, en el hilo de Tk
+        if self.despachador.procesar_pendientes():
+            self._refrescar_reproduccion()
+        if self.servidor_control:
+            self.servidor_control.publicar(estado_reproduccion(self.gestor))
+        self.root.after(50, self._atender_control)
+    
+    def _al_aviso_audio(self, evento: str, turno: int, datos=None):
+        lista = self.gestor.lista_principal()
+        if not lista:
+            return
+        mensaje = lista.al_aviso_audio(evento, turno, datos)
+        if mensaje:
+            messagebox.showerror("Error", mensaje)
+        elif evento == "fin":
+            self._mostrar_cambio_cancion(lista)
+    
+    def _refrescar_reproduccion(self):
+        lista = self.gestor.lista_actual
+        nombre = self.gestor.nombre_de(lista)
+        if nombre and nombre != self.combo_listas.get():
+            self.combo_listas.set(nombre)
+            self.actualizar_canciones()
+        
+        texto = "⏸" if lista and lista.reproduciendo else "▶"
+        self.btn_play.config(text=texto)
+        if hasattr(self, 'mini_btn_play'):
+            self.mini_btn_play.config(text=texto)
+        if lista:
+            self.btn_repetir.config(text=f"Repetir: {lista.modo_repeticion}")
+            self.barra_volumen.set(lista.volumen * 100)
+            self.combo_velocidad.set(f"{lista.velocidad:g}x")
+            self.var_recorte.set(lista.recortar_silencios)
+            if lista.actual and lista.reproduciendo:
+                cancion = lista.actual.cancion
+                self.var_estado.set(f"Reproduciendo: {cancion.titulo} - {cancion.artista}")
+                if hasattr(self, 'mini_info'):
+                    self.mini_info.config(text=f"{cancion.titulo} - {cancion.artista}")
+    
     def cambiar_color_fondo(self):
         color = colorchooser.askcolor(title="Elige color de fondo", initialcolor=self.tema["fondo"])[1]
         if color:
@@ -775,25 +5412,102 @@ class ReproductorApp:
         if lista_seleccionada:
             self.gestor.seleccionar_lista(lista_seleccionada)
             self.actualizar_canciones()
+            if self.gestor.lista_actual:
+                self.var_recorte.set(self.gestor.lista_actual.recortar_silencios)
             self.var_estado.set(f"Lista activa: {lista_seleccionada}")
     
     def actualizar_listas(self):
-        listas = self.gestor.obtener_nombres_listas()
+        listas = self.gestor.obtener_nombres_listas() + self.gestor.obtener_nombres_inteligentes()
         self.combo_listas["values"] = listas
         if listas:
             self.combo_listas.current(0)
             self.cambiar_lista()
     
+    @instrumentado("tk.actualizar_canciones")
     def actualizar_canciones(self):
         self.lista_canciones.delete(*self.lista_canciones.get_children())
+        self.filas_canciones.clear()
+        self.filas_por_cancion.clear()
         if self.gestor.lista_actual:
-            for cancion in self.gestor.lista_actual.obtener_canciones():
-                self.lista_canciones.insert("", "end", values=(
-                    cancion.titulo, 
-                    cancion.artista, 
-                    f"{cancion.duracion:.2f}",
-                    cancion.genero
-                ))
+            for cancion in self.gestor.lista_actual.iterar_canciones():
+                self._insertar_fila(cancion)
+        self._programar_caratulas_visibles()
+    
+    @staticmethod
+    def _valores_fila(cancion: Cancion) -> tuple:
+        return (
+            cancion.titulo, 
+            cancion.artista, 
+            f"{cancion.duracion:.2f}",
+            cancion.genero,
+            cancion.reproducciones
+        )
+    
+    def _insertar_fila(self, cancion: Cancion, posicion="end"):
+        fila = self.lista_canciones.insert("", posicion, values=self._valores_fila(cancion))
+        self.filas_canciones[fila] = cancion
+        self.filas_por_cancion[id(cancion)] = fila
+    
+    def _al_cambiar_cancion(self, cancion: Cancion, presente: bool):
+        fila = self.filas_por_cancion.get(id(cancion))
+        if presente and fila and self.lista_canciones.exists(fila):
+            self.lista_canciones.item(fila, values=self._valores_fila(cancion))
+    
+    def ordenar_canciones(self, columna: str):
+        # Ordena sólo la vista; el orden de reproducción de la lista no cambia
+        descendente = getattr(self, "_orden_vista", None) == (columna, False)
+        self._orden_vista = (columna, descendente)
+        
+        historial = self.gestor.historial
+        if columna == "reproducciones" and historial:
+            clave = historial.reproducciones
+        elif columna in CAMPOS_TEXTO:
+            clave = lambda c: getattr(c, columna).lower()
+        else:
+            clave = lambda c: getattr(c, columna)
+        
+        filas = sorted(self.lista_canciones.get_children(),
+                       key=lambda fila: clave(self.filas_canciones[fila]), reverse=descendente)
+        for posicion, fila in enumerate(filas):
+            self.lista_canciones.move(fila, "", posicion)
+        self._programar_caratulas_visibles()
+    
+    def _aplicar_diferencia(self, inteligente, agregadas, retiradas):
+        # Una lista inteligente visible se actualiza fila a fila, sin redibujarla entera
+        if self.gestor.lista_actual is not inteligente.lista:
+            return
+        for cancion in retiradas:
+            fila = self.filas_por_cancion.pop(id(cancion), None)
+            if fila and self.lista_canciones.exists(fila):
+                self.lista_canciones.delete(fila)
+                self.filas_canciones.pop(fila, None)
+        for cancion, posicion in agregadas:
+            self._insertar_fila(cancion, posicion)
+        self._programar_caratulas_visibles()
+    
+    def nueva_lista_inteligente(self):
+        nombre = simpledialog.askstring("Nueva Lista Inteligente", "Nombre de la lista:")
+        if not nombre:
+            return
+        texto = simpledialog.askstring(
+            "Reglas",
+            "Condiciones unidas con 'y' (campos: titulo, artista, genero, duracion, reproducciones)\n"
+            "Ejemplo: genero = Rock y duracion < 5"
+        )
+        if texto is None:
+            return
+        try:
+            reglas = interpretar_reglas(texto)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if self.gestor.crear_lista_inteligente(nombre, reglas):
+            self.actualizar_listas()
+            self.combo_listas.set(PREFIJO_INTELIGENTE + nombre)
+            self.cambiar_lista()
+            self.var_estado.set(f"Lista inteligente '{nombre}' creada")
+        else:
+            messagebox.showerror("Error", "Ya existe una lista inteligente con ese nombre")
     
     def nueva_lista(self):
         nombre = simpledialog.askstring("Nueva Lista", "Nombre de la lista:")
@@ -804,6 +5518,29 @@ class ReproductorApp:
             else:
                 messagebox.showerror("Error", "Ya existe una lista con ese nombre")
     
+    def nueva_zona(self):
+        nombre = simpledialog.askstring("Nueva zona", "Nombre de la zona:")
+        if not nombre:
+            return
+        panoramica = simpledialog.askfloat("Nueva zona", "Altavoces (-1 izquierdo, 0 ambos, 1 derecho):",
+                                           initialvalue=0.0, minvalue=-1.0, maxvalue=1.0)
+        if panoramica is None:
+            return
+        if self.gestor.crear_zona(nombre, panoramica):
+            self.combo_listas["values"] = (self.gestor.obtener_nombres_listas()
+                                           + self.gestor.obtener_nombres_inteligentes())
+            self.combo_listas.set(nombre)
+            self.cambiar_lista()
+            self.var_estado.set(f"Zona '{nombre}' creada: suena a la vez que las demás listas")
+        else:
+            messagebox.showerror("Error", "Ya existe una lista con ese nombre")
+    
+    def detener_zonas(self):
+        for lista in self.gestor.zonas().values():
+            lista.detener()
+        self._refrescar_reproduccion()
+        self.var_estado.set("Zonas detenidas")
+    
     def eliminar_lista(self):
         lista = self.combo_listas.get()
         if lista and messagebox.askyesno("Confirmar", f"¿Eliminar lista '{lista}'?"):
@@ -811,10 +5548,95 @@ class ReproductorApp:
                 self.actualizar_listas()
                 self.var_estado.set(f"Lista '{lista}' eliminada")
     
+    def importar_lista(self):
+        archivo = filedialog.askopenfilename(
+            title="Importar lista",
+            filetypes=[("Listas de reproducción", "*.m3u *.m3u8 *.pls *.xspf"), ("Todos los archivos", "*.*")]
+        )
+        if archivo:
+            try:
+                nombre = self.gestor.importar_lista(archivo)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"No se pudo importar la lista: {e}")
+                return
+            self.combo_listas["values"] = self.gestor.obtener_nombres_listas()
+            self.combo_listas.set(nombre)
+            self.cambiar_lista()
+            self.var_estado.set(f"Lista '{nombre}' importada")
+    
+    def exportar_lista(self):
+        nombre = self.combo_listas.get()
+        if not nombre:
+            messagebox.showwarning("Advertencia", "Selecciona una lista primero")
+            return
+        
+        archivo = filedialog.asksaveasfilename(
+            title="Exportar lista",
+            initialfile=f"{nombre}.m3u8",
+            defaultextension=".m3u8",
+            filetypes=[("M3U8", "*.m3u8"), ("M3U", "*.m3u"), ("PLS", "*.pls"), ("XSPF", "*.xspf")]
+        )
+        if archivo:
+            try:
+                total = self.gestor.exportar_lista(nombre, archivo)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"No se pudo exportar la lista: {e}")
+                return
+            self.var_estado.set(f"Lista '{nombre}' exportada ({total} canciones)")
+    
+    def buscar_duplicados(self):
+        rutas = self.gestor.rutas_en_listas()
+        if not rutas:
+            messagebox.showinfo("Duplicados", "No hay canciones en las listas")
+            return
+        comparar_audio = messagebox.askyesno(
+            "Duplicados", "¿Comparar también el audio para encontrar recodificaciones? (más lento)")
+        resultado = {}
+        
+        def buscar():
+            try:
+                resultado["informe"] = buscar_duplicados(rutas, comparar_audio)
+            except Exception as e:
+                resultado["error"] = e
+        
+        hilo = threading.Thread(target=buscar, daemon=True)
+        hilo.start()
+        self.var_estado.set(f"Buscando duplicados en {len(rutas)} archivos...")
+        
+        def esperar():
+            if hilo.is_alive():
+                self.root.after(200, esperar)
+            elif "error" in resultado:
+                messagebox.showerror("Error", f"No se pudieron buscar duplicados: {resultado['error']}")
+            else:
+                self._mostrar_duplicados(resultado["informe"])
+        self.root.after(200, esperar)
+    
+    def _mostrar_duplicados(self, informe):
+        cambios = self.gestor.fusionar_duplicados(informe, aplicar=False)
+        if not cambios:
+            self.var_estado.set(f"Sin duplicados en {informe.revisados} archivos")
+            messagebox.showinfo("Duplicados", "No se encontraron duplicados")
+            return
+        eliminadas = sum(cambio["accion"] == "eliminada" for cambio in cambios)
+        detalle = "\n".join(f"{c['lista']}: {c['titulo']} ({c['accion']})" for c in cambios[:15])
+        if len(cambios) > 15:
+            detalle += f"\n... y {len(cambios) - 15} más"
+        if messagebox.askyesno("Duplicados",
+                               f"{informe.resumen().splitlines()[0]}\n\n{detalle}\n\n"
+                               f"¿Fusionar? Se quitarán {eliminadas} entradas repetidas y el resto "
+                               f"apuntará a la copia conservada."):
+            self.gestor.fusionar_duplicados(informe)
+            self.actualizar_canciones()
+            self.var_estado.set(f"Duplicados fusionados: {len(cambios)} cambios")
+    
     def agregar_cancion(self):
         if not self.gestor.lista_actual:
             messagebox.showwarning("Advertencia", "Selecciona una lista primero")
             return
+        if self.gestor.es_inteligente(self.gestor.lista_actual):
+            messagebox.showwarning("Advertencia", "Las listas inteligentes se llenan solas según sus reglas")
+            return
         
         archivo = filedialog.askopenfilename(
             title="Seleccionar canción",
@@ -822,6 +5644,12 @@ class ReproductorApp:
         )
         
         if archivo:
+            repetida = any(os.path.samefile(cancion.ruta_archivo, archivo)
+                           for cancion in self.gestor.lista_actual.iterar_canciones()
+                           if os.path.exists(cancion.ruta_archivo))
+            if repetida and not messagebox.askyesno("Canción repetida",
+                                                    "Ese archivo ya está en la lista. ¿Añadirlo otra vez?"):
+                return
             ventana_meta = tk.Toplevel(self.root)
             ventana_meta.title("Información de la canción")
             ventana_meta.configure(bg=self.tema["fondo"])
@@ -970,7 +5798,7 @@ class ReproductorApp:
                 messagebox.showerror("Error", "El título no puede estar vacío")
                 return
             
-            cancion.editar(nuevo_titulo, nuevo_artista, nueva_duracion, nuevo_genero)
+            self.gestor.editar_cancion(cancion, nuevo_titulo, nuevo_artista, nueva_duracion, nuevo_genero)
             self.actualizar_canciones()
             self.var_estado.set(f"Canción '{nuevo_titulo}' actualizada")
             ventana.destroy()
@@ -985,12 +5813,52 @@ class ReproductorApp:
         if not seleccion:
             return
         
+        if self.gestor.es_inteligente(self.gestor.lista_actual):
+            messagebox.showwarning("Advertencia", "Las listas inteligentes se llenan solas según sus reglas")
+            return
+        
         titulo = self.lista_canciones.item(seleccion[0])["values"][0]
         if messagebox.askyesno("Confirmar", f"¿Eliminar la canción '{titulo}'?"):
             if self.gestor.lista_actual.eliminar_cancion(titulo):
                 self.actualizar_canciones()
                 self.var_estado.set(f"Canción '{titulo}' eliminada")
     
+    def deshacer(self):
+        try:
+            descripcion = self.gestor.diario.deshacer()
+        except ValueError as e:
+            logger.warning("%s", e)
+            self.var_estado.set(str(e))
+            return
+        if descripcion is None:
+            self.var_estado.set("No hay nada que deshacer")
+            return
+        self._refrescar_tras_deshacer()
+        self.var_estado.set(f"Deshecho: {descripcion}")
+    
+    def rehacer(self):
+        descripcion = self.gestor.diario.rehacer()
+        if descripcion is None:
+            self.var_estado.set("No hay nada que rehacer")
+            return
+        self._refrescar_tras_deshacer()
+        self.var_estado.set(f"Rehecho: {descripcion}")
+    
+    def _refrescar_tras_deshacer(self):
+        # Conserva la lista elegida si sigue existiendo
+        nombre = self.gestor.nombre_de(self.gestor.lista_actual)
+        listas = self.gestor.obtener_nombres_listas() + self.gestor.obtener_nombres_inteligentes()
+        self.combo_listas["values"] = listas
+        if nombre:
+            self.combo_listas.set(nombre)
+            self.actualizar_canciones()
+        elif listas:
+            self.combo_listas.current(0)
+            self.cambiar_lista()
+        else:
+            self.combo_listas.set("")
+            self.actualizar_canciones()
+    
     def toggle_reproduccion(self):
         if not self.gestor.lista_actual:
             return
@@ -1074,54 +5942,746 @@ class ReproductorApp:
     
     def ajustar_volumen(self, valor):
         if self.gestor.lista_actual:
-            volumen = float(valor) / 100
-            self.gestor.lista_actual.volumen = volumen
-            if mixer.get_init():
-                mixer.music.set_volume(volumen)
+            self.gestor.lista_actual.ajustar_volumen(float(valor) / 100)
+    
+    def cambiar_recorte(self):
+        if not self.gestor.lista_actual:
+            self.var_recorte.set(False)
+            return
+        self.gestor.lista_actual.activar_recorte(self.var_recorte.get())
+        estado = "activado" if self.var_recorte.get() else "desactivado"
+        self.var_estado.set(f"Recorte de silencios {estado} en esta lista")
+    
+    def cambiar_velocidad(self, event=None):
+        if self.gestor.lista_actual:
+            velocidad = self.gestor.lista_actual.cambiar_velocidad(float(self.combo_velocidad.get().rstrip("x")))
+            self.var_estado.set(f"Velocidad: {velocidad:g}x")
     
+    @instrumentado("tk.verificar_eventos")
     def verificar_eventos(self):
-        for event in pygame.event.get():
-            if event.type == pygame.USEREVENT:
-                if self.gestor.lista_actual:
-                    self.gestor.lista_actual.manejar_fin()
-                    
-                    if self.gestor.lista_actual.actual:
-                        cancion = self.gestor.lista_actual.actual.cancion
-                        self.var_estado.set(f"Reproduciendo: {cancion.titulo} - {cancion.artista}")
-                        if hasattr(self, 'mini_info'):
-                            self.mini_info.config(text=f"{cancion.titulo} - {cancion.artista}")
+        # Un sondeo retrasado retrasa también la detección del fin de pista
+        instrumentacion.cuadro("tk.verificar_eventos", 0.1)
+        if not pygame.display.get_init():
+            self.root.after(100, self.verificar_eventos)
+            return
+        
+        # El fin de pista llega como aviso del hilo de audio; aquí sólo queda el recorte de silencios
+        pygame.event.clear()
+        principal = self.gestor.lista_principal()
+        if principal and principal.alcanzo_silencio_final():
+            principal.manejar_fin()
+            self._mostrar_cambio_cancion(principal)
+        lista = self.gestor.lista_actual
+        if lista in self.gestor.atender_zonas():
+            self._mostrar_cambio_cancion(lista)
         
         self.root.after(100, self.verificar_eventos)
     
+    def _mostrar_cambio_cancion(self, lista: ListaReproduccion):
+        if lista.actual:
+            cancion = lista.actual.cancion
+            if (lista is self.gestor.lista_actual and lista.modo_repeticion == "Radio"
+                    and id(cancion) not in self.filas_por_cancion):
+                # La añadió el modo Radio al acabarse la lista
+                self._insertar_fila(cancion)
+            self.var_estado.set(f"Reproduciendo: {cancion.titulo} - {cancion.artista}")
+            if hasattr(self, 'mini_info'):
+                self.mini_info.config(text=f"{cancion.titulo} - {cancion.artista}")
+    
     def mostrar_acerca_de(self):
         messagebox.showinfo("Acerca de", "Yautja-Music\nVersión 2.0\n\nDesarrollado por:\n\nMarlon Celis\n\nTodos los derechos reservados\n\nDedicado a mi mami y mi novia")
     def al_cerrar(self):
         if self.gestor.lista_actual:
             self.gestor.lista_actual.detener()
             self.gestor.lista_actual.spectrum_running = False
-        mixer.quit()
+        self.caratulas.cerrar()
+        cache_silencios.cerrar()
+        self.gestor.diario.guardar()
+        if self.gestor.historial:
+            self.gestor.historial.cerrar()
+        if self.servidor_control:
+            self.servidor_control.detener()
+        trabajador_audio.cerrar()
+        self.gestor.cerrar_zonas()
+        if mixer.get_init():
+            mixer.quit()
         if self.mini_player and self.mini_player.winfo_exists():
             self.mini_player.destroy()
         self.root.destroy()
 
+# ==================== MODO SIN VENTANA ====================
+EXTENSIONES_AUDIO = (".mp3", ".wav", ".ogg", ".flac", ".opus")
+
+def cancion_desde_archivo(ruta_archivo: str) -> Cancion:
+    # Mismos valores por defecto que el diálogo de "Agregar Canción"
+    titulo = os.path.basename(ruta_archivo).split('.')[0]
+    return Cancion(titulo, "Desconocido", 0.0, ruta_archivo, "No especificado")
+
+def buscar_canciones(rutas: List[str]) -> Iterator[Cancion]:
+    """Canciones de archivos sueltos, carpetas (recursivas) y listas M3U/PLS/XSPF, en orden."""
+    for ruta in rutas:
+        if os.path.isfile(ruta) and ruta.lower().endswith(FORMATOS_LISTA):
+            yield from leer_lista_reproduccion(ruta)
+        else:
+            for ruta_archivo in buscar_archivos_audio([ruta]):
+                yield cancion_desde_archivo(ruta_archivo)
+
+def buscar_archivos_audio(rutas: List[str]):
+    """Recorre archivos y carpetas en orden y devuelve las rutas de audio encontradas."""
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for carpeta, subcarpetas, archivos in os.walk(ruta):
+                subcarpetas.sort()
+                for nombre in sorted(archivos):
+                    if nombre.lower().endswith(EXTENSIONES_AUDIO):
+                        yield os.path.join(carpeta, nombre)
+        elif os.path.isfile(ruta):
+            yield ruta
+        else:
+            logger.warning("No existe: %s", ruta)
+
+class ReproductorSinVentana:
+    """Bucle de reproducción sin Tk, controlado por señales y por el socket de control.
+
+    SIGUSR1 alterna pausa, SIGUSR2 pasa a la siguiente canción y SIGINT/SIGTERM
+    terminan. Los manejadores de señal sólo apuntan la orden en un deque, sin
+    candados: corren en este mismo hilo y podrían interrumpirlo mientras tiene
+    tomado el de la cola del despachador. El bucle las ejecuta en cada vuelta.
+    """
+
+    def __init__(self, gestor: GestorListas, servidor: Optional[ServidorControl],
+                 despachador: DespachadorComandos, salir_al_terminar: bool = False):
+        self.gestor = gestor
+        self.servidor = servidor
+        self.despachador = despachador
+        self.comandos = ComandosReproductor(gestor)
+        self.salir_al_terminar = salir_al_terminar
+        self.activo = True
+        self._ultima_cancion = None
+        from collections import deque
+        self.senales = deque()
+        trabajador_audio.oyentes.append(
+            lambda evento, turno, datos: self.despachador.ejecutar(self._al_aviso_audio, evento, turno, datos))
+
+    def _al_aviso_audio(self, evento: str, turno: int, datos=None):
+        # El error ya lo registró el hilo de audio
+        lista = self.gestor.lista_principal()
+        if lista:
+            lista.al_aviso_audio(evento, turno, datos)
+
+    def _instalar_senales(self):
+        import signal
+        signal.signal(signal.SIGINT, lambda *_: self.detener())
+        signal.signal(signal.SIGTERM, lambda *_: self.detener())
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda *_: self.senales.append(self.comandos.toggle))
+            signal.signal(signal.SIGUSR2, lambda *_: self.senales.append(self.comandos.next))
+
+    def detener(self):
+        self.activo = False
+
+    def _atender_senales(self):
+        while self.senales:
+            orden = self.senales.popleft()
+            try:
+                orden()
+            except Exception as e:
+                logger.warning("Señal: %s", e)
+
+    def _anunciar_cancion(self):
+        lista = self.gestor.lista_principal() or self.gestor.lista_actual
+        cancion = lista.actual.cancion if lista and lista.actual else None
+        if cancion is not self._ultima_cancion and lista and lista.reproduciendo:
+            logger.info("Reproduciendo: %s - %s", cancion.titulo, cancion.artista)
+        self._ultima_cancion = cancion
+
+    def ejecutar(self):
+        self._instalar_senales()
+        try:
+            while self.activo:
+                self._atender_senales()
+                self.despachador.procesar_pendientes()
+                pygame.event.clear()
+                principal = self.gestor.lista_principal()
+                if principal and principal.alcanzo_silencio_final():
+                    principal.manejar_fin()
+                self.gestor.atender_zonas()
+                self._anunciar_cancion()
+                if self.servidor:
+                    self.servidor.publicar(estado_reproduccion(self.gestor))
+
+                lista = self.gestor.lista_actual
+                if self.salir_al_terminar and lista and not lista.reproduciendo and lista.posicion_pausa == 0:
+                    logger.info("Fin de la lista")
+                    break
+                time.sleep(0.05)
+        finally:
+            if self.gestor.lista_actual:
+                self.gestor.lista_actual.detener()
+            for zona in self.gestor.zonas().values():
+                zona.detener()
+            if self.servidor:
+                self.servidor.detener()
+
+def main_sin_ventana(args) -> int:
+    global MODO_SIN_VENTANA
+    MODO_SIN_VENTANA = True
+    # Sin pantalla real; la cola de eventos de pygame sigue funcionando
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    if not iniciar_audio():
+        return 1
+
+    gestor = GestorListas(abrir_historial())
+    gestor.crear_lista(args.nombre)
+    gestor.seleccionar_lista(args.nombre)
+    lista = gestor.lista_actual
+    lista.agregar_canciones(buscar_canciones(args.rutas))
+    if not lista.cabeza:
+        logger.error("No se encontraron canciones en %s", args.rutas)
+        return 1
+
+    lista.modo_repeticion = args.repetir
+    if args.repetir == "Radio":
+        gestor.radio.preparar()
+    lista.ajustar_volumen(args.volumen / 100)
+    lista.cambiar_velocidad(args.velocidad)
+    lista.activar_recorte(args.recortar_silencios)
+
+    for definicion in args.zona:
+        nombre, _, rutas = definicion.partition("=")
+        if not rutas or not gestor.crear_zona(nombre):
+            logger.error("Zona no válida: %s (usa NOMBRE=RUTA[,RUTA...])", definicion)
+            return 1
+        zona = gestor.listas[nombre]
+        zona.agregar_canciones(buscar_canciones(rutas.split(",")))
+        zona.modo_repeticion = args.repetir
+        zona.ajustar_volumen(args.volumen / 100)
+        zona.activar_recorte(args.recortar_silencios)
+
+    despachador = DespachadorComandos()
+    servidor = None
+    if not args.sin_control:
+        servidor = ServidorControl(ComandosReproductor(gestor), despachador, ruta=args.socket, puerto=args.puerto)
+        try:
+            servidor.iniciar()
+        except OSError as e:
+            logger.error("%s", e)
+            return 1
+
+    lista.reproducir()
+    for zona in gestor.zonas().values():
+        zona.reproducir()
+    ReproductorSinVentana(gestor, servidor, despachador, args.salir_al_terminar).ejecutar()
+    if gestor.historial:
+        gestor.historial.cerrar()
+    trabajador_audio.cerrar()
+    gestor.cerrar_zonas()
+    cache_silencios.cerrar()
+    gestor.diario.guardar()
+    pygame.quit()
+    return 0
+
+# ==================== SIMULACIÓN ====================
+SIMULACION_MAX_LISTAS = 6
+SIMULACION_MAX_CANCIONES = 60
+SIMULACION_ARCHIVOS = 64
+SIMULACION_CADA_REVISION = 1000
+# Sin avance en este tiempo se vuelca la pila y se termina: un bucle infinito también es un fallo
+SIMULACION_ESPERA_MAXIMA = 60.0
+GENEROS_SIMULACION = ("Rock", "Pop", "Jazz", "Electrónica")
+
+class RelojSimulado:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def avanzar(self, segundos: float) -> None:
+        self.ahora += segundos
+
+class AudioSimulado:
+    """Sustituto del mixer con la interfaz de TrabajadorAudio; síncrono y con el tiempo de un RelojSimulado."""
+
+    def __init__(self, reloj: RelojSimulado):
+        self.reloj = reloj
+        self.turno = 0
+        self.sonando = 0
+        self.ruta: Optional[str] = None
+        self.base = 0.0
+        self.velocidad = 1.0
+        self.arranque: Optional[float] = None
+        self.volumen = 0.7
+
+    def reproducir(self, ruta: str, inicio: float, velocidad: float, volumen: float,
+                   pedido_en: Optional[float] = None) -> int:
+        self.turno += 1
+        self.sonando, self.ruta = self.turno, ruta
+        self.base, self.velocidad, self.volumen = inicio, velocidad, volumen
+        self.arranque = self.reloj.ahora
+        return self.turno
+
+    def pausar(self) -> None:
+        if self.arranque is not None:
+            self.base += (self.reloj.ahora - self.arranque) * self.velocidad
+            self.arranque = None
+
+    def reanudar(self) -> None:
+        if self.sonando and self.arranque is None:
+            self.arranque = self.reloj.ahora
+
+    def detener(self, silencioso: bool = False) -> None:
+        self.sonando, self.ruta, self.arranque = 0, None, None
+
+    def ajustar_volumen(self, volumen: float) -> None:
+        self.volumen = volumen
+
+    def posicion(self, turno: int) -> Optional[float]:
+        if turno != self.sonando:
+            return None
+        return self.base + ((self.reloj.ahora - self.arranque) * self.velocidad if self.arranque is not None else 0.0)
+
+class GestorSimulado(GestorListas):
+    """GestorListas cuyas listas suenan en AudioSimulado y cuya radio inventa canciones."""
+
+    def __init__(self, reloj: RelojSimulado, azar: random.Random, archivos: List[str],
+                 ruta_diario: Optional[str] = None):
+        self.reloj, self.azar, self.archivos = reloj, azar, archivos
+        self.creadas = 0
+        super().__init__()
+        # Nunca el diario del usuario: el de la simulación va a ruta_diario o se queda en memoria
+        self.diario.ruta = ruta_diario
+
+    def _registrar_lista(self, nombre: str, lista: ListaReproduccion):
+        super()._registrar_lista(nombre, lista)
+        if not isinstance(lista.audio, AudioSimulado):
+            lista.audio = AudioSimulado(self.reloj)
+
+    def crear_lista_inteligente(self, nombre: str, *args, **kwargs) -> bool:
+        creada = super().crear_lista_inteligente(nombre, *args, **kwargs)
+        if creada:
+            self.listas_inteligentes[nombre].lista.audio = AudioSimulado(self.reloj)
+        return creada
+
+    def nueva_cancion(self) -> Cancion:
+        self.creadas += 1
+        return Cancion(f"c{self.creadas}", f"a{self.azar.randrange(20)}", self.azar.uniform(0.02, 0.1),
+                       self.azar.choice(self.archivos), self.azar.choice(GENEROS_SIMULACION))
+
+    def sugerir_radio(self, cancion: Cancion) -> Optional[Cancion]:
+        return self.nueva_cancion() if self.azar.random() < 0.8 else None
+
+class FalloSimulacion(Exception):
+    pass
+
+def verificar_enlaces(lista: ListaReproduccion, limite: int) -> Optional[str]:
+    """Integridad del anillo doble y de actual; devuelve la descripción del primer fallo."""
+    if lista.cabeza is None:
+        return None if lista.actual is None else "actual apunta a un nodo con la lista vacía"
+    vistos = set()
+    nodo = lista.cabeza
+    while True:
+        if nodo.siguiente is None or nodo.anterior is None:
+            return f"nodo «{nodo.cancion.titulo}» sin enlazar"
+        if nodo.siguiente.anterior is not nodo:
+            return f"«{nodo.cancion.titulo}».siguiente.anterior no vuelve a él"
+        vistos.add(id(nodo))
+        if len(vistos) > limite:
+            return "el recorrido no vuelve a la cabeza"
+        nodo = nodo.siguiente
+        if nodo is lista.cabeza:
+            break
+    if lista.actual is None or id(lista.actual) not in vistos:
+        return "actual no está en la lista"
+    return None
+
+def verificar_reproduccion(lista: ListaReproduccion) -> Optional[str]:
+    audio = lista.audio
+    if lista.reproduciendo:
+        if audio.sonando != lista.turno or audio.arranque is None:
+            return "la lista dice que suena pero su salida está parada"
+        if lista.actual is None or audio.ruta != lista.actual.cancion.ruta_archivo:
+            return "suena un archivo distinto del de la canción actual"
+    elif audio.arranque is not None:
+        return "la salida sigue sonando con la lista parada"
+    return None
+
+class SimulacionReproductor:
+    """Banco de pruebas de larga duración para ListaReproduccion y GestorListas.
+
+    Aplica operaciones al azar (altas, bajas de la canción que suena, cambio y
+    borrado de listas mientras suenan, pausa, fin de pista en cada modo,
+    deshacer...) sobre un reloj simulado y AudioSimulado. Tras cada operación
+    comprueba los anillos y la coherencia entre la lista y su salida; cada
+    SIMULACION_CADA_REVISION operaciones revisa además la Biblioteca, las
+    listas inteligentes y los hilos de espectro. Con la misma semilla se
+    repite exactamente la misma secuencia.
+    """
+
+    def __init__(self, semilla: int, archivos: List[str], ruta_diario: Optional[str] = None):
+        self.semilla = semilla
+        self.azar = random.Random(semilla)
+        self.reloj = RelojSimulado()
+        self.gestor = GestorSimulado(self.reloj, self.azar, archivos, ruta_diario)
+        self.deshacer_fallidos = 0
+        self.contadores: Dict[str, int] = {}
+        self.ultimas: List[str] = []
+        self.operaciones = [(nombre[len("op_"):], getattr(self, nombre), peso)
+                            for nombre, peso in PESOS_SIMULACION.items()]
+        self._pesos = list(itertools.accumulate(peso for _, _, peso in self.operaciones))
+
+    # --- Elección al azar ---
+    def _lista(self) -> Optional[ListaReproduccion]:
+        listas = list(self.gestor.listas.values())
+        return self.azar.choice(listas) if listas else None
+
+    def _sonando(self) -> List[ListaReproduccion]:
+        return [lista for lista in self.gestor.listas.values() if lista.reproduciendo]
+
+    def _actual(self) -> Optional[ListaReproduccion]:
+        lista = self.gestor.lista_actual
+        if lista is None or self.gestor.es_inteligente(lista):
+            return lista
+        return lista if self.gestor.nombre_de(lista) else None
+
+    # --- Operaciones ---
+    def op_crear_lista(self):
+        if len(self.gestor.listas) < SIMULACION_MAX_LISTAS:
+            self.gestor.crear_lista(f"L{self.gestor.creadas}-{self.azar.randrange(1000)}")
+
+    def op_eliminar_lista(self):
+        lista = self._lista()
+        if lista:
+            self.gestor.eliminar_lista(self.gestor.nombre_de(lista))
+
+    def op_seleccionar(self):
+        nombres = self.gestor.obtener_nombres_listas() + self.gestor.obtener_nombres_inteligentes()
+        self.gestor.seleccionar_lista(self.azar.choice(nombres))
+
+    def op_agregar(self):
+        lista = self._lista()
+        if lista is None:
+            return self.op_crear_lista()
+        if sum(1 for _ in lista.iterar_canciones()) >= SIMULACION_MAX_CANCIONES:
+            return
+        if self.azar.random() < 0.7:
+            lista.agregar_cancion(self.gestor.nueva_cancion())
+        else:
+            lista.agregar_canciones([self.gestor.nueva_cancion() for _ in range(self.azar.randint(1, 5))])
+
+    def op_eliminar_actual(self):
+        candidatas = [lista for lista in self.gestor.listas.values() if lista.actual]
+        if candidatas:
+            lista = self.azar.choice(candidatas)
+            lista.eliminar_nodo(lista.actual)
+
+    def op_eliminar_otra(self):
+        lista = self._lista()
+        canciones = lista.obtener_canciones() if lista else []
+        if canciones:
+            lista.eliminar_cancion(self.azar.choice(canciones).titulo)
+
+    def op_reproducir(self):
+        lista = self._actual()
+        if lista and lista.cabeza:
+            if lista.actual is None:
+                lista.actual = lista.cabeza
+            lista.reproducir()
+
+    def op_seleccionar_cancion(self):
+        lista = self._actual()
+        canciones = lista.obtener_canciones() if lista else []
+        if canciones:
+            lista.seleccionar_cancion(self.azar.choice(canciones))
+
+    def op_pausar(self):
+        lista = self._actual()
+        if lista:
+            lista.pausar()
+
+    def op_reanudar(self):
+        lista = self._actual()
+        if lista:
+            lista.reanudar()
+
+    def op_siguiente(self):
+        lista = self._actual()
+        if lista:
+            self.azar.choice((lista.siguiente, lista.anterior))()
+
+    def op_detener(self):
+        lista = self._actual()
+        if lista:
+            lista.detener()
+
+    def op_saltar(self):
+        lista = self._actual()
+        if lista and lista.actual:
+            lista.saltar_a(self.azar.uniform(0, lista.actual.cancion.duracion * 60))
+
+    def op_velocidad(self):
+        lista = self._actual()
+        if lista:
+            lista.cambiar_velocidad(self.azar.choice((0.5, 1.0, 1.0, 1.5, 2.0)))
+
+    def op_modo(self):
+        lista = self._lista()
+        if lista:
+            lista.modo_repeticion = self.azar.choice(MODOS_REPETICION)
+
+    def op_fin(self):
+        # Aviso de fin de pista tal como llega del mixer, en el modo que tenga la lista
+        sonando = self._sonando()
+        if sonando:
+            self.azar.choice(sonando).manejar_fin()
+
+    def op_avanzar(self):
+        self.reloj.avanzar(self.azar.uniform(0.0, 3.0))
+        for lista in self._sonando():
+            if lista.actual and lista.obtener_posicion() >= lista.actual.cancion.duracion * 60:
+                lista.manejar_fin()
+
+    def op_editar(self):
+        lista = self._lista()
+        canciones = lista.obtener_canciones() if lista else []
+        if canciones:
+            cancion = self.azar.choice(canciones)
+            self.gestor.editar_cancion(cancion, cancion.titulo, f"a{self.azar.randrange(20)}",
+                                       cancion.duracion, self.azar.choice(GENEROS_SIMULACION))
+
+    def op_deshacer(self):
+        try:
+            self.gestor.diario.deshacer()
+        except ValueError:
+            # Paso del disco que ya no casa con las listas; se cuenta en el informe
+            self.deshacer_fallidos += 1
+
+    def op_rehacer(self):
+        self.gestor.diario.rehacer()
+
+    # --- Invariantes ---
+    def verificar(self, completa: bool = False) -> None:
+        limite = SIMULACION_MAX_CANCIONES * 4
+        for nombre, lista in self.gestor.listas.items():
+            error = verificar_enlaces(lista, limite) or verificar_reproduccion(lista)
+            if error:
+                raise FalloSimulacion(f"lista {nombre}: {error}")
+        actual = self.gestor.lista_actual
+        if actual is not None and self.gestor.nombre_de(actual) is None:
+            # Se permite una lista borrada mientras no suene
+            if actual.reproduciendo:
+                raise FalloSimulacion("lista_actual borrada y todavía sonando")
+        if not completa:
+            return
+        for nombre, inteligente in self.gestor.listas_inteligentes.items():
+            error = verificar_enlaces(inteligente.lista, len(self.gestor.biblioteca.canciones) + 1)
+            if error:
+                raise FalloSimulacion(f"lista inteligente {nombre}: {error}")
+            if inteligente.orden:
+                ranking = reversed(inteligente.ranking) if inteligente.descendente else inteligente.ranking
+                esperados = [ident for _, ident in itertools.islice(ranking, inteligente.limite)]
+                if [id(c) for c in inteligente.lista.iterar_canciones()] != esperados:
+                    raise FalloSimulacion(f"lista inteligente {nombre}: fuera del orden del ranking")
+        esperadas: Dict[int, int] = {}
+        for lista in self.gestor.listas.values():
+            for cancion in lista.iterar_canciones():
+                esperadas[id(cancion)] = esperadas.get(id(cancion), 0) + 1
+        if esperadas != self.gestor.biblioteca.referencias:
+            raise FalloSimulacion("la Biblioteca no coincide con las canciones de las listas")
+        vivos = sum(1 for hilo in threading.enumerate() if hilo.name == "espectro")
+        propios = sum(1 for lista in self.gestor.listas.values() if lista.spectrum_thread is not None)
+        propios += sum(1 for i in self.gestor.listas_inteligentes.values() if i.lista.spectrum_thread is not None)
+        if vivos > propios:
+            raise FalloSimulacion(f"{vivos - propios} hilos de espectro sin lista que los use")
+
+    def paso(self) -> None:
+        nombre, operacion, _ = self.azar.choices(self.operaciones, cum_weights=self._pesos)[0]
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + 1
+        self.ultimas.append(nombre)
+        del self.ultimas[:-20]
+        operacion()
+
+    def ejecutar(self, total: int, informar=None) -> dict:
+        """Aplica total operaciones; lanza FalloSimulacion con la operación y la semilla en el mensaje.
+
+        Un cuelgue (más de SIMULACION_ESPERA_MAXIMA sin completar una revisión)
+        vuelca la pila de todos los hilos con faulthandler y termina el proceso.
+        """
+        import faulthandler
+        memoria_inicial = memoria_residente_mb()
+        inicio = time.perf_counter()
+        faulthandler.dump_traceback_later(SIMULACION_ESPERA_MAXIMA, exit=True)
+        try:
+            for i in range(1, total + 1):
+                completa = i % SIMULACION_CADA_REVISION == 0
+                try:
+                    self.paso()
+                    self.verificar(completa)
+                except FalloSimulacion as e:
+                    raise FalloSimulacion(f"operación {i} (semilla {self.semilla}): {e}; "
+                                          f"últimas: {', '.join(self.ultimas)}") from None
+                if completa:
+                    faulthandler.dump_traceback_later(SIMULACION_ESPERA_MAXIMA, exit=True)
+                if informar and i % max(1, total // 10) == 0:
+                    informar(i, time.perf_counter() - inicio, memoria_residente_mb())
+            diario = self.gestor.diario
+            pasos_en_memoria = len(diario.deshacer_pasos)
+            try:
+                self.verificar(completa=True)
+                # Volcar todo lo que queda recorre cada paso; tiene que terminar
+                diario.guardar()
+                if diario.deshacer_pasos:
+                    raise FalloSimulacion("diario.guardar() dejó pasos en memoria")
+            except FalloSimulacion as e:
+                raise FalloSimulacion(f"comprobación final (semilla {self.semilla}): {e}") from None
+        finally:
+            faulthandler.cancel_dump_traceback_later()
+        duracion = time.perf_counter() - inicio
+        en_listas = sum(1 for lista in self.gestor.listas.values() for _ in lista.iterar_canciones())
+        enlazados = en_listas + sum(len(i.miembros) for i in self.gestor.listas_inteligentes.values())
+        # Los nodos que sobrevivan fuera de los anillos los retiene el diario de deshacer o una fuga
+        import gc
+        gc.collect()
+        vivos = sum(1 for objeto in gc.get_objects() if type(objeto) is NodoCancion)
+        return {"semilla": self.semilla, "operaciones": total, "segundos": round(duracion, 2),
+                "operaciones_por_segundo": round(total / duracion) if duracion else None,
+                "horas_simuladas": round(self.reloj.ahora / 3600, 2),
+                "memoria_inicial_mb": memoria_inicial, "memoria_final_mb": memoria_residente_mb(),
+                "listas": len(self.gestor.listas), "canciones_en_listas": en_listas,
+                "nodos_vivos": vivos, "nodos_fuera_de_listas": vivos - enlazados,
+                "pasos_deshacer": pasos_en_memoria, "deshacer_fallidos": self.deshacer_fallidos,
+                "bytes_diario": os.path.getsize(diario.ruta) if diario.ruta and os.path.exists(diario.ruta) else 0,
+                "hilos_espectro": sum(1 for hilo in threading.enumerate() if hilo.name == "espectro"),
+                "por_operacion": dict(sorted(self.contadores.items()))}
+
+PESOS_SIMULACION = {
+    "op_agregar": 14, "op_eliminar_actual": 6, "op_eliminar_otra": 4, "op_crear_lista": 2,
+    "op_eliminar_lista": 1, "op_seleccionar": 5, "op_reproducir": 8, "op_seleccionar_cancion": 4,
+    "op_pausar": 5, "op_reanudar": 5, "op_siguiente": 6, "op_detener": 2, "op_saltar": 3,
+    "op_velocidad": 2, "op_modo": 3, "op_fin": 8, "op_avanzar": 10, "op_editar": 3,
+    "op_deshacer": 4, "op_rehacer": 2,
+}
+
+def memoria_residente_mb() -> Optional[float]:
+    """Memoria residente actual del proceso (Linux) o, si no, el máximo alcanzado."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except ImportError:
+            return None
+
+def main_simulacion(args) -> int:
+    import tempfile
+    semilla = args.semilla if args.semilla is not None else random.randrange(2 ** 32)
+    with tempfile.TemporaryDirectory(prefix="yautja-sim-") as directorio:
+        # reproducir() comprueba que el archivo exista; el audio nunca se abre
+        archivos = []
+        for i in range(SIMULACION_ARCHIVOS):
+            ruta = os.path.join(directorio, f"pista{i}.wav")
+            open(ruta, "wb").close()
+            archivos.append(ruta)
+        simulacion = SimulacionReproductor(semilla, archivos, os.path.join(directorio, "deshacer.jsonl"))
+        logger.info("Simulando %d operaciones con semilla %d", args.simular, semilla)
+        try:
+            informe = simulacion.ejecutar(args.simular, lambda i, segundos, memoria: logger.info(
+                "%d operaciones, %.0f/s, %s MB", i, i / segundos if segundos else 0, memoria))
+        except FalloSimulacion as e:
+            logger.error("Invariante rota en la %s", e)
+            return 1
+    print(json.dumps(informe, ensure_ascii=False, indent=2))
+    return 0
+
 # ==================== INICIO DE LA APLICACIÓN ====================
 
-pygame.init()
-mixer.init()
+def leer_argumentos(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Yautja-Music")
+    parser.add_argument("rutas", nargs="*", help="archivos, carpetas o listas M3U/PLS/XSPF (modo sin ventana)")
+    parser.add_argument("--sin-ventana", "--headless", dest="sin_ventana", action="store_true",
+                        help="reproducir sin interfaz gráfica")
+    parser.add_argument("--nombre", default="Principal", help="nombre de la lista creada")
+    parser.add_argument("--repetir", choices=MODOS_REPETICION, default="Toda la lista")
+    parser.add_argument("--volumen", type=float, default=70, help="volumen inicial de 0 a 100")
+    parser.add_argument("--recortar-silencios", action="store_true",
+                        help="saltar el silencio al principio y al final de cada canción")
+    parser.add_argument("--velocidad", type=float, default=1.0,
+                        help=f"velocidad de reproducción de {VELOCIDAD_MINIMA:g} a {VELOCIDAD_MAXIMA:g}, sin cambiar el tono")
+    parser.add_argument("--zona", action="append", default=[], metavar="NOMBRE=RUTA[,RUTA...]",
+                        help="otra lista que suena a la vez por su propio canal (se puede repetir)")
+    parser.add_argument("--socket", help="ruta del socket de control")
+    parser.add_argument("--puerto", type=int, help="usar TCP en 127.0.0.1 en lugar de socket Unix")
+    parser.add_argument("--sin-control", action="store_true", help="no abrir el servidor de control")
+    parser.add_argument("--salir-al-terminar", action="store_true",
+                        help="terminar cuando la lista deje de sonar")
+    parser.add_argument("--analizar", action="store_true",
+                        help="extraer características de audio de las rutas indicadas y salir")
+    parser.add_argument("--procesos", type=int, help="procesos para el análisis (por defecto, uno por núcleo)")
+    parser.add_argument("--directorio-caracteristicas", help="dónde guardar la matriz de características")
+    parser.add_argument("--duplicados", action="store_true",
+                        help="buscar archivos repetidos entre las rutas indicadas y salir")
+    parser.add_argument("--comparar-audio", action="store_true",
+                        help="con --duplicados, reconocer también recodificaciones por su audio")
+    parser.add_argument("--json", action="store_true", help="con --duplicados, escribir el informe en JSON")
+    parser.add_argument("--simular", type=int, metavar="N",
+                        help="aplicar N operaciones al azar con reloj y audio simulados, comprobar invariantes y salir")
+    parser.add_argument("--semilla", type=int, help="con --simular, semilla para repetir una secuencia")
+    return parser.parse_args(argv)
+
+def main_analisis(args) -> int:
+    almacen = AlmacenCaracteristicas(args.directorio_caracteristicas)
+    rutas = [cancion.ruta_archivo for cancion in buscar_canciones(args.rutas)]
+    analizar_biblioteca(rutas, almacen, args.procesos)
+    almacen.compactar()
+    logger.info("Matriz de características: %d pistas x %d columnas en %s",
+                len(almacen.rutas), len(NOMBRES_CARACTERISTICAS), almacen.directorio)
+    return 0
+
+def main_duplicados(args) -> int:
+    rutas = [cancion.ruta_archivo for cancion in buscar_canciones(args.rutas)]
+    informe = buscar_duplicados(rutas, args.comparar_audio, args.procesos)
+    print(json.dumps(informe.a_dict(), ensure_ascii=False, indent=2) if args.json else informe.resumen())
+    return 0
+
+def main(argv=None):
+    logging.basicConfig(level=os.environ.get("YAUTJA_LOG", "INFO"),
+                        format="%(asctime)s %(levelname)s %(message)s")
+    args = leer_argumentos(argv)
+    if args.analizar:
+        return main_analisis(args)
+    if args.duplicados:
+        return main_duplicados(args)
+    if args.simular:
+        return main_simulacion(args)
+    if args.sin_ventana:
+        return main_sin_ventana(args)
+    registro_arranque.marcar("importaciones")
     
-root = tk.Tk()
+    root = tk.Tk()
+    registro_arranque.marcar("tk.Tk")
     
-def mostrar_reproductor():
-    for widget in root.winfo_children():
-        widget.destroy()
+    def mostrar_reproductor():
+        for widget in root.winfo_children():
+            widget.destroy()
         
-    style = ttk.Style()
-    style.theme_use("clam")
+        style = ttk.Style()
+        style.theme_use("clam")
         
-    app = ReproductorApp(root)
-    app.verificar_eventos()
-
-pantalla_inicio = PantallaInicio(root, mostrar_reproductor)
+        inicio = time.perf_counter()
+        app = ReproductorApp(root)
+        app.verificar_eventos()
+        logger.info("Reproductor listo en %.1f ms", (time.perf_counter() - inicio) * 1000)
+    
+    PantallaInicio(root, mostrar_reproductor)
+    root.update()
+    registro_arranque.marcar("primer frame de la pantalla de inicio")
     
-root.mainloop()
-pygame.quit()
\ No newline at end of file
+    # Lo pesado arranca cuando la pantalla de inicio ya está visible
+    threading.Thread(target=precargar_modulos, daemon=True).start()
+    root.after(100, iniciar_eventos)
+    
+    root.mainloop()
+    pygame.quit()
+
+if __name__ == "__main__":
+    sys.exit(main())